@@ -0,0 +1,4 @@
+from time import perf_counter
+
+# Start of the app import, used to measure cold start time.
+started_at = perf_counter()
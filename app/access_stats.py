@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Iterable
+from uuid import UUID
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.collection import Collection
+from app.models.repository import Repository
+
+
+logger = logging.getLogger("app.access_stats")
+
+# Reads recorded since the last flush.
+_collection_reads: Counter[UUID] = Counter()
+_repository_reads: Counter[UUID] = Counter()
+
+_flusher: asyncio.Task | None = None
+
+
+def record_read(
+    *, collection_ids: Iterable[UUID], repository_ids: Iterable[UUID]
+) -> None:
+    """Records a read of given collections and repositories.
+
+    Reads are counted in memory, until they're written by `flush`.
+    """
+    _collection_reads.update(collection_ids)
+    _repository_reads.update(repository_ids)
+
+
+def flush(*, db: Session) -> None:
+    """Adds recorded reads to the read counts in the database and sets
+       the time of the last read.
+
+    Counts of each table are written with a single (executemany) statement.
+    If writing fails, the reads are kept for the next flush.
+    """
+    tables = [
+        (Collection.__table__, _collection_reads),
+        (Repository.__table__, _repository_reads),
+    ]
+    for table, reads in tables:
+        if reads:
+            db.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(
+                    read_count=table.c.read_count + bindparam("reads"),
+                    last_read_at=func.now()
+                ),
+                [
+                    {"row_id": key, "reads": count}
+                    for key, count in reads.items()
+                ]
+            )
+    db.commit()
+    for _, reads in tables:
+        reads.clear()
+
+
+def start() -> None:
+    """Starts flushing recorded reads every `access_flush_interval` seconds
+       in the background.
+    """
+    global _flusher
+    if _flusher is None:
+        _flusher = asyncio.create_task(_flush_periodically())
+
+
+async def stop() -> None:
+    """Stops the task started with `start` and flushes remaining reads."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+        _flusher = None
+    _flush()
+
+
+async def _flush_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.access_flush_interval)
+        _flush()
+
+
+def _flush() -> None:
+    try:
+        with SessionLocal() as db:
+            flush(db=db)
+    except Exception:
+        logger.exception("Flushing read counts failed.")
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from time import monotonic
+
+from app.config import settings
+
+
+# Buckets of the least recently seen clients are dropped above this number.
+MAX_CLIENTS = 10000
+
+
+class TokenBucket:
+    """Bucket holding at most `burst` tokens, refilled at `rate` tokens per
+       second.
+    """
+
+    def __init__(self, *, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = monotonic()
+
+    def get_wait_time(self) -> float:
+        """Returns number of seconds until a token is available."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+
+class AdmissionController:
+    """Admission control of requests refreshing repositories, with
+       a token bucket per client and a global one.
+
+    Buckets are created on first use, from `admission_*` settings. A limit
+    whose rate isn't set is disabled. Not thread-safe, meant to be used from
+    the event loop.
+    """
+
+    def __init__(self):
+        self._clients: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._global: TokenBucket | None = None
+
+    def admit(self, client: str) -> tuple[float, str | None]:
+        """Takes a token from the client's bucket and from the global one.
+
+        Returns (0, None) if the request is admitted. Otherwise, no tokens
+        are taken and (seconds until the request could be admitted, name of
+        the exceeded limit) is returned.
+        """
+        buckets = []
+        if settings.admission_client_rate is not None:
+            buckets.append(("client", self._get_client_bucket(client)))
+        if settings.admission_global_rate is not None:
+            if self._global is None:
+                self._global = TokenBucket(
+                    rate=settings.admission_global_rate,
+                    burst=settings.admission_global_burst
+                )
+            buckets.append(("global", self._global))
+
+        wait_time, limit = 0.0, None
+        for name, bucket in buckets:
+            bucket_wait_time = bucket.get_wait_time()
+            if bucket_wait_time > wait_time:
+                wait_time, limit = bucket_wait_time, name
+        if limit is not None:
+            return wait_time, limit
+
+        for _, bucket in buckets:
+            bucket.take()
+        return 0.0, None
+
+    def reset(self) -> None:
+        """Drops all buckets, so that they're recreated from settings."""
+        self._clients.clear()
+        self._global = None
+
+    def _get_client_bucket(self, client: str) -> TokenBucket:
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = TokenBucket(
+                rate=settings.admission_client_rate,
+                burst=settings.admission_client_burst
+            )
+            self._clients[client] = bucket
+            if len(self._clients) > MAX_CLIENTS:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return bucket
+
+
+controller = AdmissionController()
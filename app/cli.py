@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import click
+from fastapi import HTTPException
+
+from app import scheduler, worker
+from app.database import SessionLocal, init_db
+from app.enums import TransferFormat
+from app.services import collection_service, transfer_service, warmup_service
+
+
+@click.group(name="git-tracker")
+def cli():
+    """git-tracker management commands."""
+
+
+@cli.command("init-db")
+def init_database():
+    """Creates the database if it doesn't exist and upgrades its schema."""
+    init_db()
+    click.echo("Database is up to date.")
+
+
+@cli.command("worker")
+def run_worker():
+    """Refreshes repositories enqueued by the API (with REFRESH_MODE=queue)."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    worker.main()
+
+
+@cli.command("scheduler")
+def run_scheduler():
+    """Refreshes repositories of recently read collections in background."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    scheduler.main()
+
+
+@cli.command("warm-up")
+@click.option("--limit", type=int, help="number of repositories to refresh")
+@click.option("--concurrency", type=int, help="number of concurrent refreshes")
+def warm_up(limit, concurrency):
+    """Refreshes repositories tracked by the most collections."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    with SessionLocal() as db:
+        counts = asyncio.run(warmup_service.warm_up(
+            db=db, limit=limit, concurrency=concurrency
+        ))
+    click.echo(
+        ", ".join(f"{count} {result}" for result, count in counts.items())
+    )
+
+
+@cli.command("export")
+@click.argument("collection_id", type=click.UUID)
+@click.option(
+    "--format",
+    type=click.Choice([f.value for f in TransferFormat]),
+    default=TransferFormat.NDJSON.value
+)
+@click.option("--output", type=click.File("w"), default="-")
+def export_collection(collection_id, format, output):
+    """Writes repositories of a collection to a file."""
+    with SessionLocal() as db:
+        _assert_collection_exists(db=db, collection_id=collection_id)
+        for line in transfer_service.export_repositories(
+            db=db, collection_id=collection_id, format=TransferFormat(format)
+        ):
+            output.write(line)
+
+
+@cli.command("import")
+@click.argument("collection_id", type=click.UUID)
+@click.argument("input", type=click.File("r"), default="-")
+@click.option(
+    "--format",
+    type=click.Choice([f.value for f in TransferFormat]),
+    default=TransferFormat.NDJSON.value
+)
+def import_collection(collection_id, input, format):
+    """Adds repositories read from a file to a collection."""
+    async def lines():
+        for line in input:
+            yield line.rstrip("\n")
+
+    with SessionLocal() as db:
+        _assert_collection_exists(db=db, collection_id=collection_id)
+        try:
+            imported = asyncio.run(transfer_service.import_repositories(
+                db=db,
+                collection_id=collection_id,
+                lines=lines(),
+                format=TransferFormat(format)
+            ))
+        except HTTPException as e:
+            raise click.ClickException(e.detail)
+    click.echo(f"Imported {imported} repositories.")
+
+
+def _assert_collection_exists(*, db, collection_id) -> None:
+    """Aborts the command if the collection doesn't exist."""
+    if collection_service.get(db=db, collection_id=collection_id) is None:
+        raise click.ClickException("Collection not found.")
+
+
+if __name__ == "__main__":
+    cli()
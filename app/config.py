@@ -2,17 +2,71 @@ import sys
 
 from pydantic import BaseSettings
 
+from app.enums import AdmissionMode, RefreshMode
+
 
 class Settings(BaseSettings):
     github_username: str | None
     github_token: str | None
     gitlab_username: str | None
     gitlab_token: str | None
+    github_api_url: str = "https://api.github.com"
+    gitlab_api_url: str = "https://gitlab.com/api/v4"
     postgres_user: str = "postgres"
     postgres_password: str
     postgres_server: str = "db"
     postgres_port: int = 5432
     postgres_db: str = "db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    db_queries_warning: int = 100
+    database_replica_urls: list[str] = []
+    replica_read_your_writes_window: float = 5
+    init_db_on_startup: bool = True
+    slow_query_threshold: float | None
+    slow_query_explain: bool = False
+    slow_query_history: int = 50
+    admin_token: str | None
+    profiling_enabled: bool = False
+    profiling_top: int = 30
+    profiling_history: int = 20
+    upstream_concurrency: int = 10
+    upstream_timeout: float = 30
+    access_flush_interval: float = 10
+    scheduler_interval: float = 60
+    scheduler_batch_size: int = 100
+    scheduler_concurrency: int = 10
+    scheduler_per_collection_limit: int = 10
+    scheduler_active_window: float = 7 * 24 * 3600
+    poll_interval_min: float = 600
+    poll_interval_max: float = 7 * 24 * 3600
+    poll_interval_backoff: float = 2
+    warmup_on_startup: bool = False
+    warmup_limit: int = 100
+    warmup_concurrency: int = 5
+    warmup_min_remaining_quota: float = 0.2
+    local_cache_ttl: float = 0
+    local_cache_max_size: int = 10000
+    invalidation_reconnect_delay: float = 1.0
+    refresh_mode: RefreshMode = RefreshMode.INLINE
+    refresh_deadline: float | None = 10
+    admission_client_rate: float | None
+    admission_client_burst: int = 10
+    admission_global_rate: float | None
+    admission_global_burst: int = 100
+    admission_mode: AdmissionMode = AdmissionMode.REJECT
+    refresh_max_attempts: int = 5
+    refresh_lock_timeout: float = 30
+    refresh_lock_poll_interval: float = 0.1
+    worker_concurrency: int = 10
+    worker_batch_size: int = 50
+    worker_poll_interval: float = 1.0
+    worker_lease: float = 300
+    worker_retry_delay: float = 30
+    transfer_chunk_size: int = 1000
 
     class Config:
         case_sensitive = False
@@ -1,8 +1,22 @@
-from sqlalchemy import create_engine
+import os
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Hashable, Iterator
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event, exc, inspect
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy_utils import database_exists, create_database
 
+from app import metrics, slow_queries, timing
 from app.config import settings
 
 
@@ -13,12 +27,283 @@ SQLALCHEMY_DATABASE_URL = (
     f"{settings.postgres_db}"
 )
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool collecting statistics of connection checkouts.
+
+    Wait time includes time spent on opening new connections.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait_time = perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time_total += wait_time
+                self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+class QueryCounter:
+    """Statements executed while the counter was active."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+
+
+_query_counters: ContextVar[tuple[QueryCounter, ...]] = ContextVar(
+    "query_counters", default=()
 )
-if not database_exists(engine.url):
-    create_database(engine.url)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """Counts statements executed inside the block.
+
+    Statements executed in tasks and threads started inside the block are
+    counted as well. Blocks can be nested.
+    """
+    counter = QueryCounter()
+    token = _query_counters.set(_query_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _query_counters.reset(token)
+
+
+_engine = None
+_replica_engines = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Returns engine of the app database, creating it on first use.
+
+    Creating the engine doesn't connect to the database.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+    return _engine
+
+
+def get_replica_engines() -> list[Engine]:
+    """Returns engines of read replicas (`database_replica_urls`), creating
+       them on first use.
+    """
+    global _replica_engines
+    if _replica_engines is None:
+        with _engine_lock:
+            if _replica_engines is None:
+                _replica_engines = [
+                    _create_engine(url)
+                    for url in settings.database_replica_urls
+                ]
+    return _replica_engines
+
+
+def _create_engine(url: str) -> Engine:
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping
+    )
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+metrics.Gauge(
+    "db_pool_checked_out",
+    "Database connections checked out from the pool.",
+    function=lambda: get_engine().pool.checkedout()
+)
+metrics.Gauge(
+    "db_pool_overflow",
+    "Database connections opened above the pool size.",
+    function=lambda: get_engine().pool.overflow()
+)
+metrics.Gauge(
+    "db_pool_wait_seconds_total",
+    "Total time spent on waiting for database connections.",
+    function=lambda: get_engine().pool.wait_time_total
+)
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    context.query_started_at = perf_counter()
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    operation = statement.lstrip().split(None, 1)[0].upper()
+    if operation not in ["SELECT", "INSERT", "UPDATE", "DELETE"]:
+        operation = "OTHER"
+    duration = perf_counter() - context.query_started_at
+    metrics.DB_QUERIES.inc(operation=operation)
+    metrics.DB_QUERY_DURATION.observe(duration, operation=operation)
+    timing.record("db", duration)
+    for counter in _query_counters.get():
+        counter.record(statement, duration)
+    if slow_queries.is_slow(duration):
+        slow_queries.record(
+            cursor=cursor,
+            statement=statement,
+            parameters=parameters,
+            executemany=executemany,
+            duration=duration,
+            analyze=context.execution_options.get("explain_analyze", True)
+        )
+
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker binding sessions to the engine returned by `get_engine`
+       (unless other bind is given).
+    """
+
+    def __call__(self, **local_kw) -> Session:
+        if "bind" not in local_kw:
+            local_kw["bind"] = get_engine()
+        return super().__call__(**local_kw)
+
+
+class RoutingSession(Session):
+    """Session sending reads to a read replica and writes to the primary
+       database (its bind).
+
+    After the first write, all statements (reads included) are sent to
+    the primary, so that the session reads its own writes. The replica is
+    chosen randomly when the session is created. Without replicas, it works
+    as a regular session.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        replicas = get_replica_engines()
+        self.replica = random.choice(replicas) if replicas else None
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+        if self.replica is None or self.wrote:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return self.replica
+
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+ReadSessionLocal = _LazySessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False
+)
+
+# Keys (e.g. collection ids) written by this process, with times until which
+# their reads should be sent to the primary.
+_recent_writes: dict[Hashable, float] = {}
+
+
+def mark_written(key: Hashable) -> None:
+    """Records that data identified by the key was changed, so that it's
+       read from the primary database until replicas catch up (for
+       `replica_read_your_writes_window` seconds).
+    """
+    if settings.database_replica_urls:
+        now = monotonic()
+        _recent_writes[key] = now + settings.replica_read_your_writes_window
+        for expired in [k for k, t in _recent_writes.items() if t <= now]:
+            del _recent_writes[expired]
+
+
+def is_recently_written(key: Hashable) -> bool:
+    """Checks if data identified by the key was changed by this process in
+       the last `replica_read_your_writes_window` seconds.
+    """
+    written_until = _recent_writes.get(key)
+    return written_until is not None and written_until > monotonic()
 
 Base = declarative_base()
+
+
+def ensure_database() -> None:
+    """Creates the database if it doesn't exist."""
+    url = get_engine().url
+    if not database_exists(url):
+        create_database(url)
+
+
+def init_db() -> None:
+    """Creates the database if it doesn't exist and upgrades its schema to
+       the newest revision.
+    """
+    ensure_database()
+    run_migrations()
+
+
+def run_migrations() -> None:
+    """Upgrades the database schema to the newest revision.
+
+    Databases created before migrations were introduced are marked with
+    the initial revision first.
+    """
+    with get_engine().connect() as connection:
+        config = get_migrations_config(connection)
+        tables = inspect(connection).get_table_names()
+        if "collections" in tables and "alembic_version" not in tables:
+            command.stamp(config, "0001")
+        command.upgrade(config, "head")
+
+
+def get_migrations_config(connection: Connection) -> Config:
+    """Returns Alembic config running migrations on given connection."""
+    config = Config()
+    config.set_main_option(
+        "script_location", str(Path(__file__).parent / "migrations")
+    )
+    config.attributes["connection"] = connection
+    return config
+
+
+def get_pool_stats() -> dict:
+    """Returns statistics of the connection pool of this process."""
+    pool = get_engine().pool
+    return {
+        "pid": os.getpid(),
+        "size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_time_total": pool.wait_time_total,
+        "wait_time_max": pool.wait_time_max,
+    }
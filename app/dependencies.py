@@ -1,4 +1,16 @@
-from .database import SessionLocal
+import hmac
+import math
+from uuid import UUID
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import APIKeyHeader
+
+from . import admission, metrics
+from .config import settings
+from .database import ReadSessionLocal, SessionLocal, is_recently_written
+from .enums import AdmissionMode
+
+
+admin_token_header = APIKeyHeader(name="X-Admin-Token", auto_error=False)
 
 
 def get_db():
@@ -7,3 +19,71 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """Returns session sending reads to a read replica (if configured).
+
+    If a collection of the request (`collection_id` path parameter or `ids`
+    query parameter) was recently changed by this process, the primary
+    database is used instead, so that the change is visible.
+    """
+    collection_ids = [
+        request.path_params.get("collection_id"),
+        *request.query_params.getlist("ids"),
+    ]
+    recently_written = any(
+        is_recently_written(_parse_uuid(collection_id))
+        for collection_id in collection_ids
+        if collection_id is not None
+    )
+    db = SessionLocal() if recently_written else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def require_admin(token: str | None = Depends(admin_token_header)) -> None:
+    """Checks if the request carries valid admin token.
+
+    If it doesn't, HTTPException is raised. If no admin token is configured,
+    admin endpoints are disabled.
+    """
+    if settings.admin_token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not hmac.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="Wrong admin token.")
+
+
+async def admit_refresh(request: Request) -> bool:
+    """Checks if the request may refresh repositories (admission control).
+
+    Returns True if it may. If the client or all clients together exceeded
+    their limits, raises HTTPException with code 429 and Retry-After header,
+    or (with `admission_mode` set to degrade) returns False, so that stored
+    data is returned without refreshing it.
+    """
+    client = request.client.host if request.client is not None else ""
+    wait_time, limit = admission.controller.admit(client)
+    if limit is None:
+        metrics.ADMISSION_DECISIONS.inc(result="admitted", limit="none")
+        return True
+
+    if AdmissionMode.DEGRADE == settings.admission_mode:
+        metrics.ADMISSION_DECISIONS.inc(result="degraded", limit=limit)
+        return False
+
+    metrics.ADMISSION_DECISIONS.inc(result="rejected", limit=limit)
+    raise HTTPException(
+        status_code=429,
+        detail="Too many requests.",
+        headers={"Retry-After": str(math.ceil(wait_time))}
+    )
+
+
+def _parse_uuid(value: str) -> UUID | None:
+    try:
+        return UUID(value)
+    except ValueError:
+        return None
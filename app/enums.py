@@ -4,3 +4,33 @@ import enum
 class Provider(str, enum.Enum):
     GITHUB = "github"
     GITLAB = "gitlab"
+
+
+class BatchStatus(str, enum.Enum):
+    ADDED = "added"
+    ALREADY_TRACKED = "already_tracked"
+    NOT_FOUND = "not_found"
+    REMOVED = "removed"
+    NOT_TRACKED = "not_tracked"
+
+
+class TransferFormat(str, enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class RepositoryEventType(str, enum.Enum):
+    CACHED = "cached"
+    UPDATED = "updated"
+    REMOVED = "removed"
+    ERROR = "error"
+
+
+class RefreshMode(str, enum.Enum):
+    INLINE = "inline"
+    QUEUE = "queue"
+
+
+class AdmissionMode(str, enum.Enum):
+    REJECT = "reject"
+    DEGRADE = "degrade"
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+import psycopg2
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import local_cache, metrics
+from app.config import settings
+from app.database import SQLALCHEMY_DATABASE_URL
+
+
+logger = logging.getLogger("app.invalidation")
+
+CHANNEL = "local_cache_invalidation"
+
+_listener: asyncio.Task | None = None
+
+
+def publish(
+    *, db: Session, cache: local_cache.LocalCache, keys: list[str]
+) -> None:
+    """Evicts keys from the cache of this process and notifies other
+       processes to evict them as well.
+
+    The notification is sent with `NOTIFY`, so it's delivered when the
+    transaction of the session is committed (and not at all if it's rolled
+    back). Does nothing if local caches are disabled.
+    """
+    if not local_cache.is_enabled():
+        return
+
+    cache.invalidate(keys)
+    payload = json.dumps({"cache": cache.name, "keys": keys})
+    db.execute(select(func.pg_notify(CHANNEL, payload)))
+
+
+def start() -> None:
+    """Starts listening for invalidations in the background, if local
+       caches are enabled.
+    """
+    global _listener
+    if local_cache.is_enabled() and _listener is None:
+        _listener = asyncio.create_task(listen())
+
+
+async def stop() -> None:
+    """Stops the listener started with `start`."""
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
+
+
+async def listen(*, connected: asyncio.Event | None = None) -> None:
+    """Evicts cache entries invalidated by other processes, until cancelled.
+
+    Listens on a dedicated connection. If the connection is lost, reconnects
+    after `invalidation_reconnect_delay` seconds. All caches are cleared
+    after (re)connecting, because notifications sent in the meantime were
+    missed. `connected` is set every time listening starts.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        connection = None
+        try:
+            connection = await loop.run_in_executor(None, _connect)
+            local_cache.clear_all()
+            if connected is not None:
+                connected.set()
+            await _receive(connection)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(
+                "Listening for cache invalidations failed, reconnecting."
+            )
+        finally:
+            if connection is not None:
+                connection.close()
+        await asyncio.sleep(settings.invalidation_reconnect_delay)
+
+
+def _connect():
+    """Opens connection listening on the invalidation channel."""
+    connection = psycopg2.connect(SQLALCHEMY_DATABASE_URL)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANNEL}")
+    return connection
+
+
+async def _receive(connection) -> None:
+    """Handles notifications received by the connection until it fails."""
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(connection.fileno(), readable.set)
+    try:
+        while True:
+            await readable.wait()
+            readable.clear()
+            connection.poll()
+            while connection.notifies:
+                _handle(connection.notifies.pop(0).payload)
+    finally:
+        loop.remove_reader(connection.fileno())
+
+
+def _handle(payload: str) -> None:
+    """Evicts keys listed in the notification payload."""
+    message = json.loads(payload)
+    cache = local_cache.get_cache(message["cache"])
+    if cache is None:
+        return
+    cache.invalidate(message["keys"])
+    metrics.LOCAL_CACHE_INVALIDATIONS.inc(cache=cache.name)
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable
+
+from app import metrics
+from app.config import settings
+
+
+_caches: dict[str, "LocalCache"] = {}
+
+
+class LocalCache:
+    """In-process cache of one worker, with entries expiring after
+       `local_cache_ttl` seconds.
+
+    The cache is disabled (stores nothing) when the TTL is 0. When it's
+    full, the least recently used entry is evicted. Entries changed by
+    other processes are evicted by `app.invalidation`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    def get(self, key: Hashable) -> Any | None:
+        """Returns cached value or None if it isn't cached or expired."""
+        if not is_enabled():
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.LOCAL_CACHE_LOOKUPS.inc(
+            cache=self.name, result="hit" if entry is not None else "miss"
+        )
+        return entry[1] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not is_enabled():
+            return
+
+        with self._lock:
+            self._entries[key] = (monotonic() + settings.local_cache_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.local_cache_max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: list[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def is_enabled() -> bool:
+    return settings.local_cache_ttl > 0
+
+
+def get_cache(name: str) -> LocalCache | None:
+    """Returns cache with given name or None if it doesn't exist."""
+    return _caches.get(name)
+
+
+def clear_all() -> None:
+    """Clears all caches of this process."""
+    for cache in _caches.values():
+        cache.clear()
@@ -1,15 +1,108 @@
+import asyncio
+import logging
+from time import perf_counter
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-from app.routers import collections
-from .database import engine, Base
+from app import access_stats, invalidation, metrics, started_at
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.middleware import (
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    ServerTimingMiddleware
+)
+from app.routers import collections, instrumentation
+from app.services import warmup_service
 
-Base.metadata.create_all(bind=engine)
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(collections.router)
+app.include_router(instrumentation.router)
+
+
+@app.on_event("startup")
+def startup():
+    """Prepares the database (unless `INIT_DB_ON_STARTUP` is disabled) and
+       records cold start time.
+    """
+    if settings.init_db_on_startup:
+        init_db()
+    metrics.COLD_START_DURATION.set(perf_counter() - started_at)
+
+
+@app.on_event("startup")
+async def start_invalidation_listener():
+    """Starts evicting local cache entries changed by other processes (if
+       local caches are enabled).
+    """
+    invalidation.start()
+
+
+@app.on_event("shutdown")
+async def stop_invalidation_listener():
+    await invalidation.stop()
+
+
+@app.on_event("startup")
+async def start_flushing_read_counts():
+    """Starts writing read counts of collections and repositories to
+       the database periodically.
+    """
+    access_stats.start()
+
+
+@app.on_event("shutdown")
+async def stop_flushing_read_counts():
+    await access_stats.stop()
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Starts warming up the cache in the background (if
+       `warmup_on_startup` is set), so that the first reads after a deploy
+       don't refresh everything at once.
+    """
+    if settings.warmup_on_startup:
+        app.state.warm_up = asyncio.create_task(warm_up())
+
+
+@app.on_event("shutdown")
+async def stop_warm_up():
+    """Cancels the warm-up if it's still running."""
+    task = getattr(app.state, "warm_up", None)
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        app.state.warm_up = None
+
+
+async def warm_up() -> None:
+    try:
+        with SessionLocal() as db:
+            await warmup_service.warm_up(db=db)
+    except Exception:
+        logger.exception("Warm-up failed.")
 
 
 @app.get("/status")
 async def status():
     return {"message": "OK"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Returns metrics of this worker process in Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
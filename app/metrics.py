@@ -0,0 +1,269 @@
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+REGISTRY = []
+
+
+class Metric:
+    """Base class of metrics kept in process memory.
+
+    Metrics are added to given registry on creation and rendered by
+    `render`. Values are kept separately for each combination of label
+    values.
+    """
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str] = (),
+        registry: list = REGISTRY
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        """Returns label values in the order of label names."""
+        if set(labels.keys()) != set(self.labelnames):
+            raise ValueError(f"Expected labels: {self.labelnames}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        """Returns (name suffix, labels, value) of every sample."""
+        with self._lock:
+            return [
+                ("", dict(zip(self.labelnames, key)), value)
+                for key, value in self._values.items()
+            ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Gauge which is either set directly or read from given function."""
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str] = (),
+        registry: list = REGISTRY,
+        function: Callable[[], float] | None = None
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        if self.function is not None:
+            return [("", {}, self.function())]
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str] = (),
+        registry: list = REGISTRY,
+        buckets: tuple[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        samples = []
+        with self._lock:
+            values = [
+                (key, list(counts), total)
+                for key, (counts, total) in self._values.items()
+            ]
+        for key, counts, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(
+                    ("_bucket", {**labels, "le": _format_value(bound)},
+                     cumulative)
+                )
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+def render(registry: list = REGISTRY) -> str:
+    """Renders metrics from given registry in Prometheus text format."""
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for suffix, labels, value in metric.samples():
+            rendered = ",".join(
+                f'{label}="{_escape(label_value)}"'
+                for label, label_value in labels.items()
+            )
+            rendered = f"{{{rendered}}}" if rendered else ""
+            lines.append(
+                f"{metric.name}{suffix}{rendered} {_format_value(value)}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """Escapes label value."""
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _format_value(value: float) -> str:
+    """Formats sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests.",
+    ("method", "route", "status")
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total",
+    "Requests to provider APIs.",
+    ("provider", "endpoint", "status")
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Duration of requests to provider APIs.",
+    ("provider", "endpoint", "status")
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Lookups of cached provider API responses.",
+    ("result",)
+)
+ETAG_REVALIDATIONS = Counter(
+    "etag_revalidations_total",
+    "Conditional requests to provider APIs, by whether the cached response "
+    "was still valid.",
+    ("provider", "result")
+)
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "Executed database statements.",
+    ("operation",)
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duration of database statements.",
+    ("operation",)
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Database statements slower than the slow query threshold.",
+    ("operation",)
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database statements executed per HTTP request.",
+    ("method", "route"),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent on database statements per HTTP request.",
+    ("method", "route")
+)
+COLD_START_DURATION = Gauge(
+    "app_cold_start_seconds",
+    "Time from the start of app import until the app was ready to handle "
+    "requests."
+)
+LOCAL_CACHE_LOOKUPS = Counter(
+    "local_cache_lookups_total",
+    "Lookups of in-process caches.",
+    ("cache", "result")
+)
+LOCAL_CACHE_INVALIDATIONS = Counter(
+    "local_cache_invalidations_total",
+    "Invalidations of in-process caches received from the database.",
+    ("cache",)
+)
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total",
+    "Admission decisions of requests refreshing repositories, by result "
+    "and exceeded limit.",
+    ("result", "limit")
+)
+STALE_REPOSITORIES = Counter(
+    "stale_repositories_total",
+    "Repositories returned with stored data, because they weren't updated "
+    "before the deadline of the request."
+)
+REFRESH_JOBS = Counter(
+    "refresh_jobs_total",
+    "Repository refresh jobs processed by the worker, by result.",
+    ("result",)
+)
+COMMIT_FETCHES = Counter(
+    "commit_fetches_total",
+    "Repository refreshes by whether commits were fetched or skipped, "
+    "because nothing was pushed since the previous refresh.",
+    ("result",)
+)
+REFRESH_LOCK_WAITS = Counter(
+    "refresh_lock_waits_total",
+    "Repository refreshes which waited for the same refresh in another "
+    "process, by whether its result was reused or the wait timed out.",
+    ("result",)
+)
+REFRESH_QUEUE_DEPTH = Gauge(
+    "repository_refresh_queue_depth",
+    "Repository refreshes waiting or running in this process."
+)
+REFRESH_QUEUE_DEPTH.set(0)
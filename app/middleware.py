@@ -0,0 +1,189 @@
+import asyncio
+import cProfile
+import hmac
+import logging
+from datetime import datetime, timezone
+from time import perf_counter, process_time
+from starlette.datastructures import Headers, QueryParams
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import metrics, profiling, timing
+from app.config import settings
+from app.database import count_queries
+
+
+logger = logging.getLogger("app.queries")
+
+
+class MetricsMiddleware:
+    """Records duration of HTTP requests and number and duration of their
+       database statements per route.
+
+    Duration is measured until the whole response is sent, so streamed
+    responses are included. Requests executing more statements than
+    `db_queries_warning` are logged as warnings, others at debug level.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            with count_queries() as queries:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _get_route(scope)
+            metrics.HTTP_REQUEST_DURATION.observe(
+                perf_counter() - start,
+                method=scope["method"],
+                route=route,
+                status=status
+            )
+            metrics.HTTP_REQUEST_DB_QUERIES.observe(
+                queries.count, method=scope["method"], route=route
+            )
+            metrics.HTTP_REQUEST_DB_DURATION.observe(
+                queries.duration, method=scope["method"], route=route
+            )
+            level = (
+                logging.WARNING
+                if queries.count > settings.db_queries_warning
+                else logging.DEBUG
+            )
+            logger.log(
+                level,
+                "%s %s executed %d statements in %.1f ms",
+                scope["method"],
+                route,
+                queries.count,
+                queries.duration * 1000
+            )
+
+
+class ServerTimingMiddleware:
+    """Adds Server-Timing header with time spent in phases of the request
+       (database, provider APIs, cache, password hashing, serialization).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        token = timing.start()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                header = timing.format_header(
+                    timing.get(), perf_counter() - start
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            timing.stop(token)
+
+
+class ProfilingMiddleware:
+    """Profiles single requests with cProfile.
+
+    A request is profiled if it has `X-Profile: 1` header or `profile=1`
+    query parameter and carries valid admin token in `X-Admin-Token`
+    header. The request is profiled until its response starts. Report is
+    stored and its id is returned in `X-Profile-Id` header. Profiled
+    requests are handled one at a time. The profile covers
+    everything that runs in the event loop thread in the meantime, but not
+    endpoints run in the thread pool.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not _is_profiling_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async with self.lock:
+            await self._profile(scope, receive, send)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send):
+        status = 500
+        started_at = datetime.now(timezone.utc)
+        profiler = cProfile.Profile()
+        wall_start = perf_counter()
+        cpu_start = process_time()
+        report = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, report
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                profiler.disable()
+                report = profiling.build_report(
+                    profiler=profiler,
+                    method=scope["method"],
+                    path=scope["path"],
+                    status=status,
+                    started_at=started_at,
+                    wall_time=perf_counter() - wall_start,
+                    cpu_time=process_time() - cpu_start
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", str(report["id"]).encode())
+                ]
+            await send(message)
+
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+
+
+def _is_profiling_requested(scope: Scope) -> bool:
+    """Checks if the request asks to be profiled by an admin."""
+    headers = Headers(scope=scope)
+    requested = (
+        headers.get("x-profile") == "1"
+        or QueryParams(scope["query_string"]).get("profile") == "1"
+    )
+    token = headers.get("x-admin-token")
+    return (
+        requested
+        and settings.admin_token is not None
+        and token is not None
+        and hmac.compare_digest(token, settings.admin_token)
+    )
+
+
+def _get_route(scope: Scope) -> str:
+    """Returns path template of the route matching the request."""
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
@@ -0,0 +1,54 @@
+from logging.config import fileConfig
+from alembic import context
+
+from app.database import Base, get_engine
+from app.models import cached_response, collection, repository
+from app.models import refresh_job, tracked_repository
+
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations_offline() -> None:
+    """Emits migrations as SQL script."""
+    context.configure(
+        url=get_engine().url,
+        target_metadata=Base.metadata,
+        literal_binds=True,
+        transaction_per_migration=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Runs migrations against the database.
+
+    Each migration runs in its own transaction, so that migrations creating
+    indexes concurrently (outside of transaction) can be mixed with others.
+    """
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_migrations(connection)
+        return
+
+    with get_engine().connect() as connection:
+        _run_migrations(connection)
+
+
+def _run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=Base.metadata,
+        transaction_per_migration=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
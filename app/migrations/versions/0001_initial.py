@@ -0,0 +1,70 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2022-10-01 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cached_responses",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("url", sa.String()),
+        sa.Column("json", sa.String(), nullable=True),
+        sa.Column("etag", sa.String(), nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()")
+        ),
+    )
+    op.create_table(
+        "collections",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String(100)),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()")
+        ),
+        sa.Column("protected", sa.Boolean()),
+        sa.Column("password", sa.String(), nullable=True),
+    )
+    op.create_table(
+        "repositories",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("owner", sa.String()),
+        sa.Column("provider", sa.Enum("GITHUB", "GITLAB", name="provider")),
+        sa.Column("last_commit_at", sa.DateTime(), nullable=True),
+        sa.Column("last_release_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "tracked_repositories",
+        sa.Column(
+            "repository_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("repositories.id"),
+            primary_key=True
+        ),
+        sa.Column(
+            "collection_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("collections.id"),
+            primary_key=True
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("tracked_repositories")
+    op.drop_table("repositories")
+    op.drop_table("collections")
+    op.drop_table("cached_responses")
+    sa.Enum(name="provider").drop(op.get_bind())
@@ -0,0 +1,127 @@
+"""Indexes and constraints on repositories, memberships and cache
+
+Duplicated rows are merged first, then indexes are created concurrently and
+foreign keys are replaced with NOT VALID ones validated afterwards, so that
+the tables stay available for reads and writes during the upgrade.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2022-10-15 12:00:00.000000
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE duplicated_repositories ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT
+                id,
+                first_value(id) OVER (
+                    PARTITION BY name, owner, provider ORDER BY id
+                ) AS keep_id
+            FROM repositories
+        ) AS ranked
+        WHERE id <> keep_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO tracked_repositories (repository_id, collection_id)
+        SELECT d.keep_id, t.collection_id
+        FROM tracked_repositories AS t
+        JOIN duplicated_repositories AS d ON d.id = t.repository_id
+        ON CONFLICT DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM tracked_repositories AS t
+        USING duplicated_repositories AS d
+        WHERE d.id = t.repository_id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM repositories AS r
+        USING duplicated_repositories AS d
+        WHERE d.id = r.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM cached_responses AS c
+        USING cached_responses AS newer
+        WHERE newer.url = c.url
+        AND (newer.created_at, newer.id) > (c.created_at, c.id)
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_repositories_name_owner_provider",
+            "repositories",
+            ["name", "owner", "provider"],
+            unique=True,
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            "ix_tracked_repositories_collection_id",
+            "tracked_repositories",
+            ["collection_id"],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            "ix_cached_responses_url",
+            "cached_responses",
+            ["url"],
+            unique=True,
+            postgresql_concurrently=True
+        )
+
+    for column, table in [
+        ("repository_id", "repositories"), ("collection_id", "collections")
+    ]:
+        constraint = f"tracked_repositories_{column}_fkey"
+        op.execute(
+            f"""
+            ALTER TABLE tracked_repositories
+            DROP CONSTRAINT {constraint},
+            ADD CONSTRAINT {constraint} FOREIGN KEY ({column})
+            REFERENCES {table} (id) ON DELETE CASCADE NOT VALID
+            """
+        )
+    with op.get_context().autocommit_block():
+        for column in ["repository_id", "collection_id"]:
+            op.execute(
+                "ALTER TABLE tracked_repositories "
+                f"VALIDATE CONSTRAINT tracked_repositories_{column}_fkey"
+            )
+
+
+def downgrade() -> None:
+    for column, table in [
+        ("repository_id", "repositories"), ("collection_id", "collections")
+    ]:
+        constraint = f"tracked_repositories_{column}_fkey"
+        op.execute(
+            f"""
+            ALTER TABLE tracked_repositories
+            DROP CONSTRAINT {constraint},
+            ADD CONSTRAINT {constraint} FOREIGN KEY ({column})
+            REFERENCES {table} (id)
+            """
+        )
+
+    op.drop_index("ix_cached_responses_url", "cached_responses")
+    op.drop_index(
+        "ix_tracked_repositories_collection_id", "tracked_repositories"
+    )
+    op.drop_index("ix_repositories_name_owner_provider", "repositories")
@@ -0,0 +1,43 @@
+"""Queue of repository refresh jobs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2022-10-22 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "refresh_jobs",
+        sa.Column(
+            "repository_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("repositories.id", ondelete="CASCADE"),
+            primary_key=True
+        ),
+        sa.Column(
+            "enqueued_at", sa.DateTime(), server_default=sa.text("now()")
+        ),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column(
+            "attempts", sa.Integer(), nullable=False, server_default="0"
+        ),
+        sa.Column("last_error", sa.String(), nullable=True),
+    )
+    op.create_index(
+        "ix_refresh_jobs_enqueued_at", "refresh_jobs", ["enqueued_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_refresh_jobs_enqueued_at", table_name="refresh_jobs")
+    op.drop_table("refresh_jobs")
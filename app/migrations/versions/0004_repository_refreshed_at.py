@@ -0,0 +1,24 @@
+"""Time of the last refresh of repositories
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2022-10-29 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repositories", sa.Column("refreshed_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repositories", "refreshed_at")
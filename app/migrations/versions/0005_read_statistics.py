@@ -0,0 +1,49 @@
+"""Read counts and times of the last read of collections and repositories
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2022-11-05 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table in ["collections", "repositories"]:
+        op.add_column(
+            table,
+            sa.Column(
+                "read_count",
+                sa.BigInteger(),
+                nullable=False,
+                server_default="0"
+            )
+        )
+        op.add_column(
+            table, sa.Column("last_read_at", sa.DateTime(), nullable=True)
+        )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_collections_last_read_at",
+            "collections",
+            ["last_read_at"],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_collections_last_read_at",
+            table_name="collections",
+            postgresql_concurrently=True
+        )
+    for table in ["collections", "repositories"]:
+        op.drop_column(table, "last_read_at")
+        op.drop_column(table, "read_count")
@@ -0,0 +1,30 @@
+"""Polling intervals of repositories
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2022-11-12 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repositories",
+        sa.Column("poll_interval", sa.Float(), nullable=True)
+    )
+    op.add_column(
+        "repositories",
+        sa.Column("next_poll_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repositories", "next_poll_at")
+    op.drop_column("repositories", "poll_interval")
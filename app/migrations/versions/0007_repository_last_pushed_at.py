@@ -0,0 +1,25 @@
+"""Time of the last push to repositories
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2022-11-19 12:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repositories",
+        sa.Column("last_pushed_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repositories", "last_pushed_at")
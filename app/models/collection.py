@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, String, Boolean
+from sqlalchemy import BigInteger, Column, DateTime, String, Boolean
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -15,9 +15,12 @@ class Collection(Base):
     created_at = Column(DateTime, server_default=func.now())
     protected = Column(Boolean)
     password = Column(String, nullable=True)
+    read_count = Column(BigInteger, nullable=False, server_default="0")
+    last_read_at = Column(DateTime, nullable=True, index=True)
 
     repositories = relationship(
         "Repository",
         secondary="tracked_repositories",
-        back_populates="collections"
+        back_populates="collections",
+        passive_deletes=True
     )
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class RefreshJob(Base):
+    __tablename__ = "refresh_jobs"
+    __table_args__ = (
+        Index("ix_refresh_jobs_enqueued_at", "enqueued_at"),
+    )
+
+    repository_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("repositories.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    enqueued_at = Column(DateTime, server_default=func.now())
+    locked_until = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    last_error = Column(String, nullable=True)
@@ -1,5 +1,7 @@
 import uuid
-from sqlalchemy import Column, DateTime, String, Enum
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Float, String, Enum, Index
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -9,6 +11,15 @@ from app.enums import Provider
 
 class Repository(Base):
     __tablename__ = "repositories"
+    __table_args__ = (
+        Index(
+            "ix_repositories_name_owner_provider",
+            "name",
+            "owner",
+            "provider",
+            unique=True
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String)
@@ -16,9 +27,19 @@ class Repository(Base):
     provider = Column(Enum(Provider))
     last_commit_at = Column(DateTime, nullable=True)
     last_release_at = Column(DateTime, nullable=True)
+    last_pushed_at = Column(DateTime, nullable=True)
+    refreshed_at = Column(DateTime, nullable=True)
+    read_count = Column(BigInteger, nullable=False, server_default="0")
+    last_read_at = Column(DateTime, nullable=True)
+    poll_interval = Column(Float, nullable=True)
+    next_poll_at = Column(DateTime, nullable=True)
+
+    # Not stored, set when the repository couldn't be updated in time.
+    stale = False
 
     collections = relationship(
         "Collection",
         secondary="tracked_repositories",
-        back_populates="repositories"
+        back_populates="repositories",
+        passive_deletes=True
     )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.database import Base
@@ -6,10 +6,17 @@ from app.database import Base
 
 class TrackedRepository(Base):
     __tablename__ = "tracked_repositories"
+    __table_args__ = (
+        Index("ix_tracked_repositories_collection_id", "collection_id"),
+    )
 
     repository_id = Column(
-        UUID(as_uuid=True), ForeignKey("repositories.id"), primary_key=True
+        UUID(as_uuid=True),
+        ForeignKey("repositories.id", ondelete="CASCADE"),
+        primary_key=True
     )
     collection_id = Column(
-        UUID(as_uuid=True), ForeignKey("collections.id"), primary_key=True
+        UUID(as_uuid=True),
+        ForeignKey("collections.id", ondelete="CASCADE"),
+        primary_key=True
     )
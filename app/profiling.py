@@ -0,0 +1,87 @@
+import cProfile
+import pstats
+from collections import deque
+from datetime import datetime
+from uuid import UUID, uuid4
+
+from app.config import settings
+
+
+# Categories of the wall-clock breakdown, matched against function location.
+CATEGORIES = [
+    ("db", ("sqlalchemy", "psycopg2")),
+    ("upstream", ("httpx", "httpcore", "h11", "ssl")),
+    ("password_hashing", ("bcrypt",)),
+    ("serialization", ("pydantic", "fastapi/encoders", "json")),
+    ("event_loop_wait", ("selectors", "epoll", "'poll'")),
+    ("app", ("/app/",)),
+]
+
+_reports = deque(maxlen=settings.profiling_history)
+
+
+def build_report(
+    *,
+    profiler: cProfile.Profile,
+    method: str,
+    path: str,
+    status: int,
+    started_at: datetime,
+    wall_time: float,
+    cpu_time: float
+) -> dict:
+    """Creates and stores report of a profiled request.
+
+    The report contains functions with the highest cumulative time and
+    breakdown of the wall-clock time into categories, based on time spent
+    in the functions themselves.
+    """
+    stats = pstats.Stats(profiler)
+    breakdown = {category: 0.0 for category, _ in CATEGORIES}
+    breakdown["other"] = 0.0
+    functions = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in (
+        stats.stats.items()
+    ):
+        location = f"{filename}:{line}({name})"
+        breakdown[_get_category(location)] += own
+        functions.append({
+            "function": location,
+            "calls": calls,
+            "own_time": own,
+            "cumulative_time": cumulative
+        })
+    functions.sort(key=lambda f: f["cumulative_time"], reverse=True)
+
+    report = {
+        "id": uuid4(),
+        "method": method,
+        "path": path,
+        "status": status,
+        "started_at": started_at,
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "breakdown": breakdown,
+        "functions": functions[:settings.profiling_top],
+    }
+    _reports.append(report)
+    return report
+
+
+def get_reports() -> list[dict]:
+    """Returns stored reports, the newest first."""
+    return list(reversed(_reports))
+
+
+def get_report(report_id: UUID) -> dict | None:
+    """Returns stored report with given id or None if it doesn't exist."""
+    return next((r for r in _reports if r["id"] == report_id), None)
+
+
+def _get_category(location: str) -> str:
+    """Returns breakdown category of a function."""
+    location = location.replace("\\", "/")
+    for category, patterns in CATEGORIES:
+        if any(pattern in location for pattern in patterns):
+            return category
+    return "other"
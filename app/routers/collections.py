@@ -1,26 +1,37 @@
+from contextlib import aclosing
+from typing import AsyncIterator
 from uuid import UUID
 import bcrypt
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
-from app.dependencies import get_db
-from app import models
+from app.dependencies import admit_refresh, get_db, get_read_db
+from app import models, timing
+from app.enums import RepositoryEventType, TransferFormat
 from app.schemas.collection_schemas import (
     CollectionCreated,
     CollectionCreate,
     Collection,
+    CollectionWithRepositories,
     CollectionAddRepository,
-    CollectionRemoveRepository
+    CollectionRemoveRepository,
+    CollectionBatchRepositories,
+    CollectionBatchResult,
+    CollectionImportResult
 )
-from app.schemas.repository_schemas import Repository
-from app.services import collection_service
+from app.schemas.repository_schemas import Repository, RepositoryEvent
+from app.services import collection_service, transfer_service
 
 security = HTTPBearer(auto_error=False)
 
+MAX_COLLECTIONS_PER_REQUEST = 100
+
 router = APIRouter(
     prefix="/collections",
     tags=["collections"],
+    route_class=timing.TimedRoute
 )
 
 
@@ -31,13 +42,57 @@ def create_collection(
     return collection_service.create(db=db, collection_in=collection_in)
 
 
+@router.get("", response_model=list[CollectionWithRepositories])
+async def get_collections(
+    *,
+    db: Session = Depends(get_read_db),
+    refresh: bool = Depends(admit_refresh),
+    ids: list[UUID] = Query(...),
+    deadline: float | None = Query(None, gt=0)
+):
+    """Returns many collections (along with their repositories) at once.
+
+    Collections that don't exist are omitted. Repositories shared between
+    the collections are updated only once. Repositories that aren't updated
+    within `deadline` seconds are returned with their stored data and
+    marked as stale.
+    """
+    if len(ids) > MAX_COLLECTIONS_PER_REQUEST:
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                "At most "
+                f"{MAX_COLLECTIONS_PER_REQUEST} collections can be requested."
+            )
+        )
+
+    return await collection_service.get_many_and_update(
+        db=db,
+        collection_ids=ids,
+        deadline=deadline,
+        refresh=refresh
+    )
+
+
 @router.get("/{collection_id}", response_model=Collection)
 async def get_collection(
-    *, db: Session = Depends(get_db), collection_id: UUID
+    *,
+    db: Session = Depends(get_read_db),
+    refresh: bool = Depends(admit_refresh),
+    collection_id: UUID,
+    deadline: float | None = Query(None, gt=0)
 ):
+    """Returns collection along with its repositories.
+
+    Repositories that aren't updated within `deadline` seconds (by default
+    `REFRESH_DEADLINE`) are returned with their stored data and marked as
+    stale. Their updates continue in the background.
+    """
     collection = await collection_service.get_and_update(
         db=db,
-        collection_id=collection_id
+        collection_id=collection_id,
+        deadline=deadline,
+        refresh=refresh
     )
     if collection is None:
         raise HTTPException(status_code=404, detail="Collection not found.")
@@ -47,12 +102,41 @@ async def get_collection(
 
 @router.get("/{collection_id}/repos", response_model=list[Repository])
 async def get_collection_repositories(
-    *, db: Session = Depends(get_db), collection_id: UUID
+    *,
+    db: Session = Depends(get_read_db),
+    refresh: bool = Depends(admit_refresh),
+    collection_id: UUID,
+    deadline: float | None = Query(None, gt=0)
 ):
-    collection = await get_collection(db=db, collection_id=collection_id)
+    collection = await get_collection(
+        db=db, refresh=refresh, collection_id=collection_id, deadline=deadline
+    )
     return collection.repositories
 
 
+@router.get("/{collection_id}/repos/stream")
+async def stream_collection_repositories(
+    *,
+    db: Session = Depends(get_read_db),
+    refresh: bool = Depends(admit_refresh),
+    collection_id: UUID
+):
+    """Streams collection repositories as NDJSON.
+
+    First, stored data of every repository is sent (`cached` events). Then,
+    as soon as each repository is updated, an `updated`, `removed` or `error`
+    event is sent for it (unless refreshing isn't admitted).
+    """
+    collection = _get_collection(db=db, collection_id=collection_id)
+
+    return StreamingResponse(
+        _stream_repository_events(
+            db=db, collection=collection, refresh=refresh
+        ),
+        media_type="application/x-ndjson"
+    )
+
+
 @router.post("/{collection_id}/repos")
 async def add_repository_to_collection(
     *,
@@ -61,7 +145,7 @@ async def add_repository_to_collection(
     collection_id: UUID,
     collection_in: CollectionAddRepository
 ):
-    collection = await get_collection(db=db, collection_id=collection_id)
+    collection = _get_collection(db=db, collection_id=collection_id)
     _assert_authorized(collection=collection, credentials=credentials)
     
     await collection_service.add_repository(
@@ -71,6 +155,27 @@ async def add_repository_to_collection(
     )
 
 
+@router.post(
+    "/{collection_id}/repos/batch",
+    response_model=list[CollectionBatchResult]
+)
+async def batch_update_collection_repositories(
+    *,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+    collection_id: UUID,
+    batch_in: CollectionBatchRepositories
+):
+    collection = _get_collection(db=db, collection_id=collection_id)
+    _assert_authorized(collection=collection, credentials=credentials)
+
+    return await collection_service.batch_update_repositories(
+        db=db,
+        collection=collection,
+        batch_in=batch_in
+    )
+
+
 @router.delete("/{collection_id}/repos/{repository_id}")
 async def remove_repository_from_collection(
     *,
@@ -79,7 +184,7 @@ async def remove_repository_from_collection(
     collection_id: UUID,
     repository_id: UUID
 ):
-    collection = await get_collection(db=db, collection_id=collection_id)
+    collection = _get_collection(db=db, collection_id=collection_id)
     _assert_authorized(collection=collection, credentials=credentials)
     
     collection_service.remove_repository(
@@ -89,6 +194,54 @@ async def remove_repository_from_collection(
     )
 
 
+@router.get("/{collection_id}/export")
+def export_collection(
+    *,
+    db: Session = Depends(get_read_db),
+    collection_id: UUID,
+    format: TransferFormat = TransferFormat.NDJSON
+):
+    collection = _get_collection(db=db, collection_id=collection_id)
+
+    return StreamingResponse(
+        transfer_service.export_repositories(
+            db=db,
+            collection_id=collection.id,
+            format=format
+        ),
+        media_type=transfer_service.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{collection.id}.{format.value}"'
+            )
+        }
+    )
+
+
+@router.post(
+    "/{collection_id}/import",
+    response_model=CollectionImportResult
+)
+async def import_collection(
+    *,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+    collection_id: UUID,
+    format: TransferFormat = TransferFormat.NDJSON,
+    request: Request
+):
+    collection = _get_collection(db=db, collection_id=collection_id)
+    _assert_authorized(collection=collection, credentials=credentials)
+
+    imported = await transfer_service.import_repositories(
+        db=db,
+        collection_id=collection.id,
+        lines=transfer_service.iter_lines(request.stream()),
+        format=format
+    )
+    return CollectionImportResult(imported=imported)
+
+
 @router.delete("/{collection_id}")
 async def delete_collection(
     *,
@@ -96,7 +249,7 @@ async def delete_collection(
     db: Session = Depends(get_db),
     collection_id: UUID
 ):
-    collection = await get_collection(db=db, collection_id=collection_id)
+    collection = _get_collection(db=db, collection_id=collection_id)
     _assert_authorized(collection=collection, credentials=credentials)
 
     collection_service.delete(
@@ -105,6 +258,52 @@ async def delete_collection(
     )
 
 
+async def _stream_repository_events(
+    *, db: Session, collection: models.collection.Collection, refresh: bool
+) -> AsyncIterator[str]:
+    """Yields NDJSON lines with repository events for the stream endpoint."""
+    for repo in collection.repositories:
+        yield RepositoryEvent(
+            event=RepositoryEventType.CACHED,
+            repository_id=repo.id,
+            repository=Repository.from_orm(repo)
+        ).json() + "\n"
+    if not refresh:
+        return
+
+    updates = collection_service.iter_update(db=db, collection=collection)
+    async with aclosing(updates) as results:
+        async for result in results:
+            event = RepositoryEvent(
+                event=RepositoryEventType.UPDATED,
+                repository_id=result.repository_id
+            )
+            if result.error is not None:
+                event.event = RepositoryEventType.ERROR
+                event.detail = result.error.detail
+            elif not result.exists:
+                event.event = RepositoryEventType.REMOVED
+            else:
+                event.repository = Repository.from_orm(result.repo)
+            yield event.json() + "\n"
+
+
+def _get_collection(
+    *, db: Session, collection_id: UUID
+) -> models.collection.Collection:
+    """Returns collection with given id without updating its repositories.
+
+    Meant for endpoints modifying the collection, so that no requests to
+    external APIs are made. If the collection doesn't exist, HTTPException
+    is raised.
+    """
+    collection = collection_service.get(db=db, collection_id=collection_id)
+    if collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found.")
+
+    return collection
+
+
 def _assert_authorized(
     *,
     collection: models.collection.Collection,
@@ -117,5 +316,11 @@ def _assert_authorized(
     hashed = collection.password
     password = credentials.credentials if credentials is not None else None
     if hashed is not None:
-        if password is None or not bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8")):
+        if password is None:
+            raise HTTPException(status_code=401, detail="Wrong password.")
+        with timing.timed("hash"):
+            valid = bcrypt.checkpw(
+                password.encode("utf-8"), hashed.encode("utf-8")
+            )
+        if not valid:
             raise HTTPException(status_code=401, detail="Wrong password.")
@@ -0,0 +1,52 @@
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException
+
+from app import database, profiling, slow_queries
+from app.dependencies import require_admin
+from app.schemas.instrumentation_schemas import (
+    PoolStats,
+    Profile,
+    ProfileSummary,
+    SlowQuery
+)
+
+router = APIRouter(
+    prefix="/instrumentation",
+    tags=["instrumentation"],
+    dependencies=[Depends(require_admin)]
+)
+
+
+@router.get("/pool", response_model=PoolStats)
+def get_pool_stats():
+    """Returns statistics of the database connection pool.
+
+    Statistics are kept per worker process.
+    """
+    return database.get_pool_stats()
+
+
+@router.get("/profiles", response_model=list[ProfileSummary])
+def get_profiles():
+    """Returns recently profiled requests handled by this worker process.
+
+    Requests are profiled only if `PROFILING_ENABLED` is set.
+    """
+    return profiling.get_reports()
+
+
+@router.get("/profiles/{profile_id}", response_model=Profile)
+def get_profile(*, profile_id: UUID):
+    profile = profiling.get_report(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+
+    return profile
+
+
+@router.get("/slow-queries", response_model=list[SlowQuery])
+def get_slow_queries():
+    """Returns recent database statements slower than
+       `SLOW_QUERY_THRESHOLD`, executed by this worker process.
+    """
+    return slow_queries.get_queries()
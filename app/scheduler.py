@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import signal
+from contextlib import aclosing
+from datetime import timedelta
+from uuid import UUID
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.repository import Repository
+from app.services import repository_service, schedule_service
+
+
+logger = logging.getLogger("app.scheduler")
+
+
+async def run(*, stop: asyncio.Event | None = None) -> None:
+    """Refreshes repositories returned by `schedule_service.get_due` until
+       stopped.
+
+    If a whole batch was refreshed successfully, the next one is started
+    right away, otherwise after `scheduler_interval` seconds. Errors which
+    aren't specific to one repository (e.g. an unavailable database) are
+    logged and the batch is retried after `scheduler_interval` seconds.
+    """
+    stop = stop or asyncio.Event()
+    logger.info("Scheduler started.")
+    while not stop.is_set():
+        try:
+            with SessionLocal() as db:
+                refreshed = await run_once(db=db)
+        except Exception:
+            logger.exception("Refreshing due repositories failed.")
+            refreshed = 0
+        if refreshed < settings.scheduler_batch_size:
+            try:
+                await asyncio.wait_for(
+                    stop.wait(), timeout=settings.scheduler_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+    logger.info("Scheduler stopped.")
+
+
+async def run_once(*, db: Session) -> int:
+    """Refreshes a batch of due repositories concurrently, in order of their
+       priority.
+
+    At most `scheduler_concurrency` repositories are refreshed at the same
+    time. Repositories which failed to refresh, whatever the error, aren't
+    due again for `poll_interval_min` seconds, so that an outage or
+    exhausted rate limit of a provider isn't hit by the same batch over and
+    over. Returns number of repositories refreshed successfully.
+    """
+    repos = schedule_service.get_due(
+        db=db, limit=settings.scheduler_batch_size
+    )
+    if not repos:
+        return 0
+
+    failed = []
+    updates = repository_service.iter_update(
+        db=db, repos=repos, concurrency=settings.scheduler_concurrency
+    )
+    async with aclosing(updates) as results:
+        async for result in results:
+            if result.error is not None:
+                failed.append(result.repository_id)
+                logger.warning(
+                    "Refreshing repository %s failed: %s",
+                    result.repository_id,
+                    result.error.detail
+                )
+    if failed:
+        _postpone(db=db, repository_ids=failed)
+    logger.info(
+        "Refreshed %d repositories (%d failed).",
+        len(repos) - len(failed),
+        len(failed)
+    )
+    return len(repos) - len(failed)
+
+
+def _postpone(*, db: Session, repository_ids: list[UUID]) -> None:
+    """Makes repositories due again after `poll_interval_min` seconds."""
+    db.query(Repository).filter(Repository.id.in_(repository_ids)).update(
+        {
+            Repository.next_poll_at: func.now()
+            + timedelta(seconds=settings.poll_interval_min)
+        },
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def main() -> None:
+    """Runs the scheduler until SIGINT or SIGTERM is received."""
+    async def run_until_signal():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await run(stop=stop)
+
+    asyncio.run(run_until_signal())
@@ -1,8 +1,9 @@
 from datetime import datetime
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from .repository_schemas import Repository
+from app.enums import BatchStatus
 from app.models.repository import Provider
 
 
@@ -16,6 +17,10 @@ class Collection(BaseModel):
         orm_mode = True
 
 
+class CollectionWithRepositories(Collection):
+    repositories: list[Repository]
+
+
 class CollectionCreated(BaseModel):
     id: UUID
     name: str
@@ -40,3 +45,20 @@ class CollectionRemoveRepository(BaseModel):
     repository_name: str
     repository_owner: str
     provider: Provider
+
+
+class CollectionBatchRepositories(BaseModel):
+    add: list[CollectionAddRepository] = Field(default=[], max_items=1000)
+    remove: list[UUID] = Field(default=[], max_items=1000)
+
+
+class CollectionBatchResult(BaseModel):
+    repository_name: str | None
+    repository_owner: str | None
+    provider: Provider | None
+    repository_id: UUID | None
+    status: BatchStatus
+
+
+class CollectionImportResult(BaseModel):
+    imported: int
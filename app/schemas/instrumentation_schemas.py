@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+from pydantic import BaseModel
+
+
+class PoolStats(BaseModel):
+    pid: int
+    size: int
+    max_overflow: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_time_total: float
+    wait_time_max: float
+
+
+class ProfiledFunction(BaseModel):
+    function: str
+    calls: int
+    own_time: float
+    cumulative_time: float
+
+
+class ProfileSummary(BaseModel):
+    id: UUID
+    method: str
+    path: str
+    status: int
+    started_at: datetime
+    wall_time: float
+    cpu_time: float
+
+
+class Profile(ProfileSummary):
+    breakdown: dict[str, float]
+    functions: list[ProfiledFunction]
+
+
+class SlowQuery(BaseModel):
+    recorded_at: datetime
+    statement: str
+    parameters: Any
+    duration: float
+    origin: str | None
+    plan: str | None
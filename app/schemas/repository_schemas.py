@@ -2,7 +2,7 @@ from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel
 
-from app.enums import Provider
+from app.enums import Provider, RepositoryEventType
 
 
 class Repository(BaseModel):
@@ -12,6 +12,22 @@ class Repository(BaseModel):
     provider: Provider
     last_commit_at: datetime | None
     last_release_at: datetime | None
+    stale: bool = False
 
     class Config:
         orm_mode = True
+
+
+class RepositoryRecord(BaseModel):
+    name: str
+    owner: str
+    provider: Provider
+    last_commit_at: datetime | None
+    last_release_at: datetime | None
+
+
+class RepositoryEvent(BaseModel):
+    event: RepositoryEventType
+    repository_id: UUID
+    repository: Repository | None
+    detail: str | None
@@ -1,17 +1,43 @@
 from datetime import datetime, timedelta
 from json import dumps, loads
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
+from app import invalidation, local_cache, metrics, timing
 from app.models.cached_response import CachedResponse
 
 
+_local = local_cache.LocalCache("cached_responses")
+
+
 def get(*, db: Session, url: str) -> CachedResponse | None:
-    """Returns cached response for given url or None if it wasn't cached."""
-    return (
-        db.query(CachedResponse)
-        .filter(CachedResponse.url == url)
-        .one_or_none()
-    )
+    """Returns cached response for given url or None if it wasn't cached.
+
+    If local caches are enabled, the response may be returned from
+    the cache of this process, as a copy not attached to the session.
+    """
+    cache = _local.get(url)
+    if cache is not None:
+        return cache
+
+    with timing.timed("cache"):
+        cache = (
+            db.query(CachedResponse)
+            .filter(CachedResponse.url == url)
+            .one_or_none()
+        )
+    metrics.CACHE_LOOKUPS.inc(result="hit" if cache is not None else "miss")
+    # The copy is built only if it's going to be stored.
+    if cache is not None and local_cache.is_enabled():
+        _local.set(url, CachedResponse(
+            id=cache.id,
+            url=cache.url,
+            json=cache.json,
+            etag=cache.etag,
+            created_at=cache.created_at
+        ))
+    return cache
 
 
 def get_json_dict(*, db: Session, url: str) -> CachedResponse | None:
@@ -28,16 +54,23 @@ def get_json_dict(*, db: Session, url: str) -> CachedResponse | None:
 
 def update(
     *, db: Session, url: str, json: str | None, etag: str | None
-) -> CachedResponse:
+) -> None:
     """Updates cache for given url (or creates it if it doesn't exist).
 
-    If the cache for given url already exists, then it's deleted.
+    Cache is written with a single upsert, so concurrent updates of the same
+    url (e.g. from different processes) don't conflict. Copies of the
+    response in local caches of all processes are invalidated.
     """
     cache = get(db=db, url=url)
     if cache is None or cache.etag != etag:
-        if cache is not None:
-            db.delete(cache)
-
-        cache = CachedResponse(url=url, json=json, etag=etag)
-        db.add(cache)
-        db.commit()
+        with timing.timed("cache"):
+            db.execute(
+                insert(CachedResponse)
+                .values(url=url, json=json, etag=etag)
+                .on_conflict_do_update(
+                    index_elements=[CachedResponse.url],
+                    set_={"json": json, "etag": etag, "created_at": func.now()}
+                )
+            )
+            invalidation.publish(db=db, cache=_local, keys=[url])
+            db.commit()
@@ -1,18 +1,37 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator
 from uuid import uuid4, UUID
 import bcrypt
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import delete as sql_delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
 
-from . import repository_service
+from . import refresh_queue_service, repository_service
+from app import access_stats, metrics, timing
+from app.config import settings
+from app.database import SessionLocal, mark_written
+from app.enums import BatchStatus, RefreshMode
 from app.models.collection import Collection
+from app.models.repository import Repository
 from app.models.tracked_repository import TrackedRepository
 from app.schemas.collection_schemas import (
     CollectionCreate,
     CollectionAddRepository,
-    CollectionRemoveRepository
+    CollectionRemoveRepository,
+    CollectionBatchRepositories,
+    CollectionBatchResult
 )
 
 
+logger = logging.getLogger(__name__)
+
+# References to background refreshes, so that they aren't garbage collected.
+_background_refreshes: set[asyncio.Task] = set()
+
+
 def create(
     *, db: Session, collection_in: CollectionCreate
 ) -> Collection:
@@ -20,7 +39,8 @@ def create(
     hashed = None
     if collection_in.password:
         password = collection_in.password.encode("UTF-8")
-        hashed = bcrypt.hashpw(password, bcrypt.gensalt()).decode("UTF-8")
+        with timing.timed("hash"):
+            hashed = bcrypt.hashpw(password, bcrypt.gensalt()).decode("UTF-8")
 
     collection = Collection(
         **collection_in.dict(exclude={"password"}), 
@@ -45,23 +65,125 @@ def get(*, db: Session, collection_id: UUID) -> Collection | None:
     )
 
 
-async def update(*, db: Session, collection: Collection) -> None:
-    """Updates all repositories belonging to given collection."""
-    for repo in collection.repositories:
-        await repository_service.update(db=db, repo=repo)
+def get_many(*, db: Session, collection_ids: list[UUID]) -> list[Collection]:
+    """Returns collections with given ids, in the same order.
+
+    Collections that don't exist are omitted. Repositories of all
+    the collections are loaded at once. Returned repositories may not be up
+    to date.
+    """
+    collections = (
+        db.query(Collection)
+        .filter(Collection.id.in_(collection_ids))
+        .options(selectinload(Collection.repositories))
+        .all()
+    )
+    by_id = {collection.id: collection for collection in collections}
+    return [
+        by_id[collection_id]
+        for collection_id in dict.fromkeys(collection_ids)
+        if collection_id in by_id
+    ]
+
+
+async def update(
+    *, db: Session, collection: Collection, deadline: float | None = None
+) -> set[UUID]:
+    """Updates all repositories belonging to given collection.
+
+    Repositories are updated concurrently. If updating any of them fails,
+    HTTPException is raised. Updates that don't finish within `deadline`
+    seconds continue in the background; ids of their repositories are
+    returned.
+    """
+    return await _update_repositories(
+        db=db, repos=list(collection.repositories), deadline=deadline
+    )
+
+
+async def get_many_and_update(
+    *,
+    db: Session,
+    collection_ids: list[UUID],
+    deadline: float | None = None,
+    refresh: bool = True
+) -> list[Collection]:
+    """Returns collections with given ids, in the same order.
+
+    Collections that don't exist are omitted. Returned collections are up to
+    date (unless updates are queued), except for repositories that weren't
+    updated within `deadline` seconds, which are marked as stale. Each
+    repository is updated once, even if it belongs to many of
+    the collections. If `refresh` is False, nothing is updated and all
+    repositories are marked as stale.
+    """
+    collections = get_many(db=db, collection_ids=collection_ids)
+    repos = {
+        repo.id: repo
+        for collection in collections
+        for repo in collection.repositories
+    }
+    access_stats.record_read(
+        collection_ids=[collection.id for collection in collections],
+        repository_ids=list(repos)
+    )
+    if refresh:
+        stale = await _update_repositories(
+            db=db, repos=list(repos.values()), deadline=deadline
+        )
+    else:
+        stale = set(repos)
+    collections = get_many(db=db, collection_ids=collection_ids)
+    for collection in collections:
+        _mark_stale(repos=collection.repositories, stale=stale)
+    return collections
+
+
+def iter_update(
+    *, db: Session, collection: Collection
+) -> AsyncIterator[repository_service.UpdateResult]:
+    """Updates all repositories belonging to given collection.
+
+    Yields result for each repository as soon as its update finishes. In
+    queue refresh mode, updates are enqueued and nothing is yielded.
+    """
+    repos = list(collection.repositories)
+    _record_read(collection=collection)
+    if RefreshMode.QUEUE == settings.refresh_mode:
+        refresh_queue_service.enqueue(
+            db=db, repository_ids=[repo.id for repo in repos]
+        )
+        return _no_results()
+
+    return repository_service.iter_update(db=db, repos=repos)
 
 
 async def get_and_update(
-    *, db: Session, collection_id: UUID
+    *,
+    db: Session,
+    collection_id: UUID,
+    deadline: float | None = None,
+    refresh: bool = True
 ) -> Collection | None:
     """Returns collection with given id or None if it doesn't exists.
 
-    Returned collection is up to date.
+    Returned collection is up to date (unless updates are queued), except
+    for repositories that weren't updated within `deadline` seconds, which
+    are marked as stale. If `refresh` is False, nothing is updated and all
+    repositories are marked as stale.
     """
     collection = get(db=db, collection_id=collection_id)
-    if collection is not None:
-        await update(db=db, collection=collection)
-    return get(db=db, collection_id=collection_id)
+    if collection is None:
+        return None
+
+    _record_read(collection=collection)
+    if refresh:
+        stale = await update(db=db, collection=collection, deadline=deadline)
+    else:
+        stale = {repo.id for repo in collection.repositories}
+    collection = get(db=db, collection_id=collection_id)
+    _mark_stale(repos=collection.repositories, stale=stale)
+    return collection
 
 
 async def add_repository(
@@ -95,6 +217,7 @@ async def add_repository(
         )
         db.add(tracked_repository)
         db.commit()
+        mark_written(collection.id)
         db.refresh(collection)
 
     return collection
@@ -123,12 +246,183 @@ def remove_repository(
 
     db.delete(tracked_repository)
     db.commit()
+    mark_written(collection.id)
     db.refresh(collection)
 
     return collection
 
 
+async def batch_update_repositories(
+    *,
+    db: Session,
+    collection: Collection,
+    batch_in: CollectionBatchRepositories
+) -> list[CollectionBatchResult]:
+    """Adds and removes many repositories to/from collection at once.
+
+    Existence of added repositories is checked concurrently, then all
+    changes are made in a single transaction. Returns result for each item
+    (additions first, then removals), in the order they were given.
+    """
+    keys = [
+        (item.repository_name, item.repository_owner, item.provider)
+        for item in batch_in.add
+    ]
+    repos = await repository_service.add_many(db=db, keys=keys)
+    repo_ids = {
+        key: repo.id for key, repo in repos.items() if repo is not None
+    }
+
+    added_ids = set()
+    if repo_ids:
+        added_ids = set(db.execute(
+            insert(TrackedRepository)
+            .values([
+                {"repository_id": repo_id, "collection_id": collection.id}
+                for repo_id in set(repo_ids.values())
+            ])
+            .on_conflict_do_nothing()
+            .returning(TrackedRepository.repository_id)
+        ).scalars())
+
+    removed_ids = set()
+    if batch_in.remove:
+        removed_ids = set(db.execute(
+            sql_delete(TrackedRepository)
+            .where(TrackedRepository.collection_id == collection.id)
+            .where(TrackedRepository.repository_id.in_(batch_in.remove))
+            .returning(TrackedRepository.repository_id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+
+    db.commit()
+    mark_written(collection.id)
+
+    results = []
+    for key in keys:
+        repo_id = repo_ids.get(key)
+        if repo_id is None:
+            status = BatchStatus.NOT_FOUND
+        elif repo_id in added_ids:
+            status = BatchStatus.ADDED
+        else:
+            status = BatchStatus.ALREADY_TRACKED
+        name, owner, provider = key
+        results.append(CollectionBatchResult(
+            repository_name=name,
+            repository_owner=owner,
+            provider=provider,
+            repository_id=repo_id,
+            status=status
+        ))
+    for repository_id in batch_in.remove:
+        results.append(CollectionBatchResult(
+            repository_id=repository_id,
+            status=(
+                BatchStatus.REMOVED
+                if repository_id in removed_ids
+                else BatchStatus.NOT_TRACKED
+            )
+        ))
+
+    return results
+
+
 def delete(*, db: Session, collection: Collection) -> None:
     """Deletes coollection."""
+    collection_id = collection.id
     db.delete(collection)
     db.commit()
+    mark_written(collection_id)
+
+
+async def _update_repositories(
+    *, db: Session, repos: list[Repository], deadline: float | None = None
+) -> set[UUID]:
+    """Updates given repositories concurrently.
+
+    If updating any of them fails, HTTPException is raised. In queue
+    refresh mode, updates are only enqueued for the worker.
+
+    Waits at most `deadline` seconds (by default `refresh_deadline`).
+    Updates that haven't finished by then are cancelled and restarted in
+    the background with a separate session. Returns ids of their
+    repositories, and of the ones whose provider API didn't respond within
+    `upstream_timeout` (their stored data is returned as stale).
+    """
+    if RefreshMode.QUEUE == settings.refresh_mode:
+        refresh_queue_service.enqueue(
+            db=db, repository_ids=[repo.id for repo in repos]
+        )
+        return set()
+
+    pending = {repo.id for repo in repos}
+    timed_out = set()
+
+    async def update_all() -> None:
+        updates = repository_service.iter_update(db=db, repos=repos)
+        async with aclosing(updates) as results:
+            async for result in results:
+                pending.discard(result.repository_id)
+                if result.error is None:
+                    continue
+                if result.error.status_code != 504:
+                    raise result.error
+                timed_out.add(result.repository_id)
+
+    try:
+        await asyncio.wait_for(
+            update_all(), timeout=deadline or settings.refresh_deadline
+        )
+    except asyncio.TimeoutError:
+        metrics.STALE_REPOSITORIES.inc(len(pending) + len(timed_out))
+        _refresh_in_background(repository_ids=list(pending))
+        return pending | timed_out
+    if timed_out:
+        metrics.STALE_REPOSITORIES.inc(len(timed_out))
+    return timed_out
+
+
+def _refresh_in_background(*, repository_ids: list[UUID]) -> None:
+    """Refreshes repositories with given ids in a background task, which
+       uses its own session.
+    """
+    task = asyncio.create_task(_refresh(repository_ids=repository_ids))
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+
+async def _refresh(*, repository_ids: list[UUID]) -> None:
+    with SessionLocal() as db:
+        repos = (
+            db.query(Repository)
+            .filter(Repository.id.in_(repository_ids))
+            .all()
+        )
+        updates = repository_service.iter_update(db=db, repos=repos)
+        async with aclosing(updates) as results:
+            async for result in results:
+                if result.error is not None:
+                    logger.warning(
+                        "Background refresh of repository %s failed: %s",
+                        result.repository_id,
+                        result.error.detail
+                    )
+
+
+def _record_read(*, collection: Collection) -> None:
+    access_stats.record_read(
+        collection_ids=[collection.id],
+        repository_ids=[repo.id for repo in collection.repositories]
+    )
+
+
+def _mark_stale(*, repos: list[Repository], stale: set[UUID]) -> None:
+    """Marks repositories with given ids as stale."""
+    for repo in repos:
+        repo.stale = repo.id in stale
+
+
+async def _no_results() -> AsyncIterator[repository_service.UpdateResult]:
+    return
+    yield
@@ -1,25 +1,65 @@
+import logging
+import re
 from datetime import datetime, timezone
 from json import dumps, loads
+from time import perf_counter
 from fastapi import HTTPException
-from httpx import AsyncClient
+from httpx import AsyncClient, HTTPError, TimeoutException
 from sqlalchemy.orm import Session
 
+from app import metrics, timing
 from app.enums import Provider
 from app.config import settings
 from app.models.cached_response import CachedResponse
 from . import cache_service
 
 
+logger = logging.getLogger(__name__)
+
+# Rate limits of provider APIs, as (remaining, limit) reported by their last
+# responses.
+_rate_limits: dict[Provider, tuple[int, int]] = {}
+
+
 async def get(*, db: Session, provider: Provider, endpoint: str) -> dict | None:
     """Performs GET request to given endpoint of GitHub API.
 
-    Returns requested data or None if the data wasn't found.
+    Returns requested data or None if the data wasn't found. If the API
+    can't be reached or doesn't respond in time, raises HTTPException with
+    code 503 or 504.
     """
     url = _get_url(endpoint=endpoint, provider=provider)
 
     async with _get_client(db=db, provider=provider, url=url) as client:
+        start = perf_counter()
+        status = "error"
+        try:
+            response = await client.get(url)
+            if response.status_code in [200, 304, 404]:
+                status = str(response.status_code)
+        except HTTPError as e:
+            _handle_transport_error(error=e, provider=provider)
+        finally:
+            duration = perf_counter() - start
+            labels = {
+                "provider": provider.value,
+                "endpoint": _get_endpoint_template(
+                    endpoint=endpoint, provider=provider
+                ),
+                "status": status
+            }
+            metrics.UPSTREAM_REQUESTS.inc(**labels)
+            metrics.UPSTREAM_REQUEST_DURATION.observe(duration, **labels)
+            timing.record(f"upstream-{provider.value}", duration)
+
+        _record_rate_limit(provider=provider, headers=response.headers)
+        if "If-None-Match" in client.headers:
+            metrics.ETAG_REVALIDATIONS.inc(
+                provider=provider.value,
+                result="hit" if response.status_code == 304 else "miss"
+            )
         return _handle_response(
-            db=db, provider=provider, response = await client.get(url), url=url
+            db=db, provider=provider, response=response, url=url
         )
 
 
@@ -63,20 +103,59 @@ def _handle_response(
     _handle_error_code(code=response.status_code, provider=provider)
 
 
+def get_remaining_quota(*, provider: Provider) -> float | None:
+    """Returns fraction of the rate limit of provider API remaining after
+       the last request, or None if it isn't known.
+    """
+    if provider not in _rate_limits:
+        return None
+    remaining, limit = _rate_limits[provider]
+    return remaining / limit if limit > 0 else 0.0
+
+
+def _record_rate_limit(*, provider: Provider, headers) -> None:
+    """Stores rate limit reported in response headers (`X-RateLimit-*` by
+       GitHub, `RateLimit-*` by GitLab).
+    """
+    prefix = "X-RateLimit" if Provider.GITHUB == provider else "RateLimit"
+    try:
+        remaining = int(headers[f"{prefix}-Remaining"])
+        limit = int(headers[f"{prefix}-Limit"])
+    except (KeyError, ValueError):
+        return
+    _rate_limits[provider] = (remaining, limit)
+
+
 def _get_url(*, endpoint: str, provider: Provider) -> str:
     """Creates an url."""
     correct_endpoint = endpoint if endpoint[0] == "/" else "/" + endpoint
 
     if Provider.GITHUB == provider:
-        return "https://api.github.com" + correct_endpoint
+        return settings.github_api_url + correct_endpoint
     if Provider.GITLAB == provider:
-        return "https://gitlab.com/api/v4" + correct_endpoint
+        return settings.gitlab_api_url + correct_endpoint
+
+
+def _get_endpoint_template(*, endpoint: str, provider: Provider) -> str:
+    """Returns endpoint without query and with repository replaced by
+       a placeholder.
+    """
+    path = endpoint.split("?")[0]
+    path = path if path[0] == "/" else "/" + path
+
+    if Provider.GITHUB == provider:
+        return re.sub(r"^/repos/[^/]+/[^/]+", "/repos/{owner}/{name}", path)
+    if Provider.GITLAB == provider:
+        return re.sub(r"^/projects/[^/]+", "/projects/{id}", path)
 
 
 def _get_client(*, db: Session, provider: Provider, url: str) -> AsyncClient:
     """Creates default client for requests.
 
-    Uses auth data if it's present among enviroment variables.
+    Uses auth data if it's present among enviroment variables. Requests
+    time out after `upstream_timeout` seconds, which by default is longer
+    than `refresh_deadline`, so that reads return stale data at their
+    deadline instead of failing on the timeout.
     """
     headers = {}
     auth = None
@@ -94,7 +173,22 @@ def _get_client(*, db: Session, provider: Provider, url: str) -> AsyncClient:
         if settings.gitlab_username and settings.gitlab_token:
             auth = (settings.gitlab_username, settings.gitlab_token)
 
-    return AsyncClient(auth=auth, headers=headers)
+    return AsyncClient(
+        auth=auth, headers=headers, timeout=settings.upstream_timeout
+    )
+
+
+def _handle_transport_error(*, error: HTTPError, provider: Provider):
+    """Raises HTTPException for a request which got no response."""
+    logger.warning("Request to %s API failed: %r", provider.value, error)
+    name = "GitHub" if Provider.GITHUB == provider else "GitLab"
+    if isinstance(error, TimeoutException):
+        raise HTTPException(
+            status_code=504, detail=f"{name} API didn't respond in time."
+        )
+    raise HTTPException(
+        status_code=503, detail=f"Couldn't connect to {name} API."
+    )
 
 
 def _handle_error_code(*, code: int, provider: Provider):
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from uuid import UUID
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.refresh_job import RefreshJob
+
+
+def enqueue(*, db: Session, repository_ids: list[UUID]) -> None:
+    """Adds refresh jobs of given repositories to the queue.
+
+    Repositories which already have a pending job aren't added again.
+    """
+    if not repository_ids:
+        return
+
+    db.execute(
+        insert(RefreshJob)
+        .values([
+            {"repository_id": repository_id}
+            for repository_id in dict.fromkeys(repository_ids)
+        ])
+        .on_conflict_do_nothing()
+    )
+    db.commit()
+
+
+def claim(*, db: Session, limit: int) -> list[UUID]:
+    """Takes up to `limit` of the oldest available jobs from the queue.
+
+    Jobs are leased for `worker_lease` seconds: if a job isn't completed or
+    failed before then (e.g. because its worker crashed), it can be claimed
+    again. Jobs locked by other workers are skipped, so many workers can
+    claim jobs at the same time. Returns ids of the repositories to refresh.
+    """
+    available = (
+        select(RefreshJob.repository_id)
+        .where(or_(
+            RefreshJob.locked_until.is_(None),
+            RefreshJob.locked_until < func.now()
+        ))
+        .order_by(RefreshJob.enqueued_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    repository_ids = db.execute(
+        update(RefreshJob)
+        .where(RefreshJob.repository_id.in_(available.scalar_subquery()))
+        .values(
+            locked_until=func.now() + timedelta(seconds=settings.worker_lease),
+            attempts=RefreshJob.attempts + 1
+        )
+        .returning(RefreshJob.repository_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return repository_ids
+
+
+def complete(*, db: Session, repository_id: UUID) -> None:
+    """Removes finished job from the queue."""
+    db.query(RefreshJob).filter(
+        RefreshJob.repository_id == repository_id
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def fail(*, db: Session, repository_id: UUID, error: str) -> bool:
+    """Schedules failed job to be retried later.
+
+    Delay grows exponentially with the number of attempts. After
+    `refresh_max_attempts` attempts the job is removed. Returns whether
+    the job will be retried.
+    """
+    job = db.get(RefreshJob, repository_id)
+    if job is None:
+        return False
+
+    retry = job.attempts < settings.refresh_max_attempts
+    if retry:
+        delay = settings.worker_retry_delay * 2 ** (job.attempts - 1)
+        job.locked_until = func.now() + timedelta(seconds=delay)
+        job.last_error = error
+    else:
+        db.delete(job)
+    db.commit()
+    return retry
@@ -1,11 +1,44 @@
-from datetime import datetime, timezone
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import AsyncIterator, NamedTuple
+from uuid import UUID
 from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
 from sqlalchemy.orm import Session
 
 from . import provider_service
+from app import metrics
+from app.config import settings
+from app.database import get_engine
 from app.models.repository import Repository, Provider
 
 
+logger = logging.getLogger(__name__)
+
+RepositoryKey = tuple[str, str, Provider]
+
+# How often GitLab updates `last_activity_at` of a project at most.
+GITLAB_ACTIVITY_RESOLUTION = timedelta(hours=1)
+
+# Connection holding advisory locks of refreshes in progress in this process
+# and keys of the locks.
+_lock_connection: Connection | None = None
+_held_locks: set[int] = set()
+
+
+class UpdateResult(NamedTuple):
+    repository_id: UUID
+    repo: Repository
+    exists: bool
+    error: HTTPException | None = None
+
+
 def get(
     *, db: Session, name: str, owner: str, provider: Provider
 ) -> Repository | None:
@@ -24,115 +57,556 @@ def get(
     )
 
 
+def get_many(
+    *, db: Session, keys: list[RepositoryKey]
+) -> dict[RepositoryKey, Repository]:
+    """Returns repositories with given (name, owner, provider) keys.
+
+    Repositories that don't exist in the database are omitted. All of them
+    are fetched with a single query.
+    """
+    if not keys:
+        return {}
+
+    repos = (
+        db.query(Repository)
+        .filter(
+            tuple_(Repository.name, Repository.owner, Repository.provider)
+            .in_(keys)
+        )
+        .all()
+    )
+    return {(repo.name, repo.owner, repo.provider): repo for repo in repos}
+
+
 async def add(
     *, db: Session, name: str, owner: str, provider: Provider
 ) -> Repository:
     """Adds a repository to the database.
 
     If it doesn't exist, raises HTTPException. If it's already added,
-    does nothing.
+    does nothing. Date of the last push is taken from the existence check.
     """
-    await _assert_exists(db=db, name=name, owner=owner, provider=provider)
+    metadata = await _assert_exists(
+        db=db, name=name, owner=owner, provider=provider
+    )
 
     repo = get(db=db, name=name, owner=owner, provider=provider)
     if repo is None:
-        repo = Repository(name=name, owner=owner, provider=provider)
-        db.add(repo)
+        _insert(db=db, metadata={(name, owner, provider): metadata})
         db.commit()
-        db.refresh(repo)
+        repo = get(db=db, name=name, owner=owner, provider=provider)
 
     return repo
 
 
-async def update(*, db: Session, repo: Repository) -> None:
+async def add_many(
+    *, db: Session, keys: list[RepositoryKey]
+) -> dict[RepositoryKey, Repository | None]:
+    """Adds many repositories to the database at once.
+
+    Existence of the repositories is checked concurrently. Returns
+    a dictionary mapping each key to its repository, or to None if the
+    repository doesn't exist. New repositories are inserted, but not
+    committed.
+    """
+    keys = list(dict.fromkeys(keys))
+    metadata = await _gather(*(
+        _get_metadata(db=db, name=name, owner=owner, provider=provider)
+        for name, owner, provider in keys
+    ))
+
+    found = {
+        key: data for key, data in zip(keys, metadata) if data is not None
+    }
+    repos = get_many(db=db, keys=list(found))
+    missing = [key for key in found if key not in repos]
+    if missing:
+        _insert(db=db, metadata={key: found[key] for key in missing})
+        repos.update(get_many(db=db, keys=missing))
+
+    return {key: repos.get(key) for key in keys}
+
+
+async def update(*, db: Session, repo: Repository) -> bool:
     """Updates the repository data.
 
-    If the repository no longer exists, removes it.
+    If the repository no longer exists, removes it and returns False.
+
+    Refreshes of a repository are serialized across processes with
+    a Postgres advisory lock. If another process is already refreshing the
+    repository, waits for it to finish and reloads its result instead of
+    fetching the data again.
     """
-    exists = await _exists(
+    async with _refresh_lock(repository_id=repo.id) as acquired:
+        if not acquired:
+            metrics.REFRESH_LOCK_WAITS.inc(result="reused")
+            return _reload(db=db, repo=repo)
+        return await _refresh(db=db, repo=repo)
+
+
+async def _refresh(*, db: Session, repo: Repository) -> bool:
+    """Fetches the repository data from its provider.
+
+    Metadata of the repository is fetched first. Commits are fetched only if
+    something was pushed since the previous refresh. If any of the requests
+    doesn't find the repository, it's removed.
+    """
+    metadata = await _get_metadata(
         db=db, name=repo.name, owner=repo.owner, provider=repo.provider
     )
+    exists = metadata is not None
+    if exists and Provider.GITHUB == repo.provider:
+        exists = await _update_github(db=db, repo=repo, metadata=metadata)
+    if exists and Provider.GITLAB == repo.provider:
+        exists = await _update_gitlab(db=db, repo=repo, metadata=metadata)
+
     if not exists:
         db.delete(repo)
         db.commit()
-        return
+    return exists
+
+
+async def iter_update(
+    *, db: Session, repos: list[Repository], concurrency: int | None = None
+) -> AsyncIterator[UpdateResult]:
+    """Updates given repositories concurrently.
+
+    At most `concurrency` (by default `upstream_concurrency`) updates run
+    at the same time. Yields result for each repository as soon as its
+    update finishes. HTTPException raised during the update (including
+    the ones raised by `provider_service.get` for unreachable APIs) is
+    returned in the result instead of being raised. Any other exception is
+    logged (rolling back the session if it's a database error) and a 500
+    HTTPException is returned in its place, so one broken repository
+    doesn't abort the others. Updates that haven't finished when the
+    iteration stops are cancelled.
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.upstream_concurrency)
 
-    if Provider.GITHUB == repo.provider:
-        await _update_github(db=db, repo=repo)
-    if Provider.GITLAB == repo.provider:
-        await _update_gitlab(db=db, repo=repo)
+    async def run(repository_id: UUID, repo: Repository) -> UpdateResult:
+        metrics.REFRESH_QUEUE_DEPTH.inc()
+        try:
+            async with semaphore:
+                exists = await update(db=db, repo=repo)
+        except HTTPException as e:
+            return UpdateResult(repository_id, repo, True, e)
+        except Exception as e:
+            logger.exception("Updating repository %s failed.", repository_id)
+            if isinstance(e, DBAPIError):
+                db.rollback()
+            error = HTTPException(
+                status_code=500, detail="Unexpected error while updating."
+            )
+            return UpdateResult(repository_id, repo, True, error)
+        finally:
+            metrics.REFRESH_QUEUE_DEPTH.dec()
+        return UpdateResult(repository_id, repo, exists)
 
+    tasks = [asyncio.create_task(run(repo.id, repo)) for repo in repos]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _update_github(
+    *, db: Session, repo: Repository, metadata: dict
+) -> bool:
+    """Updates GitHub repo data.
+
+    Returns False if the repository wasn't found.
+    """
+    last_commit_at = repo.last_commit_at
+    last_release_at = repo.last_release_at
 
-async def _update_github(*, db: Session, repo: Repository):
-    """Updates GitHub repo data."""
     # update last_commit_at
-    endpoint = f"/repos/{repo.owner}/{repo.name}/commits?per_page=1"
-    data = await provider_service.get(
-        db=db, provider=repo.provider, endpoint=endpoint
-    )
-    if len(data) > 0:
-        date = data[0]["commit"]["author"]["date"]
-        repo.last_commit_at = provider_service.parse_date(
-            date=date, provider=repo.provider
+    if _has_new_push(repo=repo, metadata=metadata):
+        endpoint = f"/repos/{repo.owner}/{repo.name}/commits?per_page=1"
+        data = await provider_service.get(
+            db=db, provider=repo.provider, endpoint=endpoint
         )
+        if data is None:
+            return False
+        if len(data) > 0:
+            date = data[0]["commit"]["author"]["date"]
+            last_commit_at = provider_service.parse_date(
+                date=date, provider=repo.provider
+            )
 
     # update last_release_at
     endpoint = f"/repos/{repo.owner}/{repo.name}/releases?per_page=1"
     data = await provider_service.get(
         db=db, provider=repo.provider, endpoint=endpoint
     )
+    if data is None:
+        return False
     if len(data) > 0:
         date = data[0]["published_at"]
-        repo.last_release_at = provider_service.parse_date(
+        last_release_at = provider_service.parse_date(
             date=date, provider=repo.provider
         )
 
-    db.commit()
+    _save(
+        db=db,
+        repo=repo,
+        metadata=metadata,
+        last_commit_at=last_commit_at,
+        last_release_at=last_release_at
+    )
+    return True
+
 
+async def _update_gitlab(
+    *, db: Session, repo: Repository, metadata: dict
+) -> bool:
+    """Updates GitLab repo data.
+
+    Returns False if the repository wasn't found.
+    """
+    last_commit_at = repo.last_commit_at
+    last_release_at = repo.last_release_at
 
-async def _update_gitlab(*, db: Session, repo: Repository) -> None:
-    """Updates GitLab repo data."""
     # update last_commit_at
-    endpoint = f"/projects/{repo.owner}%2F{repo.name}/repository/commits?per_page=1"
-    data = await provider_service.get(
-        db=db, provider=repo.provider, endpoint=endpoint
-    )
-    if len(data) > 0:
-        date = data[0]["committed_date"]
-        repo.last_commit_at = provider_service.parse_date(
-            date=date, provider=repo.provider
+    if _has_new_push(repo=repo, metadata=metadata):
+        endpoint = f"/projects/{repo.owner}%2F{repo.name}/repository/commits?per_page=1"
+        data = await provider_service.get(
+            db=db, provider=repo.provider, endpoint=endpoint
         )
+        if data is None:
+            return False
+        if len(data) > 0:
+            date = data[0]["committed_date"]
+            last_commit_at = provider_service.parse_date(
+                date=date, provider=repo.provider
+            )
 
     # update last_release_at
     endpoint = f"/projects/{repo.owner}%2F{repo.name}/releases?per_page=1"
     data = await provider_service.get(
         db=db, provider=repo.provider, endpoint=endpoint
     )
+    if data is None:
+        return False
     if len(data) > 0:
         date = data[0]["released_at"]
-        repo.last_release_at = provider_service.parse_date(
+        last_release_at = provider_service.parse_date(
             date=date, provider=repo.provider
         )
 
+    _save(
+        db=db,
+        repo=repo,
+        metadata=metadata,
+        last_commit_at=last_commit_at,
+        last_release_at=last_release_at
+    )
+    return True
+
+
+def _save(
+    *,
+    db: Session,
+    repo: Repository,
+    metadata: dict,
+    last_commit_at: datetime | None,
+    last_release_at: datetime | None
+) -> None:
+    """Stores data fetched by a refresh.
+
+    Concurrent refreshes share the session and each of them commits it, so
+    attributes are set only after all requests of the refresh succeeded.
+    Otherwise a refresh failing halfway would have its partial data
+    committed by the others.
+    """
+    activity = _get_activity(repo)
+    repo.last_commit_at = last_commit_at
+    repo.last_release_at = last_release_at
+    _schedule_next_poll(repo=repo, changed=_get_activity(repo) != activity)
+    repo.last_pushed_at = _get_pushed_at(
+        metadata=metadata, provider=repo.provider
+    )
+    repo.refreshed_at = func.now()
     db.commit()
 
 
-async def _exists(
+def _get_activity(repo: Repository) -> list[datetime | None]:
+    """Returns dates of the last commit and release of the repository, in
+       UTC.
+    """
+    return [_as_utc(repo.last_commit_at), _as_utc(repo.last_release_at)]
+
+
+def _has_new_push(*, repo: Repository, metadata: dict) -> bool:
+    """Checks if anything could have been pushed to the repository since
+       its commits were fetched, according to its metadata.
+
+    GitLab updates `last_activity_at` at most once per
+    `GITLAB_ACTIVITY_RESOLUTION`, so a push soon after other activity may
+    leave it unchanged. Its commits are skipped only if the stored activity
+    is older than the previous refresh by more than that.
+    """
+    pushed_at = _get_pushed_at(metadata=metadata, provider=repo.provider)
+    last_pushed_at = _as_utc(repo.last_pushed_at)
+    refreshed_at = _as_utc(repo.refreshed_at)
+    unchanged = (
+        refreshed_at is not None
+        and pushed_at is not None
+        and pushed_at == last_pushed_at
+        and (
+            Provider.GITLAB != repo.provider
+            or refreshed_at - last_pushed_at > GITLAB_ACTIVITY_RESOLUTION
+        )
+    )
+    if unchanged:
+        metrics.COMMIT_FETCHES.inc(result="skipped")
+        return False
+    metrics.COMMIT_FETCHES.inc(result="fetched")
+    return True
+
+
+def _get_pushed_at(*, metadata: dict, provider: Provider) -> datetime | None:
+    """Returns date of the last push (`pushed_at` of GitHub, or
+       `last_activity_at` of GitLab) from repository metadata.
+    """
+    key = "pushed_at" if Provider.GITHUB == provider else "last_activity_at"
+    date = metadata.get(key)
+    if date is None:
+        return None
+    return provider_service.parse_date(date=date, provider=provider)
+
+
+def _as_utc(date: datetime | None) -> datetime | None:
+    """Marks date stored in the database (without time zone) as UTC."""
+    if date is None or date.tzinfo is not None:
+        return date
+    return date.replace(tzinfo=timezone.utc)
+
+
+def _schedule_next_poll(*, repo: Repository, changed: bool) -> None:
+    """Sets polling interval of the repository and time of its next refresh.
+
+    The interval is divided by `poll_interval_backoff` if the last commit or
+    release changed since the previous refresh, and multiplied by it
+    otherwise. It's never longer than time since the last activity, so
+    a repository active recently is polled often even if it was dormant
+    before. The interval stays between `poll_interval_min` and
+    `poll_interval_max`, and starts at the minimum.
+    """
+    interval = settings.poll_interval_min
+    if repo.poll_interval is not None:
+        interval = (
+            repo.poll_interval / settings.poll_interval_backoff
+            if changed
+            else repo.poll_interval * settings.poll_interval_backoff
+        )
+
+    dates = [date for date in _get_activity(repo) if date is not None]
+    if dates:
+        idle = datetime.now(timezone.utc) - max(dates)
+        interval = min(interval, idle.total_seconds())
+
+    repo.poll_interval = min(
+        max(interval, settings.poll_interval_min), settings.poll_interval_max
+    )
+    repo.next_poll_at = func.now() + timedelta(seconds=repo.poll_interval)
+
+
+@asynccontextmanager
+async def _refresh_lock(*, repository_id: UUID) -> AsyncIterator[bool]:
+    """Holds advisory lock of the repository refresh.
+
+    Yields True if the lock was acquired, so the repository should be
+    refreshed. Otherwise waits until the current holder releases the lock
+    and yields False. If the lock isn't released within
+    `refresh_lock_timeout`, gives up waiting and yields True.
+
+    Locks of all refreshes of this process are held on one shared
+    connection (see `_get_lock_connection`), so refreshes in progress use
+    at most one connection from the pool besides their sessions.
+    """
+    key = _get_lock_key(repository_id)
+    if _try_lock(key=key):
+        try:
+            yield True
+        finally:
+            _unlock(key=key)
+        return
+
+    deadline = monotonic() + settings.refresh_lock_timeout
+    while monotonic() < deadline:
+        await asyncio.sleep(settings.refresh_lock_poll_interval)
+        # The lock is released right away, it's taken only to find out
+        # that the other refresh has finished.
+        if _try_lock(key=key):
+            _unlock(key=key)
+            break
+    else:
+        metrics.REFRESH_LOCK_WAITS.inc(result="timeout")
+        logger.warning(
+            "Refresh lock of repository %s wasn't released in %s s, "
+            "refreshing anyway.",
+            repository_id,
+            settings.refresh_lock_timeout
+        )
+        yield True
+        return
+    yield False
+
+
+def _try_lock(*, key: int) -> bool:
+    """Tries to take session-level advisory lock with given key.
+
+    The same connection can take a session-level lock many times, so locks
+    held by this process are also tracked in `_held_locks`.
+    """
+    if key in _held_locks:
+        return False
+    acquired = _execute_lock(func.pg_try_advisory_lock(key))
+    if acquired:
+        _held_locks.add(key)
+    return acquired
+
+
+def _unlock(*, key: int) -> None:
+    """Releases lock taken with `_try_lock`.
+
+    If the lock connection fails, it's discarded, which releases all locks
+    of this process. Refreshes in progress then just aren't guarded any
+    more, so the failure isn't raised.
+    """
+    _held_locks.discard(key)
+    try:
+        _execute_lock(func.pg_advisory_unlock(key))
+    except DBAPIError:
+        logger.exception("Releasing refresh lock failed.")
+
+
+def _execute_lock(function) -> bool:
+    """Executes advisory lock function on the lock connection."""
+    try:
+        return _get_lock_connection().execute(select(function)).scalar()
+    except DBAPIError:
+        _close_lock_connection()
+        raise
+
+
+def _get_lock_connection() -> Connection:
+    """Returns connection holding refresh locks of this process, opening it
+       on first use.
+
+    The connection is in autocommit mode, so it doesn't stay idle in
+    a transaction between the locks. Its statements are never executed
+    again by `EXPLAIN ANALYZE` of slow queries, which would take or release
+    a lock twice.
+    """
+    global _lock_connection
+    if _lock_connection is None or _lock_connection.closed:
+        _lock_connection = (
+            get_engine()
+            .execution_options(
+                isolation_level="AUTOCOMMIT", explain_analyze=False
+            )
+            .connect()
+        )
+    return _lock_connection
+
+
+def _close_lock_connection() -> None:
+    """Closes the lock connection, which releases all its locks."""
+    global _lock_connection
+    if _lock_connection is not None:
+        _lock_connection.invalidate()
+        _lock_connection.close()
+        _lock_connection = None
+    _held_locks.clear()
+
+
+def _get_lock_key(repository_id: UUID) -> int:
+    """Returns advisory lock key (a signed 64-bit integer) of the repository
+       refresh.
+    """
+    return int.from_bytes(repository_id.bytes[:8], "big", signed=True)
+
+
+def _reload(*, db: Session, repo: Repository) -> bool:
+    """Reloads repository refreshed by another process.
+
+    Returns False if the other process removed it.
+    """
+    try:
+        db.refresh(repo)
+    except InvalidRequestError:
+        db.expunge(repo)
+        return False
+    return True
+
+
+async def _get_metadata(
     *, db: Session, name: str, owner: str, provider: Provider
-) -> bool:
-    """Checks if the repository exists."""
+) -> dict | None:
+    """Returns metadata of the repository or None if it doesn't exist."""
     if Provider.GITHUB == provider:
         endpoint = f"/repos/{owner}/{name}"
     if Provider.GITLAB == provider:
         endpoint = f"/projects/{owner}%2F{name}"
 
-    data = await provider_service.get(db=db, provider=provider, endpoint=endpoint)
-    return data is not None
+    return await provider_service.get(
+        db=db, provider=provider, endpoint=endpoint
+    )
 
 
 async def _assert_exists(
     *, db: Session, name: str, owner: str, provider: Provider
-) -> None:
-    """Raises HTTPException if the repository does not exist."""
-    if not await _exists(db=db, name=name, owner=owner, provider=provider):
+) -> dict:
+    """Returns metadata of the repository.
+
+    Raises HTTPException if the repository does not exist.
+    """
+    metadata = await _get_metadata(
+        db=db, name=name, owner=owner, provider=provider
+    )
+    if metadata is None:
         raise HTTPException(status_code=404, detail="Repository not found.")
+    return metadata
+
+
+def _insert(*, db: Session, metadata: dict[RepositoryKey, dict]) -> None:
+    """Inserts repositories with given keys and metadata, skipping
+       the existing ones.
+    """
+    db.execute(
+        insert(Repository)
+        .values([
+            {
+                "name": name,
+                "owner": owner,
+                "provider": provider,
+                "last_pushed_at": _get_pushed_at(
+                    metadata=data, provider=provider
+                )
+            }
+            for (name, owner, provider), data in metadata.items()
+        ])
+        .on_conflict_do_nothing(
+            index_elements=[
+                Repository.name, Repository.owner, Repository.provider
+            ]
+        )
+    )
+
+
+async def _gather(*aws) -> list:
+    """Runs given awaitables concurrently and returns their results.
+
+    At most `settings.upstream_concurrency` of them are run at once.
+    """
+    semaphore = asyncio.Semaphore(settings.upstream_concurrency)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws))
@@ -0,0 +1,83 @@
+from datetime import timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.collection import Collection
+from app.models.repository import Repository
+from app.models.tracked_repository import TrackedRepository
+
+
+def is_due():
+    """Returns condition matching repositories whose polling interval has
+       elapsed (or which were never refreshed).
+    """
+    return or_(
+        Repository.next_poll_at.is_(None),
+        Repository.next_poll_at <= func.now()
+    )
+
+
+def get_due(*, db: Session, limit: int) -> list[Repository]:
+    """Returns repositories which should be refreshed next, in order.
+
+    Only repositories of collections read within `scheduler_active_window`
+    seconds, which are due according to their polling interval, are
+    returned. Each collection contributes at most
+    `scheduler_per_collection_limit` of its stalest repositories, taken in
+    turns: the stalest repository of every collection goes before
+    the second stalest one of any collection, so that a huge collection
+    doesn't starve the others. Within a turn, repositories of collections
+    read more often go first.
+    """
+    now = func.now()
+    rank = func.row_number().over(
+        partition_by=TrackedRepository.collection_id,
+        order_by=(Repository.refreshed_at.asc().nullsfirst(), Repository.id)
+    )
+    ranked = (
+        db.query(
+            Repository.id.label("repository_id"),
+            Repository.read_count.label("repository_reads"),
+            Repository.refreshed_at.label("refreshed_at"),
+            Collection.read_count.label("collection_reads"),
+            rank.label("rank")
+        )
+        .join(
+            TrackedRepository, TrackedRepository.repository_id == Repository.id
+        )
+        .join(Collection, Collection.id == TrackedRepository.collection_id)
+        .filter(
+            Collection.last_read_at
+            > now - timedelta(seconds=settings.scheduler_active_window)
+        )
+        .filter(is_due())
+        .subquery()
+    )
+    # A repository tracked by many collections is refreshed once, in its
+    # earliest turn.
+    rows = (
+        db.query(ranked.c.repository_id)
+        .filter(ranked.c.rank <= settings.scheduler_per_collection_limit)
+        .group_by(
+            ranked.c.repository_id,
+            ranked.c.repository_reads,
+            ranked.c.refreshed_at
+        )
+        .order_by(
+            func.min(ranked.c.rank),
+            func.max(ranked.c.collection_reads).desc(),
+            ranked.c.repository_reads.desc(),
+            ranked.c.refreshed_at.asc().nullsfirst(),
+            ranked.c.repository_id
+        )
+        .limit(limit)
+        .all()
+    )
+
+    ids = [row.repository_id for row in rows]
+    repos = {
+        repo.id: repo
+        for repo in db.query(Repository).filter(Repository.id.in_(ids))
+    }
+    return [repos[repository_id] for repository_id in ids]
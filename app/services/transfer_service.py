@@ -0,0 +1,195 @@
+import codecs
+import csv
+import io
+from json import dumps
+from typing import AsyncIterator, Iterator
+from uuid import UUID
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import mark_written
+from app.enums import TransferFormat
+from app.models.repository import Repository
+from app.models.tracked_repository import TrackedRepository
+from app.schemas.repository_schemas import RepositoryRecord
+
+
+FIELDS = ["name", "owner", "provider", "last_commit_at", "last_release_at"]
+
+MEDIA_TYPES = {
+    TransferFormat.NDJSON: "application/x-ndjson",
+    TransferFormat.CSV: "text/csv",
+}
+
+
+def export_repositories(
+    *, db: Session, collection_id: UUID, format: TransferFormat
+) -> Iterator[str]:
+    """Yields repositories of given collection, one line per repository.
+
+    Rows are read from a server-side cursor in chunks, so memory usage
+    doesn't depend on the size of the collection. CSV output starts with
+    a header line.
+    """
+    rows = (
+        db.query(
+            Repository.name,
+            Repository.owner,
+            Repository.provider,
+            Repository.last_commit_at,
+            Repository.last_release_at
+        )
+        .join(
+            TrackedRepository,
+            TrackedRepository.repository_id == Repository.id
+        )
+        .filter(TrackedRepository.collection_id == collection_id)
+        .yield_per(settings.transfer_chunk_size)
+    )
+
+    if TransferFormat.CSV == format:
+        yield _to_csv_line(FIELDS)
+    for row in rows:
+        values = [
+            row.name,
+            row.owner,
+            row.provider.value,
+            row.last_commit_at.isoformat() if row.last_commit_at else None,
+            row.last_release_at.isoformat() if row.last_release_at else None
+        ]
+        if TransferFormat.CSV == format:
+            yield _to_csv_line(values)
+        else:
+            yield dumps(dict(zip(FIELDS, values))) + "\n"
+
+
+async def import_repositories(
+    *,
+    db: Session,
+    collection_id: UUID,
+    lines: AsyncIterator[str],
+    format: TransferFormat
+) -> int:
+    """Adds repositories read from given lines to the collection.
+
+    Lines are expected in the format produced by `export_repositories`.
+    Records are inserted in chunks, each chunk in its own transaction, so
+    memory usage doesn't depend on the size of the input. Existence of the
+    repositories isn't checked, the ones that no longer exist are removed
+    on the next update. If a record is invalid, HTTPException is raised
+    (chunks before it stay imported).
+
+    Returns number of imported records.
+    """
+    count = 0
+    chunk = []
+    async for record in _parse_records(lines=lines, format=format):
+        chunk.append(record)
+        if len(chunk) >= settings.transfer_chunk_size:
+            _import_chunk(db=db, collection_id=collection_id, records=chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        _import_chunk(db=db, collection_id=collection_id, records=chunk)
+        count += len(chunk)
+
+    return count
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Splits stream of UTF-8 encoded bytes into lines."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    rest = ""
+    async for chunk in chunks:
+        rest += decoder.decode(chunk)
+        *lines, rest = rest.split("\n")
+        for line in lines:
+            yield line
+    rest += decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
+
+def _import_chunk(
+    *, db: Session, collection_id: UUID, records: list[RepositoryRecord]
+) -> None:
+    """Inserts given records and their memberships in a single transaction.
+
+    Repositories that already exist are left unchanged.
+    """
+    records = {
+        (record.name, record.owner, record.provider): record
+        for record in records
+    }
+    db.execute(
+        insert(Repository)
+        .values([record.dict() for record in records.values()])
+        .on_conflict_do_nothing(
+            index_elements=[
+                Repository.name, Repository.owner, Repository.provider
+            ]
+        )
+    )
+    repo_ids = [
+        row.id
+        for row in (
+            db.query(Repository.id)
+            .filter(
+                tuple_(Repository.name, Repository.owner, Repository.provider)
+                .in_(list(records.keys()))
+            )
+        )
+    ]
+
+    db.execute(
+        insert(TrackedRepository)
+        .values([
+            {"repository_id": repo_id, "collection_id": collection_id}
+            for repo_id in repo_ids
+        ])
+        .on_conflict_do_nothing()
+    )
+    db.commit()
+    mark_written(collection_id)
+
+
+async def _parse_records(
+    *, lines: AsyncIterator[str], format: TransferFormat
+) -> AsyncIterator[RepositoryRecord]:
+    """Parses lines to records, skipping empty ones.
+
+    If a line is invalid, HTTPException is raised.
+    """
+    header = None
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            if TransferFormat.CSV == format:
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = values
+                    continue
+                yield RepositoryRecord(**{
+                    field: value or None
+                    for field, value in zip(header, values)
+                })
+            else:
+                yield RepositoryRecord.parse_raw(line)
+        except ValidationError:
+            raise HTTPException(
+                status_code=422, detail=f"Invalid record in line {number}."
+            )
+
+
+def _to_csv_line(values: list) -> str:
+    """Serializes values to a single CSV line."""
+    output = io.StringIO()
+    csv.writer(output, lineterminator="\n").writerow(values)
+    return output.getvalue()
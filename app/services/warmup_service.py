@@ -0,0 +1,97 @@
+import logging
+from contextlib import aclosing
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import provider_service, repository_service, schedule_service
+from app.config import settings
+from app.enums import Provider
+from app.models.repository import Repository
+from app.models.tracked_repository import TrackedRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_candidates(*, db: Session, limit: int) -> list[Repository]:
+    """Returns repositories which should be warmed up first.
+
+    Only repositories due according to their polling interval are returned.
+    Repositories read most often go first, then the ones tracked by more
+    collections. Among them, the ones refreshed longest ago (or never) are
+    preferred.
+    """
+    collections = func.count(TrackedRepository.collection_id)
+    return (
+        db.query(Repository)
+        .join(TrackedRepository)
+        .filter(schedule_service.is_due())
+        .group_by(Repository.id)
+        .order_by(
+            Repository.read_count.desc(),
+            collections.desc(),
+            Repository.refreshed_at.asc().nullsfirst(),
+            Repository.id
+        )
+        .limit(limit)
+        .all()
+    )
+
+
+async def warm_up(
+    *, db: Session, limit: int | None = None, concurrency: int | None = None
+) -> dict[str, int]:
+    """Refreshes repositories returned by `get_candidates`, in batches of
+       `concurrency` (by default `warmup_concurrency`) repositories.
+
+    Before each batch, remaining rate limit of each provider API is
+    checked. Repositories of a provider are skipped once less than
+    `warmup_min_remaining_quota` of its rate limit remains, so that the
+    quota is left for requests of users. A repository which fails to
+    refresh, whatever the error, is counted as failed and the warm-up goes
+    on. Returns number of repositories by result (refreshed, removed,
+    failed, skipped).
+    """
+    concurrency = concurrency or settings.warmup_concurrency
+    repos = get_candidates(db=db, limit=limit or settings.warmup_limit)
+    counts = {"refreshed": 0, "removed": 0, "failed": 0, "skipped": 0}
+
+    for start in range(0, len(repos), concurrency):
+        batch = []
+        for repo in repos[start:start + concurrency]:
+            if _has_quota(provider=repo.provider):
+                batch.append(repo)
+            else:
+                counts["skipped"] += 1
+
+        updates = repository_service.iter_update(
+            db=db, repos=batch, concurrency=concurrency
+        )
+        async with aclosing(updates) as results:
+            async for result in results:
+                if result.error is not None:
+                    counts["failed"] += 1
+                    logger.warning(
+                        "Warming up repository %s failed: %s",
+                        result.repository_id,
+                        result.error.detail
+                    )
+                elif result.exists:
+                    counts["refreshed"] += 1
+                else:
+                    counts["removed"] += 1
+
+    logger.info(
+        "Warm-up finished: %s.",
+        ", ".join(f"{count} {result}" for result, count in counts.items())
+    )
+    return counts
+
+
+def _has_quota(*, provider: Provider) -> bool:
+    """Checks if enough of the provider API rate limit remains."""
+    remaining = provider_service.get_remaining_quota(provider=provider)
+    return (
+        remaining is None
+        or remaining >= settings.warmup_min_remaining_quota
+    )
@@ -0,0 +1,161 @@
+import logging
+import sys
+from collections import deque
+from datetime import datetime, timezone
+
+from app import metrics
+from app.config import settings
+
+
+logger = logging.getLogger("app.slow_queries")
+
+_queries = deque(maxlen=settings.slow_query_history)
+
+
+def is_slow(duration: float) -> bool:
+    """Checks if statement with given duration should be recorded."""
+    return (
+        settings.slow_query_threshold is not None
+        and duration >= settings.slow_query_threshold
+    )
+
+
+def record(
+    *,
+    cursor,
+    statement: str,
+    parameters,
+    executemany: bool,
+    duration: float,
+    analyze: bool = True
+) -> dict:
+    """Logs and stores a slow statement.
+
+    Values of the parameters aren't stored, only their types. If
+    `slow_query_explain` is set, plan of the statement is captured on the
+    same connection, only for single SELECT statements. Inside
+    a transaction it's captured with `EXPLAIN (ANALYZE, BUFFERS)`, which
+    executes the statement again, unless `analyze` is False (the
+    `explain_analyze` execution option of the connection or statement).
+    """
+    operation = statement.lstrip().split(None, 1)[0].upper()
+    plan = None
+    if (
+        settings.slow_query_explain
+        and operation == "SELECT"
+        and not executemany
+    ):
+        plan = _explain(
+            cursor=cursor,
+            statement=statement,
+            parameters=parameters,
+            analyze=analyze
+        )
+
+    query = {
+        "recorded_at": datetime.now(timezone.utc),
+        "statement": statement,
+        "parameters": (
+            _get_shape(parameters, executemany) if parameters else None
+        ),
+        "duration": duration,
+        "origin": _get_origin(),
+        "plan": plan,
+    }
+    _queries.append(query)
+    metrics.DB_SLOW_QUERIES.inc(
+        operation=(
+            operation
+            if operation in ["SELECT", "INSERT", "UPDATE", "DELETE"]
+            else "OTHER"
+        )
+    )
+    logger.warning(
+        "Slow query (%.1f ms) from %s: %s%s",
+        duration * 1000,
+        query["origin"],
+        " ".join(statement.split()),
+        f"\n{plan}" if plan else ""
+    )
+    return query
+
+
+def get_queries() -> list[dict]:
+    """Returns stored slow statements, the newest first."""
+    return list(reversed(_queries))
+
+
+def _explain(
+    *, cursor, statement: str, parameters, analyze: bool
+) -> str | None:
+    """Returns plan of the statement or None if it couldn't be explained.
+
+    Inside a transaction, EXPLAIN runs in a savepoint, which is always
+    rolled back, so that its failure doesn't abort the transaction and
+    transactional side effects of executing the statement again (e.g.
+    a notification) aren't kept. Session-level side effects, like
+    session-level advisory locks, survive the rollback, so statements
+    with them should opt out with `analyze=False`. Outside a transaction
+    nothing could be rolled back, so the statement is never executed
+    again: only the estimated plan is returned.
+    """
+    connection = cursor.connection
+    in_transaction = not connection.autocommit
+    explain = (
+        "EXPLAIN (ANALYZE, BUFFERS) "
+        if in_transaction and analyze
+        else "EXPLAIN "
+    )
+    explain_cursor = connection.cursor()
+    try:
+        if in_transaction:
+            explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute(explain + statement, parameters)
+            return "\n".join(row[0] for row in explain_cursor.fetchall())
+        except Exception:
+            logger.exception("Slow query couldn't be explained.")
+            return None
+        finally:
+            if in_transaction:
+                explain_cursor.execute(
+                    "ROLLBACK TO SAVEPOINT slow_query_explain"
+                )
+                explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        explain_cursor.close()
+
+
+def _get_shape(parameters, executemany: bool):
+    """Returns parameters with values replaced by their type names."""
+    if executemany:
+        return {
+            "rows": len(parameters),
+            "row": _get_shape(parameters[0], False) if parameters else None
+        }
+    if isinstance(parameters, dict):
+        return {
+            key: _get_shape(value, False) for key, value in parameters.items()
+        }
+    if isinstance(parameters, (list, tuple)):
+        return [_get_shape(value, False) for value in parameters]
+    return type(parameters).__name__
+
+
+def _get_origin() -> str | None:
+    """Returns app function (preferably a service function) which executed
+       the statement, as `module.function:line`.
+    """
+    origin = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module not in [
+            __name__, "app.database"
+        ]:
+            location = f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+            if module.startswith("app.services."):
+                return location
+            origin = origin or location
+        frame = frame.f_back
+    return origin
@@ -0,0 +1,102 @@
+import asyncio
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from time import perf_counter
+from typing import Callable, Iterator
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+
+_timings: ContextVar[dict[str, float] | None] = ContextVar(
+    "timings", default=None
+)
+
+
+def start() -> Token:
+    """Starts collecting time spent in phases of the current request."""
+    return _timings.set({})
+
+
+def stop(token: Token) -> None:
+    """Stops collecting time spent in phases of the current request."""
+    _timings.reset(token)
+
+
+def get() -> dict[str, float]:
+    """Returns time (in seconds) spent so far in each phase."""
+    timings = _timings.get()
+    return dict(timings) if timings is not None else {}
+
+
+def record(phase: str, duration: float) -> None:
+    """Adds duration to the phase of the current request.
+
+    Durations of concurrent operations are summed, so they can add up to
+    more than the duration of the whole request. Does nothing outside of
+    a request.
+    """
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + duration
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Records duration of the block as given phase."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, perf_counter() - start)
+
+
+def format_header(timings: dict[str, float], total: float) -> str:
+    """Formats timings as value of Server-Timing header."""
+    metrics = [
+        f"{phase};dur={duration * 1000:.1f}"
+        for phase, duration in timings.items()
+    ]
+    metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+class TimedRoute(APIRoute):
+    """Route recording time spent in the endpoint function (`endpoint`
+       phase) and time spent on request validation and response
+       serialization (`serialize` phase).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependant.call = _timed_call(self.dependant.call)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            start = perf_counter()
+            endpoint_time = get().get("endpoint", 0.0)
+            try:
+                return await handler(request)
+            finally:
+                endpoint_time = get().get("endpoint", 0.0) - endpoint_time
+                record("serialize", perf_counter() - start - endpoint_time)
+
+        return timed_handler
+
+
+def _timed_call(call: Callable) -> Callable:
+    """Wraps endpoint function, so that its duration is recorded."""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def timed_call(**kwargs):
+            with timed("endpoint"):
+                return await call(**kwargs)
+    else:
+        @functools.wraps(call)
+        def timed_call(**kwargs):
+            with timed("endpoint"):
+                return call(**kwargs)
+
+    return timed_call
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import signal
+from contextlib import aclosing
+from sqlalchemy.orm import Session
+
+from app import invalidation, metrics
+from app.config import settings
+from app.database import SessionLocal
+from app.models.repository import Repository
+from app.services import refresh_queue_service, repository_service
+
+
+logger = logging.getLogger("app.worker")
+
+
+async def run(*, stop: asyncio.Event | None = None) -> None:
+    """Processes repository refresh jobs until stopped.
+
+    When the queue is empty, it's polled every `worker_poll_interval`
+    seconds. If processing a batch fails (e.g. because the database is
+    unavailable), the error is logged and the worker waits as if the queue
+    was empty; jobs of the batch are claimed again once their lease
+    expires. Jobs of a batch that has been started are finished before
+    stopping.
+    """
+    stop = stop or asyncio.Event()
+    invalidation.start()
+    logger.info("Worker started.")
+    try:
+        while not stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    processed = await run_once(db=db)
+            except Exception:
+                logger.exception("Processing refresh jobs failed.")
+                processed = 0
+            if processed == 0:
+                try:
+                    await asyncio.wait_for(
+                        stop.wait(), timeout=settings.worker_poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        await invalidation.stop()
+    logger.info("Worker stopped.")
+
+
+async def run_once(*, db: Session) -> int:
+    """Claims a batch of jobs and refreshes their repositories concurrently.
+
+    At most `worker_concurrency` repositories are refreshed at the same
+    time. Returns number of claimed jobs.
+    """
+    repository_ids = refresh_queue_service.claim(
+        db=db, limit=settings.worker_batch_size
+    )
+    if not repository_ids:
+        return 0
+
+    repos = db.query(Repository).filter(Repository.id.in_(repository_ids)).all()
+    updates = repository_service.iter_update(
+        db=db, repos=repos, concurrency=settings.worker_concurrency
+    )
+    async with aclosing(updates) as results:
+        async for result in results:
+            if result.error is None:
+                refresh_queue_service.complete(
+                    db=db, repository_id=result.repository_id
+                )
+                metrics.REFRESH_JOBS.inc(
+                    result="succeeded" if result.exists else "removed"
+                )
+                continue
+
+            retried = refresh_queue_service.fail(
+                db=db,
+                repository_id=result.repository_id,
+                error=str(result.error.detail)
+            )
+            metrics.REFRESH_JOBS.inc(
+                result="retried" if retried else "failed"
+            )
+            logger.warning(
+                "Refreshing repository %s failed%s: %s",
+                result.repository_id,
+                "" if retried else " for the last time",
+                result.error.detail
+            )
+    return len(repository_ids)
+
+
+def main() -> None:
+    """Runs the worker until SIGINT or SIGTERM is received."""
+    async def run_until_signal():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await run(stop=stop)
+
+    asyncio.run(run_until_signal())
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+
+class FakeProvider:
+    """Local stand-in for the GitHub and GitLab REST endpoints used by
+       provider_service.
+
+    GitHub endpoints are served at `/`, GitLab ones at `/api/v4`. Every
+    repository exists, unless its name starts with `missing`. Responses
+    carry ETags (conditional requests get 304) and rate limit headers.
+    Latency and errors can be injected.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: int = 1_000_000
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.remaining = {"github": rate_limit, "gitlab": rate_limit}
+        self.reset_at = int(time.time()) + 3600
+        self.calls = Counter()
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[Route("/{path:path}", self.handle)])
+
+    async def handle(self, request: Request) -> Response:
+        # Raw path is used, because GitLab project ids contain "%2F".
+        path = request.scope.get("raw_path", b"").decode() or request.url.path
+        path = path.split("?")[0]
+        if path.startswith("/api/v4/"):
+            provider = "gitlab"
+            data = self._get_gitlab_data(path[len("/api/v4"):])
+        else:
+            provider = "github"
+            data = self._get_github_data(path)
+        self.calls[provider] += 1
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.error_rate:
+            return Response(status_code=502)
+
+        if data is None:
+            return self._respond(provider, request, 404, {"message": "404"})
+        return self._respond(provider, request, 200, data)
+
+    def _respond(
+        self, provider: str, request: Request, status: int, data
+    ) -> Response:
+        """Creates response with ETag and rate limit headers."""
+        content = json.dumps(data).encode()
+        etag = f'W/"{hashlib.md5(content).hexdigest()}"'
+        not_modified = request.headers.get("if-none-match") == etag
+
+        # GitHub doesn't count conditional requests answered with 304.
+        if not (provider == "github" and not_modified):
+            if self.remaining[provider] <= 0:
+                status = 403 if provider == "github" else 429
+                return Response(
+                    status_code=status,
+                    headers=self._rate_limit_headers(provider)
+                )
+            self.remaining[provider] -= 1
+
+        headers = {"ETag": etag, **self._rate_limit_headers(provider)}
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=content,
+            status_code=status,
+            headers=headers,
+            media_type="application/json"
+        )
+
+    def _rate_limit_headers(self, provider: str) -> dict[str, str]:
+        prefix = "X-RateLimit" if provider == "github" else "RateLimit"
+        return {
+            f"{prefix}-Limit": str(self.rate_limit),
+            f"{prefix}-Remaining": str(max(self.remaining[provider], 0)),
+            f"{prefix}-Reset": str(self.reset_at),
+        }
+
+    def _get_github_data(self, path: str) -> dict | list | None:
+        match = re.fullmatch(r"/repos/([^/]+)/([^/]+)(/commits|/releases)?", path)
+        if match is None or match[2].startswith("missing"):
+            return None
+
+        owner, name, kind = match.groups()
+        date = _get_date(f"{owner}/{name}").strftime("%Y-%m-%dT%H:%M:%SZ")
+        if kind is None:
+            return {
+                "id": _get_id(f"{owner}/{name}"),
+                "name": name,
+                "full_name": f"{owner}/{name}",
+                "pushed_at": date,
+            }
+        if kind == "/commits":
+            return [{"sha": "0" * 40, "commit": {"author": {"date": date}}}]
+        return [{"tag_name": "v1.0.0", "published_at": date}]
+
+    def _get_gitlab_data(self, path: str) -> dict | list | None:
+        match = re.fullmatch(
+            r"/projects/([^/]+)%2F([^/]+)(/repository/commits|/releases)?",
+            path
+        )
+        if match is None or match[2].startswith("missing"):
+            return None
+
+        owner, name, kind = match.groups()
+        date = _get_date(f"{owner}/{name}")
+        if kind is None:
+            return {
+                "id": _get_id(f"{owner}/{name}"),
+                "name": name,
+                "path_with_namespace": f"{owner}/{name}",
+                "last_activity_at": (
+                    date.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+                ),
+            }
+        if kind == "/repository/commits":
+            return [{"id": "0" * 40, "committed_date": date.isoformat()}]
+        return [{
+            "tag_name": "v1.0.0",
+            "released_at": date.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
+        }]
+
+
+def _get_id(key: str) -> int:
+    """Returns stable numeric id for given repository."""
+    return int(hashlib.md5(key.encode()).hexdigest()[:8], 16)
+
+
+def _get_date(key: str) -> datetime:
+    """Returns stable date of last activity for given repository."""
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return start + timedelta(minutes=_get_id(key) % (3 * 365 * 24 * 60))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs local stand-in for GitHub and GitLab APIs."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="delay of every response, in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0,
+        help="maximum random delay added to the latency, in seconds"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0,
+        help="fraction of requests failing with 502"
+    )
+    parser.add_argument(
+        "--rate-limit", type=int, default=1_000_000,
+        help="number of requests allowed per provider"
+    )
+    args = parser.parse_args()
+
+    provider = FakeProvider(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit
+    )
+    uvicorn.run(
+        provider.app(), host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
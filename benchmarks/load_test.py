@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from time import perf_counter
+from uuid import UUID
+import httpx
+
+
+OWNER = "git-tracker-benchmark"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measures throughput and latency of GET /collections/{id} "
+            "against a local fake of GitHub and GitLab APIs. Collections "
+            "are seeded in the configured database and removed afterwards, "
+            "so a disposable database should be used."
+        )
+    )
+    parser.add_argument(
+        "--sizes", type=_int_list, default=[10, 100, 1000],
+        help="comma separated numbers of repositories per collection"
+    )
+    parser.add_argument(
+        "--concurrency", type=_int_list, default=[1, 10, 50],
+        help="comma separated numbers of concurrent clients"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=100,
+        help="number of measured requests per size and concurrency"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="number of app workers"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05,
+        help="latency of the fake provider APIs, in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0,
+        help="maximum random delay added to the latency, in seconds"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0,
+        help="fraction of provider API requests failing with 502"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0,
+        help="timeout of a single request, in seconds"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print results as JSON"
+    )
+    args = parser.parse_args()
+
+    provider_port, app_port = _get_free_port(), _get_free_port()
+    provider_url = f"http://127.0.0.1:{provider_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    env = {
+        **os.environ,
+        "GITHUB_API_URL": provider_url,
+        "GITLAB_API_URL": provider_url + "/api/v4",
+    }
+
+    processes = [
+        subprocess.Popen([
+            sys.executable, "-m", "benchmarks.fake_provider",
+            "--port", str(provider_port),
+            "--latency", str(args.latency),
+            "--jitter", str(args.jitter),
+            "--error-rate", str(args.error_rate),
+        ]),
+        subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(app_port),
+            "--workers", str(args.workers),
+            "--log-level", "warning",
+        ], env=env),
+    ]
+    try:
+        _wait_until_up(provider_url + "/")
+        _wait_until_up(app_url + "/status")
+        collection_ids = {size: _seed_collection(size) for size in args.sizes}
+
+        results = asyncio.run(_run(
+            app_url=app_url,
+            collection_ids=collection_ids,
+            concurrency=args.concurrency,
+            requests=args.requests,
+            timeout=args.timeout
+        ))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        _remove_seeded_data()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+async def _run(
+    *,
+    app_url: str,
+    collection_ids: dict[int, UUID],
+    concurrency: list[int],
+    requests: int,
+    timeout: float
+) -> list[dict]:
+    """Runs every combination of collection size and concurrency."""
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency))
+    async with httpx.AsyncClient(
+        base_url=app_url, timeout=timeout, limits=limits
+    ) as client:
+        for size, collection_id in collection_ids.items():
+            url = f"/collections/{collection_id}"
+            # The first request fills the cache, so it's measured separately.
+            cold = await _measure(client=client, url=url)
+            for clients in concurrency:
+                result = await _run_scenario(
+                    client=client,
+                    url=url,
+                    concurrency=clients,
+                    requests=requests
+                )
+                print(
+                    f"{size} repositories, {clients} clients: "
+                    f"{result['throughput']:.1f} req/s",
+                    file=sys.stderr
+                )
+                results.append({
+                    "repositories": size,
+                    "concurrency": clients,
+                    "cold_request": cold[0],
+                    **result,
+                })
+    return results
+
+
+async def _run_scenario(
+    *, client: httpx.AsyncClient, url: str, concurrency: int, requests: int
+) -> dict:
+    """Sends requests with given concurrency and summarizes them."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send() -> tuple[float, bool]:
+        async with semaphore:
+            return await _measure(client=client, url=url)
+
+    start = perf_counter()
+    measurements = await asyncio.gather(*(send() for _ in range(requests)))
+    elapsed = perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in measurements)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in measurements if not ok),
+        "throughput": requests / elapsed,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+    }
+
+
+async def _measure(*, client: httpx.AsyncClient, url: str) -> tuple[float, bool]:
+    """Returns duration of the request and whether it was successful."""
+    start = perf_counter()
+    try:
+        response = await client.get(url)
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    return perf_counter() - start, ok
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Returns percentile of sorted values (nearest-rank method)."""
+    if not values:
+        return 0.0
+    rank = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(rank)]
+
+
+def _seed_collection(size: int) -> UUID:
+    """Creates collection tracking given number of repositories."""
+    from sqlalchemy.dialects.postgresql import insert
+    from app.database import SessionLocal
+    from app.enums import Provider
+    from app.models.repository import Repository
+    from app.models.tracked_repository import TrackedRepository
+    from app.schemas.collection_schemas import CollectionCreate
+    from app.services import collection_service
+
+    with SessionLocal() as db:
+        collection = collection_service.create(
+            db=db,
+            collection_in=CollectionCreate(
+                name=f"benchmark-{size}", password="benchmark"
+            )
+        )
+        providers = list(Provider)
+        keys = [
+            (f"repo-{size}-{i}", OWNER, providers[i % len(providers)])
+            for i in range(size)
+        ]
+        db.execute(
+            insert(Repository)
+            .values([
+                {"name": name, "owner": owner, "provider": provider}
+                for name, owner, provider in keys
+            ])
+            .on_conflict_do_nothing()
+        )
+        repo_ids = [
+            row.id
+            for row in db.query(Repository.id).filter(
+                Repository.owner == OWNER,
+                Repository.name.like(f"repo-{size}-%")
+            )
+        ]
+        db.execute(
+            insert(TrackedRepository)
+            .values([
+                {"repository_id": repo_id, "collection_id": collection.id}
+                for repo_id in repo_ids
+            ])
+        )
+        db.commit()
+        return collection.id
+
+
+def _remove_seeded_data() -> None:
+    """Removes collections and repositories created by the benchmark."""
+    from app.database import SessionLocal
+    from app.models.collection import Collection
+    from app.models.repository import Repository
+
+    with SessionLocal() as db:
+        db.query(Collection).filter(
+            Collection.name.like("benchmark-%")
+        ).delete(synchronize_session=False)
+        db.query(Repository).filter(
+            Repository.owner == OWNER
+        ).delete(synchronize_session=False)
+        db.commit()
+
+
+def _print_table(results: list[dict]) -> None:
+    columns = [
+        ("repositories", "repos", "{}"),
+        ("concurrency", "clients", "{}"),
+        ("requests", "requests", "{}"),
+        ("errors", "errors", "{}"),
+        ("throughput", "req/s", "{:.1f}"),
+        ("cold_request", "cold ms", "{:.0f}", 1000),
+        ("p50", "p50 ms", "{:.1f}", 1000),
+        ("p95", "p95 ms", "{:.1f}", 1000),
+        ("p99", "p99 ms", "{:.1f}", 1000),
+    ]
+    rows = [[header for _, header, *_ in columns]]
+    for result in results:
+        rows.append([
+            format.format(result[key] * (scale[0] if scale else 1))
+            for key, _, format, *scale in columns
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+
+
+def _wait_until_up(url: str, timeout: float = 30.0) -> None:
+    """Waits until server at given url responds."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server at {url} didn't start.")
+            time.sleep(0.1)
+
+
+def _get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Callable
+from unittest import mock
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.enums import Provider, RepositoryEventType
+from app.models.cached_response import CachedResponse
+from app.models.collection import Collection
+from app.models.repository import Repository
+# Needed by relationships of the models above.
+from app.models.tracked_repository import TrackedRepository  # noqa: F401
+from app.schemas import collection_schemas, repository_schemas
+from app.services import cache_service, provider_service, repository_service
+from benchmarks.fake_provider import FakeProvider
+
+
+BASELINES = Path(__file__).with_name("baselines.json")
+
+BENCHMARKS = {}
+
+
+class FakeSession:
+    """Stand-in for Session, supporting only the operations used by
+       cache_service and repository updates.
+
+    Cached responses are kept in a dict. Every statement that would be
+    sent to the database (query, insert, upsert, delete, commit) is counted
+    as a round trip.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.round_trips = 0
+        self._pending = []
+
+    def query(self, model):
+        return _FakeQuery(self, model)
+
+    def execute(self, statement) -> None:
+        # Only the upsert of cached responses is supported.
+        self.flush()
+        self.round_trips += 1
+        # Values are read from the statement instead of compiling it, so
+        # that compilation (cached by the real engine) isn't measured.
+        values = {
+            key: param.value for key, param in statement._values.items()
+        }
+        self.rows[values["url"]] = CachedResponse(**values)
+
+    def add(self, obj) -> None:
+        self._pending.append(("add", obj))
+
+    def delete(self, obj) -> None:
+        self._pending.append(("delete", obj))
+
+    def flush(self) -> None:
+        for operation, obj in self._pending:
+            self.round_trips += 1
+            if isinstance(obj, CachedResponse):
+                if operation == "add":
+                    self.rows[obj.url] = obj
+                else:
+                    self.rows.pop(obj.url, None)
+        self._pending = []
+
+    def commit(self) -> None:
+        self.flush()
+        self.round_trips += 1
+
+    def rollback(self) -> None:
+        self._pending = []
+        self.round_trips += 1
+
+
+class _FakeQuery:
+    def __init__(self, session: FakeSession, model):
+        self.session = session
+        self.model = model
+        self.url = None
+
+    def filter(self, criterion):
+        # Only `CachedResponse.url == url` is supported.
+        self.url = criterion.right.value
+        return self
+
+    def one_or_none(self):
+        self.session.round_trips += 1
+        return self.session.rows.get(self.url)
+
+    first = one_or_none
+
+
+def benchmark(name: str, *, number: int = 1000):
+    """Registers function returning (call, session) of a benchmark.
+
+    The call is either a function or a coroutine function. Session is
+    a FakeSession, whose round trips are reported, or None.
+    """
+    def decorator(setup: Callable) -> Callable:
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return decorator
+
+
+@benchmark("provider_service.parse_date[github]", number=20000)
+def _parse_date_github():
+    return partial(
+        provider_service.parse_date,
+        date="2022-09-20T09:06:12Z",
+        provider=Provider.GITHUB
+    ), None
+
+
+@benchmark("provider_service.parse_date[gitlab]", number=20000)
+def _parse_date_gitlab():
+    return partial(
+        provider_service.parse_date,
+        date="2022-09-20T09:06:12.000+00:00",
+        provider=Provider.GITLAB
+    ), None
+
+
+@benchmark("provider_service._handle_response[200]", number=2000)
+def _handle_response():
+    db = FakeSession()
+    url = "https://api.github.com/repos/octocat/Hello-World"
+    response = httpx.Response(
+        200,
+        json={"id": 1, "name": "Hello-World", "full_name": "octocat/Hello-World"},
+        headers={"ETag": 'W/"1"'}
+    )
+    provider_service._handle_response(
+        db=db, provider=Provider.GITHUB, response=response, url=url
+    )
+    db.round_trips = 0
+    return partial(
+        provider_service._handle_response,
+        db=db,
+        provider=Provider.GITHUB,
+        response=response,
+        url=url
+    ), db
+
+
+@benchmark("cache_service.get", number=20000)
+def _cache_get():
+    db = _get_session_with_cache()
+    return partial(cache_service.get, db=db, url=_CACHED_URL), db
+
+
+@benchmark("cache_service.get_json_dict", number=20000)
+def _cache_get_json_dict():
+    db = _get_session_with_cache()
+    return partial(cache_service.get_json_dict, db=db, url=_CACHED_URL), db
+
+
+@benchmark("cache_service.update[unchanged]", number=20000)
+def _cache_update_unchanged():
+    db = _get_session_with_cache()
+    return partial(
+        cache_service.update,
+        db=db,
+        url=_CACHED_URL,
+        json=db.rows[_CACHED_URL].json,
+        etag=db.rows[_CACHED_URL].etag
+    ), db
+
+
+@benchmark("cache_service.update[changed]", number=5000)
+def _cache_update_changed():
+    db = _get_session_with_cache()
+    etags = iter(range(1, sys.maxsize))
+
+    def call():
+        cache_service.update(
+            db=db, url=_CACHED_URL, json="{}", etag=f'W/"{next(etags)}"'
+        )
+    return call, db
+
+
+@benchmark("repository_service._update_github", number=200)
+def _update_github():
+    return _get_update(Provider.GITHUB, repository_service._update_github)
+
+
+@benchmark("repository_service._update_gitlab", number=200)
+def _update_gitlab():
+    return _get_update(Provider.GITLAB, repository_service._update_gitlab)
+
+
+@benchmark("collection_schemas.CollectionWithRepositories[100]", number=200)
+def _serialize_collection():
+    collection = Collection(
+        id=_UUID, name="benchmark", created_at=_DATE, protected=False
+    )
+    collection.repositories = [
+        Repository(
+            id=_UUID,
+            name=f"repo-{i}",
+            owner="owner",
+            provider=Provider.GITHUB,
+            last_commit_at=_DATE,
+            last_release_at=None
+        )
+        for i in range(100)
+    ]
+
+    def call():
+        jsonable_encoder(
+            collection_schemas.CollectionWithRepositories.from_orm(collection)
+        )
+    return call, None
+
+
+@benchmark("repository_schemas.RepositoryEvent", number=5000)
+def _serialize_repository_event():
+    repository = Repository(
+        id=_UUID,
+        name="repo",
+        owner="owner",
+        provider=Provider.GITLAB,
+        last_commit_at=_DATE,
+        last_release_at=_DATE
+    )
+
+    def call():
+        repository_schemas.RepositoryEvent(
+            event=RepositoryEventType.UPDATED,
+            repository_id=repository.id,
+            repository=repository_schemas.Repository.from_orm(repository)
+        ).json()
+    return call, None
+
+
+_CACHED_URL = "https://api.github.com/repos/octocat/Hello-World/commits"
+_UUID = "00000000-0000-0000-0000-000000000000"
+_DATE = "2022-09-20T09:06:12"
+
+
+def _get_session_with_cache() -> FakeSession:
+    db = FakeSession()
+    db.rows[_CACHED_URL] = CachedResponse(
+        url=_CACHED_URL,
+        json=json.dumps([{"commit": {"author": {"date": _DATE + "Z"}}}] * 10),
+        etag='W/"0"'
+    )
+    return db
+
+
+def _get_update(provider: Provider, update: Callable) -> tuple:
+    """Returns update of a repository, served by the fake provider.
+
+    The first update fills the cache, so the measured ones revalidate it.
+    Nothing is pushed in the meantime, so they skip fetching commits.
+    """
+    db = FakeSession()
+    repo = Repository(name="repo", owner="owner", provider=provider)
+    metadata = (
+        {"pushed_at": "2022-01-01T00:00:00Z"}
+        if Provider.GITHUB == provider
+        else {"last_activity_at": "2022-01-01T00:00:00.000Z"}
+    )
+
+    async def call():
+        await update(db=db, repo=repo, metadata=metadata)
+        # Refresh time is set by the database and loaded after the commit.
+        repo.refreshed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    asyncio.run(_with_fake_provider(call)())
+    db.round_trips = 0
+    return _with_fake_provider(call), db
+
+
+def _with_fake_provider(call: Callable) -> Callable:
+    """Wraps coroutine function, so that provider APIs are served by
+       FakeProvider in the same process.
+    """
+    transport = httpx.ASGITransport(app=FakeProvider().app())
+
+    async def wrapped():
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(
+                provider_service,
+                "AsyncClient",
+                partial(httpx.AsyncClient, transport=transport)
+            ))
+            stack.enter_context(mock.patch.object(
+                settings, "github_api_url", "http://fake"
+            ))
+            stack.enter_context(mock.patch.object(
+                settings, "gitlab_api_url", "http://fake/api/v4"
+            ))
+            return await call()
+    return wrapped
+
+
+def run(setup: Callable, number: int, repeat: int) -> dict:
+    """Runs benchmark and returns the best time and round trips per call."""
+    call, db = setup()
+    is_async = asyncio.iscoroutinefunction(call)
+
+    async def run_async():
+        for _ in range(number):
+            await call()
+
+    def run_round() -> float:
+        start = time.perf_counter()
+        if is_async:
+            asyncio.run(run_async())
+        else:
+            for _ in range(number):
+                call()
+        return (time.perf_counter() - start) / number
+
+    # The first round warms up caches and isn't measured. Garbage
+    # collection is disabled while measuring, as in timeit.
+    run_round()
+    calls = number * (repeat + 1)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        times = [run_round() for _ in range(repeat)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {
+        "time": min(times),
+        "round_trips": (
+            round(db.round_trips / calls, 2) if db is not None else 0
+        ),
+    }
+
+
+def compare(result: dict, baseline: dict | None, threshold: float) -> str:
+    """Returns status of the result compared to its baseline."""
+    if baseline is None:
+        return "new"
+    # Round trips are deterministic, so any increase is a regression.
+    if result["round_trips"] > baseline["round_trips"]:
+        return "REGRESSION"
+    if result["time"] > baseline["time"] * (1 + threshold):
+        return "REGRESSION"
+    return "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Runs microbenchmarks of service hot paths with database and "
+            "provider APIs stubbed, and compares them with stored "
+            "baselines. Exits with code 1 if any of them regressed."
+        )
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.3,
+        help="allowed relative increase of time per call (default: 0.3)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=7,
+        help="number of rounds, the best one is used (default: 7)"
+    )
+    parser.add_argument(
+        "--filter", default="", help="run only benchmarks containing it"
+    )
+    parser.add_argument(
+        "--update", action="store_true",
+        help="store results as the new baselines"
+    )
+    args = parser.parse_args()
+
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    results = {}
+    regressions = []
+    width = max(len(name) for name in BENCHMARKS)
+    print(
+        f"{'benchmark':<{width}}  {'us/call':>9}  {'baseline':>9}  "
+        f"{'change':>7}  {'trips':>5}  {'base':>5}  status"
+    )
+    for name, (setup, number) in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = run(setup, number, args.repeat)
+        baseline = baselines.get(name)
+        status = compare(result, baseline, args.threshold)
+        if status == "REGRESSION":
+            regressions.append(name)
+        results[name] = result
+
+        if baseline is not None:
+            base_time = f"{baseline['time'] * 1e6:9.1f}"
+            change = f"{(result['time'] / baseline['time'] - 1) * 100:+6.0f}%"
+            base_trips = f"{baseline['round_trips']:5.1f}"
+        else:
+            base_time, change, base_trips = " " * 9, " " * 7, " " * 5
+        print(
+            f"{name:<{width}}  {result['time'] * 1e6:9.1f}  {base_time}  "
+            f"{change}  {result['round_trips']:5.1f}  {base_trips}  {status}"
+        )
+
+    if args.update:
+        baselines.update({
+            name: {
+                "time": round(result["time"], 9),
+                "round_trips": result["round_trips"],
+            }
+            for name, result in results.items()
+        })
+        BASELINES.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"Baselines stored in {BASELINES}.")
+    elif regressions:
+        print(f"Regressed: {', '.join(regressions)}.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
+from contextlib import contextmanager
 from httpx import AsyncClient
 import pytest
 
 from app.main import app
-from app.dependencies import get_db
-from app.database import engine, SessionLocal, Base
+from app.dependencies import get_db, get_read_db
+from app.database import (
+    Base,
+    SessionLocal,
+    count_queries,
+    ensure_database,
+    get_engine
+)
 from app.enums import Provider
 from app.schemas.collection_schemas import (
     CollectionCreate, 
@@ -13,12 +20,13 @@ from app.services import collection_service
 
 
 def pytest_sessionstart(session):
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    ensure_database()
+    Base.metadata.drop_all(bind=get_engine())
+    Base.metadata.create_all(bind=get_engine())
 
 
 def pytest_sessionfinish(session, exitstatus):
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=get_engine())
 
 
 @pytest.fixture(scope="session")
@@ -28,7 +36,7 @@ def anyio_backend():
 
 @pytest.fixture(scope="function")
 def db():
-    connection = engine.connect()
+    connection = get_engine().connect()
     connection.begin()
     db = SessionLocal(bind=connection)
     yield db
@@ -41,10 +49,28 @@ def db():
 async def client(db):
     async with AsyncClient(app=app, base_url="http://test") as c:
         app.dependency_overrides[get_db] = lambda: db
+        app.dependency_overrides[get_read_db] = lambda: db
         yield c
         app.dependency_overrides = {}
 
 
+@pytest.fixture(scope="function")
+def query_budget():
+    """Returns context manager failing the test if more database statements
+       than given budget are executed inside it.
+    """
+    @contextmanager
+    def query_budget(budget: int):
+        with count_queries() as counter:
+            yield counter
+        assert counter.count <= budget, (
+            f"Executed {counter.count} statements (budget: {budget}):\n"
+            + "\n".join(counter.statements)
+        )
+
+    return query_budget
+
+
 @pytest.fixture(scope="function")
 def collection(db):
     return collection_service.create(
@@ -98,5 +124,6 @@ async def auth_client(db):
         headers={"Authorization": "Bearer abc123"}
     ) as c:
         app.dependency_overrides[get_db] = lambda: db
+        app.dependency_overrides[get_read_db] = lambda: db
         yield c
         app.dependency_overrides = {}
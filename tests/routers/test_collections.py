@@ -1,6 +1,15 @@
+import asyncio
+import json
+import threading
+import time
 import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pytest
 
+from app import admission
+from app.database import count_queries
+from app.enums import AdmissionMode
+
 
 @pytest.mark.anyio
 async def test_create_protected(client):
@@ -77,6 +86,124 @@ async def test_get_collection_repos(client, collection):
     assert len(json) == len(collection.repositories)
 
 
+@pytest.mark.anyio
+async def test_get_collection_repos_when_deadline_is_exceeded(
+    client, collection_not_empty, mocker
+):
+    async def update(*, db, repo):
+        await asyncio.sleep(5)
+
+    mocker.patch(
+        "app.services.repository_service.update", side_effect=update
+    )
+    mocker.patch("app.services.collection_service._refresh_in_background")
+
+    response = await client.get(
+        f"/collections/{collection_not_empty.id}/repos",
+        params={"deadline": 0.2}
+    )
+
+    assert response.status_code == 200
+    assert all(repo["stale"] for repo in response.json())
+
+
+@pytest.fixture
+def slow_upstream(mocker):
+    """Points provider APIs at a local server answering after 2 seconds."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(2)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    mocker.patch("app.config.settings.github_api_url", url)
+    mocker.patch("app.config.settings.gitlab_api_url", url)
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.anyio
+async def test_get_collection_repos_when_upstream_times_out(
+    client, collection_not_empty, slow_upstream, mocker
+):
+    mocker.patch("app.config.settings.upstream_timeout", 0.3)
+    mocker.patch("app.config.settings.refresh_deadline", 5)
+
+    response = await client.get(
+        f"/collections/{collection_not_empty.id}/repos"
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()) == len(collection_not_empty.repositories)
+    assert all(repo["stale"] for repo in response.json())
+
+
+@pytest.mark.anyio
+async def test_get_collection_repos_when_upstream_exceeds_deadline(
+    client, collection_not_empty, slow_upstream, mocker
+):
+    mocker.patch("app.services.collection_service._refresh_in_background")
+
+    response = await client.get(
+        f"/collections/{collection_not_empty.id}/repos",
+        params={"deadline": 0.3}
+    )
+
+    assert response.status_code == 200
+    assert all(repo["stale"] for repo in response.json())
+
+
+@pytest.fixture
+def admission_limit(mocker):
+    mocker.patch("app.config.settings.admission_client_rate", 0.01)
+    mocker.patch("app.config.settings.admission_client_burst", 1)
+    admission.controller.reset()
+    yield
+    admission.controller.reset()
+
+
+@pytest.mark.anyio
+async def test_get_when_refresh_is_not_admitted(
+    client, collection_not_empty, admission_limit
+):
+    url = f"/collections/{collection_not_empty.id}"
+    assert (await client.get(url)).status_code == 200
+
+    response = await client.get(url)
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+
+@pytest.mark.anyio
+async def test_get_when_refresh_is_not_admitted_in_degrade_mode(
+    client, collection_not_empty, admission_limit, mocker
+):
+    mocker.patch("app.config.settings.admission_mode", AdmissionMode.DEGRADE)
+    url = f"/collections/{collection_not_empty.id}/repos"
+    await client.get(url)
+    update = mocker.patch("app.services.repository_service.update")
+
+    response = await client.get(url)
+
+    assert response.status_code == 200
+    assert all(repo["stale"] for repo in response.json())
+    update.assert_not_called()
+
+
 @pytest.mark.anyio
 async def get_collection_repos_when_does_not_exist(client):
     response = await client.get(f"/collections/{uuid.uuid4()}")
@@ -144,6 +271,50 @@ async def test_add_repository_to_collection_when_unauthorized(
     assert response.status_code == 401
 
 
+@pytest.mark.anyio
+async def test_batch_update_collection_repositories(auth_client, collection):
+    response = await auth_client.post(
+        f"/collections/{collection.id}/repos/batch",
+        json={
+            "add": [
+                {
+                    "repository_name": "Hello-World", 
+                    "repository_owner": "octocat",
+                    "provider": "github"
+                },
+                {
+                    "repository_name": "does-not-exist", 
+                    "repository_owner": "fsjsdfkjdsfadasf",
+                    "provider": "github"
+                }
+            ],
+            "remove": [str(uuid.uuid4())]
+        }
+    )
+    json = response.json()
+
+    assert response.status_code == 200
+    assert [r["status"] for r in json] == [
+        "added", "not_found", "not_tracked"
+    ]
+
+
+@pytest.mark.parametrize(
+    "headers", [{"Authorization": "Bearer 456"}, None]
+)
+@pytest.mark.anyio
+async def test_batch_update_collection_repositories_when_unauthorized(
+    client, collection, headers
+):
+    response = await client.post(
+        f"/collections/{collection.id}/repos/batch",
+        json={"remove": [str(uuid.uuid4())]},
+        headers=headers
+    )
+
+    assert response.status_code == 401
+
+
 @pytest.mark.anyio
 async def test_remove_repository_from_collection(auth_client, collection_not_empty):
     repo_id = collection_not_empty.repositories[0].id
@@ -195,3 +366,184 @@ async def test_delete_when_unauthorized(client, collection, headers):
     )
 
     assert response.status_code == 401
+
+
+@pytest.mark.parametrize(
+    "headers", [{"Authorization": "Bearer 456"}, None]
+)
+@pytest.mark.anyio
+async def test_delete_when_unauthorized_does_not_update_repositories(
+    client, collection_not_empty, headers, mocker
+):
+    mock = mocker.patch("app.services.repository_service.update")
+    response = await client.delete(
+        f"/collections/{collection_not_empty.id}",
+        headers=headers
+    )
+
+    assert response.status_code == 401
+    assert mock.call_count == 0
+
+
+@pytest.mark.anyio
+async def test_remove_repository_does_not_update_repositories(
+    auth_client, collection_not_empty, mocker
+):
+    mock = mocker.patch("app.services.repository_service.update")
+    repo_id = collection_not_empty.repositories[0].id
+    response = await auth_client.delete(
+        f"/collections/{collection_not_empty.id}/repos/{repo_id}",
+    )
+
+    assert response.status_code == 200
+    assert mock.call_count == 0
+
+
+@pytest.mark.anyio
+async def test_delete_when_does_not_exist(auth_client):
+    response = await auth_client.delete(f"/collections/{uuid.uuid4()}")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+@pytest.mark.anyio
+async def test_export_and_import(auth_client, collection_not_empty, format):
+    response = await auth_client.get(
+        f"/collections/{collection_not_empty.id}/export",
+        params={"format": format}
+    )
+    content = response.content
+
+    assert response.status_code == 200
+    assert len(content.splitlines()) == (
+        len(collection_not_empty.repositories) + (format == "csv")
+    )
+
+    response = await auth_client.post(
+        "/collections", json={"name": "collection2", "password": "abc123"}
+    )
+    collection_id = response.json()["id"]
+    response = await auth_client.post(
+        f"/collections/{collection_id}/import",
+        params={"format": format},
+        content=content
+    )
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == len(collection_not_empty.repositories)
+
+
+@pytest.mark.anyio
+async def test_export_when_does_not_exist(client):
+    response = await client.get(f"/collections/{uuid.uuid4()}/export")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "headers", [{"Authorization": "Bearer 456"}, None]
+)
+@pytest.mark.anyio
+async def test_import_when_unauthorized(client, collection, headers):
+    response = await client.post(
+        f"/collections/{collection.id}/import",
+        content=b'{"name": "repo", "owner": "owner", "provider": "github"}',
+        headers=headers
+    )
+
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_stream_collection_repos(client, collection_not_empty):
+    response = await client.get(
+        f"/collections/{collection_not_empty.id}/repos/stream"
+    )
+    events = [json.loads(line) for line in response.text.splitlines()]
+    repo_ids = {str(repo.id) for repo in collection_not_empty.repositories}
+
+    assert response.status_code == 200
+    assert [e["event"] for e in events] == (
+        ["cached"] * len(repo_ids) + ["updated"] * len(repo_ids)
+    )
+    assert {e["repository_id"] for e in events[:len(repo_ids)]} == repo_ids
+    assert {e["repository_id"] for e in events[len(repo_ids):]} == repo_ids
+    assert all(e["repository"]["last_commit_at"] for e in events[len(repo_ids):])
+
+
+@pytest.mark.anyio
+async def test_stream_collection_repos_when_does_not_exist(client):
+    response = await client.get(f"/collections/{uuid.uuid4()}/repos/stream")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_get_many(client, collection_not_empty, collection_unprotected):
+    response = await client.get(
+        "/collections",
+        params={
+            "ids": [
+                str(collection_not_empty.id),
+                str(collection_unprotected.id),
+                str(uuid.uuid4())
+            ]
+        }
+    )
+    json = response.json()
+
+    assert response.status_code == 200
+    assert [c["id"] for c in json] == [
+        str(collection_not_empty.id), str(collection_unprotected.id)
+    ]
+    assert len(json[0]["repositories"]) == len(collection_not_empty.repositories)
+    assert json[1]["repositories"] == []
+    assert all("password" not in c.keys() for c in json)
+
+
+@pytest.mark.anyio
+async def test_get_many_when_too_many(client):
+    response = await client.get(
+        "/collections",
+        params={"ids": [str(uuid.uuid4()) for _ in range(101)]}
+    )
+
+    assert response.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_get_query_budget(client, collection_not_empty, query_budget):
+    url = f"/collections/{collection_not_empty.id}"
+    # The first request fills the cache of provider API responses.
+    await client.get(url)
+
+    # Refresh of each repository takes its refresh lock, the rest are cache
+    # lookups and the update of the repository.
+    with query_budget(1 + 10 * len(collection_not_empty.repositories)):
+        response = await client.get(url)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_get_many_queries_dont_depend_on_number_of_collections(
+    auth_client, collection_not_empty, collection
+):
+    await auth_client.post(
+        f"/collections/{collection.id}/repos",
+        json={
+            "repository_name": "Hello-World",
+            "repository_owner": "octocat",
+            "provider": "github"
+        }
+    )
+    ids = [str(collection_not_empty.id), str(collection.id)]
+    await auth_client.get("/collections", params={"ids": ids})
+
+    with count_queries() as one:
+        await auth_client.get("/collections", params={"ids": ids[:1]})
+    with count_queries() as two:
+        await auth_client.get("/collections", params={"ids": ids})
+
+    assert two.count == one.count
@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.mark.anyio
+async def test_get_pool_stats(client, mocker):
+    mocker.patch("app.config.settings.admin_token", "secret")
+
+    response = await client.get(
+        "/instrumentation/pool",
+        headers={"X-Admin-Token": "secret"}
+    )
+    json = response.json()
+
+    assert response.status_code == 200
+    assert json["checkouts"] > 0
+    assert json["checked_out"] >= 0
+    assert json["wait_time_max"] >= 0
+
+
+@pytest.mark.parametrize(
+    "headers", [{"X-Admin-Token": "wrong"}, None]
+)
+@pytest.mark.anyio
+async def test_get_pool_stats_when_unauthorized(client, mocker, headers):
+    mocker.patch("app.config.settings.admin_token", "secret")
+
+    response = await client.get("/instrumentation/pool", headers=headers)
+
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_get_pool_stats_when_admin_token_not_configured(client, mocker):
+    mocker.patch("app.config.settings.admin_token", None)
+
+    response = await client.get(
+        "/instrumentation/pool",
+        headers={"X-Admin-Token": "secret"}
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_get_slow_queries(client, collection, mocker):
+    mocker.patch("app.config.settings.admin_token", "secret")
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    await client.get(f"/collections/{collection.id}")
+
+    response = await client.get(
+        "/instrumentation/slow-queries",
+        headers={"X-Admin-Token": "secret"}
+    )
+    json = response.json()
+
+    assert response.status_code == 200
+    assert json[0]["statement"].startswith("SELECT")
+    assert "origin" in json[0]
@@ -97,3 +97,46 @@ def test_update_when_cache_exists(db):
     assert cache.json == json2
     assert cache.etag != etag1
     assert cache.etag == etag2
+
+
+def test_update_keeps_single_row_per_url(db):
+    url = "https://www.example.com"
+    cache_service.update(db=db, url=url, json='{"value": "test1"}', etag="1")
+    cache = cache_service.get(db=db, url=url)
+    cache_id = cache.id
+
+    cache_service.update(db=db, url=url, json='{"value": "test2"}', etag="2")
+
+    assert db.query(CachedResponse).filter(CachedResponse.url == url).count() == 1
+    cache = cache_service.get(db=db, url=url)
+    assert cache.id == cache_id
+    assert cache.etag == "2"
+
+
+def test_get_from_local_cache(db, mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 60)
+    url = "https://www.example.com/local"
+    cache_service.update(db=db, url=url, json='{"value": "test1"}', etag="1")
+    cache_service.get(db=db, url=url)
+    query = mocker.spy(db, "query")
+
+    cache = cache_service.get(db=db, url=url)
+
+    query.assert_not_called()
+    assert cache.etag == "1"
+
+    cache_service.update(db=db, url=url, json='{"value": "test2"}', etag="2")
+
+    assert cache_service.get(db=db, url=url).etag == "2"
+    cache_service._local.clear()
+
+
+def test_get_when_local_cache_is_disabled(db, mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 0)
+    url = "https://www.example.com/not-local"
+    cache_service.update(db=db, url=url, json='{"value": "test1"}', etag="1")
+    set = mocker.spy(cache_service._local, "set")
+
+    assert cache_service.get(db=db, url=url).etag == "1"
+
+    set.assert_not_called()
@@ -1,14 +1,19 @@
+import asyncio
 import uuid
 import pytest
 from fastapi import HTTPException
 
-from app.enums import Provider
+from app.enums import BatchStatus, Provider, RefreshMode
 from app.models.collection import Collection
+from app.models.refresh_job import RefreshJob
+from app.models.repository import Repository
+from app.models.tracked_repository import TrackedRepository
 from app.services import collection_service
 from app.schemas.collection_schemas import (
     CollectionCreate,
     CollectionAddRepository,
-    CollectionRemoveRepository
+    CollectionRemoveRepository,
+    CollectionBatchRepositories
 )
 
 
@@ -74,6 +79,83 @@ async def test_update(db, collection_not_empty, mocker):
     assert mock.call_count == len(collection_not_empty.repositories)
 
 
+@pytest.mark.anyio
+async def test_update_when_repository_update_fails(
+    db, collection_not_empty, mocker
+):
+    mocker.patch(
+        "app.services.repository_service.update",
+        side_effect=HTTPException(status_code=503)
+    )
+
+    with pytest.raises(HTTPException) as excinfo:
+        await collection_service.update(db=db, collection=collection_not_empty)
+
+    assert excinfo.value.status_code == 503
+
+
+@pytest.mark.anyio
+async def test_get_and_update_when_deadline_is_exceeded(
+    db, collection_not_empty, mocker
+):
+    async def update(*, db, repo):
+        if Provider.GITLAB == repo.provider:
+            await asyncio.sleep(5)
+        return True
+
+    mocker.patch(
+        "app.services.repository_service.update", side_effect=update
+    )
+    refresh = mocker.patch(
+        "app.services.collection_service._refresh_in_background"
+    )
+
+    collection = await collection_service.get_and_update(
+        db=db, collection_id=collection_not_empty.id, deadline=0.2
+    )
+
+    stale = {repo.id for repo in collection.repositories if repo.stale}
+    assert stale == {
+        repo.id
+        for repo in collection.repositories
+        if Provider.GITLAB == repo.provider
+    }
+    refresh.assert_called_once_with(repository_ids=list(stale))
+
+
+@pytest.mark.anyio
+async def test_get_and_update_within_deadline(db, collection_not_empty, mocker):
+    mocker.patch("app.services.repository_service.update")
+    refresh = mocker.patch(
+        "app.services.collection_service._refresh_in_background"
+    )
+
+    collection = await collection_service.get_and_update(
+        db=db, collection_id=collection_not_empty.id, deadline=5
+    )
+
+    assert not any(repo.stale for repo in collection.repositories)
+    refresh.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_refresh_in_background_uses_own_session(
+    db, collection_not_empty, mocker
+):
+    session = mocker.patch("app.services.collection_service.SessionLocal")
+    session.return_value.__enter__.return_value = db
+    update = mocker.patch("app.services.repository_service.update")
+    repository_ids = [repo.id for repo in collection_not_empty.repositories]
+
+    collection_service._refresh_in_background(repository_ids=repository_ids)
+    await asyncio.gather(*collection_service._background_refreshes)
+
+    assert sorted(call.kwargs["repo"].id for call in update.call_args_list) == (
+        sorted(repository_ids)
+    )
+    assert not collection_service._background_refreshes
+
+
 @pytest.mark.anyio
 async def test_add_repository(db, collection):
     collection_in = CollectionAddRepository(
@@ -182,6 +264,71 @@ def test_remove_repository_that_was_not_added(db, collection, provider):
     assert len(collection.repositories) == 0
 
 
+@pytest.mark.anyio
+async def test_batch_update_repositories_add(db, collection):
+    batch_in = CollectionBatchRepositories(add=[
+        CollectionAddRepository(
+            repository_name="Hello-World",
+            repository_owner="octocat",
+            provider=Provider.GITHUB
+        ),
+        CollectionAddRepository(
+            repository_name="gitlab",
+            repository_owner="gitlab-org",
+            provider=Provider.GITLAB
+        ),
+        CollectionAddRepository(
+            repository_name="does-not-exist",
+            repository_owner="fsjsdfkjdsfadasf",
+            provider=Provider.GITHUB
+        )
+    ])
+
+    results = await collection_service.batch_update_repositories(
+        db=db,
+        collection=collection,
+        batch_in=batch_in
+    )
+
+    db.refresh(collection)
+    assert [r.status for r in results] == [
+        BatchStatus.ADDED, BatchStatus.ADDED, BatchStatus.NOT_FOUND
+    ]
+    assert results[2].repository_id is None
+    assert len(collection.repositories) == 2
+
+
+@pytest.mark.anyio
+async def test_batch_update_repositories_add_and_remove(
+    db, collection_not_empty
+):
+    repo = collection_not_empty.repositories[0]
+    batch_in = CollectionBatchRepositories(
+        add=[
+            CollectionAddRepository(
+                repository_name=repo.name,
+                repository_owner=repo.owner,
+                provider=repo.provider
+            )
+        ],
+        remove=[collection_not_empty.repositories[1].id, uuid.uuid4()]
+    )
+
+    results = await collection_service.batch_update_repositories(
+        db=db,
+        collection=collection_not_empty,
+        batch_in=batch_in
+    )
+
+    db.refresh(collection_not_empty)
+    assert [r.status for r in results] == [
+        BatchStatus.ALREADY_TRACKED,
+        BatchStatus.REMOVED,
+        BatchStatus.NOT_TRACKED
+    ]
+    assert len(collection_not_empty.repositories) == 1
+
+
 def test_delete(db, collection):
     collection_service.delete(
         db=db,
@@ -190,3 +337,72 @@ def test_delete(db, collection):
 
     collection = collection_service.get(db=db, collection_id=collection.id)
     assert collection is None
+
+
+@pytest.mark.anyio
+async def test_delete_leaves_memberships_to_database(
+    db, collection_not_empty, query_budget
+):
+    collection_id = collection_not_empty.id
+    repository_ids = [repo.id for repo in collection_not_empty.repositories]
+    db.expire_all()
+    collection = collection_service.get(db=db, collection_id=collection_id)
+
+    with query_budget(2) as counter:
+        collection_service.delete(db=db, collection=collection)
+
+    assert not any(
+        "tracked_repositories" in statement
+        for statement in counter.statements
+    )
+    assert db.query(TrackedRepository).filter(
+        TrackedRepository.collection_id == collection_id
+    ).count() == 0
+    assert db.query(Repository).filter(
+        Repository.id.in_(repository_ids)
+    ).count() == len(repository_ids)
+
+
+def test_get_many(db, collection, collection_unprotected):
+    ids = [collection_unprotected.id, uuid.uuid4(), collection.id]
+
+    collections = collection_service.get_many(db=db, collection_ids=ids)
+
+    assert [c.id for c in collections] == [
+        collection_unprotected.id, collection.id
+    ]
+
+
+@pytest.mark.anyio
+async def test_get_many_and_update_updates_shared_repositories_once(
+    db, collection_not_empty, mocker
+):
+    other = collection_service.create(
+        db=db, collection_in=CollectionCreate(name="collection2")
+    )
+    other.repositories = list(collection_not_empty.repositories)
+    db.commit()
+    mock = mocker.patch("app.services.repository_service.update")
+
+    collections = await collection_service.get_many_and_update(
+        db=db, collection_ids=[collection_not_empty.id, other.id]
+    )
+
+    assert len(collections) == 2
+    assert mock.call_count == len(collection_not_empty.repositories)
+
+
+@pytest.mark.anyio
+async def test_get_and_update_in_queue_mode(db, collection_not_empty, mocker):
+    mocker.patch("app.config.settings.refresh_mode", RefreshMode.QUEUE)
+    update = mocker.patch("app.services.repository_service.update")
+
+    collection = await collection_service.get_and_update(
+        db=db, collection_id=collection_not_empty.id
+    )
+
+    update.assert_not_called()
+    assert collection.id == collection_not_empty.id
+    assert sorted(job.repository_id for job in db.query(RefreshJob)) == sorted(
+        repo.id for repo in collection.repositories
+    )
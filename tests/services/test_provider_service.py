@@ -1,6 +1,9 @@
+from functools import partial
 from fastapi import HTTPException
+import httpx
 import pytest
 
+from app import metrics
 from app.enums import Provider
 from app.services import provider_service, cache_service
 
@@ -135,6 +138,25 @@ def test_get_url(provider, endpoint, expected):
     assert url == expected
 
 
+def test_get_url_uses_configured_base_url(mocker):
+    mocker.patch("app.config.settings.github_api_url", "http://localhost:9000")
+    mocker.patch(
+        "app.config.settings.gitlab_api_url", "http://localhost:9000/api/v4"
+    )
+
+    github_url = provider_service._get_url(
+        endpoint="/repos/octocat/Hello-World", provider=Provider.GITHUB
+    )
+    gitlab_url = provider_service._get_url(
+        endpoint="/projects/gitlab-org%2Fgitlab", provider=Provider.GITLAB
+    )
+
+    assert github_url == "http://localhost:9000/repos/octocat/Hello-World"
+    assert gitlab_url == (
+        "http://localhost:9000/api/v4/projects/gitlab-org%2Fgitlab"
+    )
+
+
 def test_get_client_github(db):
     provider = Provider.GITHUB
     url = "https://api.github.com/repos/octocat/Hello-World"
@@ -181,6 +203,33 @@ async def test_get_client_github_when_cache_exists(db, provider, endpoint):
     assert "if-none-match" in keys
 
 
+@pytest.mark.parametrize(
+    "error, code", [
+        [httpx.ConnectError("Connection refused."), 503],
+        [httpx.ReadTimeout("Timed out."), 504]
+    ]
+)
+@pytest.mark.anyio
+async def test_get_when_api_is_unreachable(db, mocker, error, code):
+    def handler(request):
+        raise error
+
+    mocker.patch.object(
+        provider_service,
+        "AsyncClient",
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))
+    )
+
+    with pytest.raises(HTTPException) as excinfo:
+        await provider_service.get(
+            db=db,
+            provider=Provider.GITHUB,
+            endpoint="/repos/octocat/Hello-World"
+        )
+
+    assert excinfo.value.status_code == code
+
+
 @pytest.mark.parametrize(
     "code", [401, 403, 404, 429, 500]
 )
@@ -194,3 +243,75 @@ def test_handle_error_code(code, provider):
     assert excinfo.value.status_code == 503
     assert excinfo.value.detail is not None
     assert len(excinfo.value.detail) > 5
+
+
+@pytest.mark.parametrize(
+    "provider, endpoint, expected", [
+        [
+            Provider.GITHUB,
+            "/repos/octocat/Hello-World/commits?per_page=1",
+            "/repos/{owner}/{name}/commits"
+        ],
+        [
+            Provider.GITHUB,
+            "repos/octocat/Hello-World",
+            "/repos/{owner}/{name}"
+        ],
+        [
+            Provider.GITLAB,
+            "/projects/gitlab-org%2Fgitlab/repository/commits?per_page=1",
+            "/projects/{id}/repository/commits"
+        ]
+    ]
+)
+def test_get_endpoint_template(provider, endpoint, expected):
+    template = provider_service._get_endpoint_template(
+        endpoint=endpoint, provider=provider
+    )
+    assert template == expected
+
+
+@pytest.mark.anyio
+async def test_get_records_metrics(db):
+    labels = {
+        "provider": "github",
+        "endpoint": "/repos/{owner}/{name}",
+        "status": "404"
+    }
+    before = dict(
+        (tuple(l.items()), v)
+        for _, l, v in metrics.UPSTREAM_REQUESTS.samples()
+    ).get(tuple(labels.items()), 0)
+
+    await provider_service.get(
+        db=db, provider=Provider.GITHUB, endpoint="/repos/octocat/does-not-exist"
+    )
+
+    after = dict(
+        (tuple(l.items()), v)
+        for _, l, v in metrics.UPSTREAM_REQUESTS.samples()
+    )[tuple(labels.items())]
+    assert after == before + 1
+
+
+@pytest.mark.parametrize(
+    "provider, headers, expected", [
+        [
+            Provider.GITHUB,
+            {"X-RateLimit-Remaining": "1000", "X-RateLimit-Limit": "5000"},
+            0.2
+        ],
+        [
+            Provider.GITLAB,
+            {"RateLimit-Remaining": "0", "RateLimit-Limit": "2000"},
+            0.0
+        ],
+        [Provider.GITHUB, {}, None],
+    ]
+)
+def test_get_remaining_quota(mocker, provider, headers, expected):
+    mocker.patch.dict(provider_service._rate_limits, clear=True)
+
+    provider_service._record_rate_limit(provider=provider, headers=headers)
+
+    assert provider_service.get_remaining_quota(provider=provider) == expected
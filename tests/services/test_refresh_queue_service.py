@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+import pytest
+
+from app.enums import Provider
+from app.models.refresh_job import RefreshJob
+from app.models.repository import Repository
+from app.services import refresh_queue_service
+
+
+@pytest.fixture(scope="function")
+def repos(db):
+    repos = [
+        Repository(name=f"repo{i}", owner="owner", provider=Provider.GITHUB)
+        for i in range(2)
+    ]
+    db.add_all(repos)
+    db.commit()
+    return repos
+
+
+def test_enqueue(db, repos):
+    ids = [repo.id for repo in repos]
+
+    refresh_queue_service.enqueue(db=db, repository_ids=ids)
+    refresh_queue_service.enqueue(db=db, repository_ids=ids + ids)
+
+    jobs = db.query(RefreshJob).all()
+    assert sorted(job.repository_id for job in jobs) == sorted(ids)
+    assert all(job.attempts == 0 for job in jobs)
+
+
+def test_claim(db, repos):
+    ids = [repo.id for repo in repos]
+    refresh_queue_service.enqueue(db=db, repository_ids=ids)
+
+    first = refresh_queue_service.claim(db=db, limit=1)
+    second = refresh_queue_service.claim(db=db, limit=10)
+    third = refresh_queue_service.claim(db=db, limit=10)
+
+    assert len(first) == 1
+    assert sorted(first + second) == sorted(ids)
+    assert third == []
+    assert all(job.attempts == 1 for job in db.query(RefreshJob))
+
+
+def test_claim_when_lease_expired(db, repos):
+    refresh_queue_service.enqueue(db=db, repository_ids=[repos[0].id])
+    refresh_queue_service.claim(db=db, limit=1)
+    job = db.get(RefreshJob, repos[0].id)
+    job.locked_until = datetime.now() - timedelta(days=1)
+    db.commit()
+
+    claimed = refresh_queue_service.claim(db=db, limit=1)
+
+    assert claimed == [repos[0].id]
+    db.refresh(job)
+    assert job.attempts == 2
+
+
+def test_complete(db, repos):
+    refresh_queue_service.enqueue(db=db, repository_ids=[repos[0].id])
+    refresh_queue_service.claim(db=db, limit=1)
+
+    refresh_queue_service.complete(db=db, repository_id=repos[0].id)
+
+    assert db.query(RefreshJob).count() == 0
+
+
+def test_fail(db, repos):
+    refresh_queue_service.enqueue(db=db, repository_ids=[repos[0].id])
+    refresh_queue_service.claim(db=db, limit=1)
+
+    retried = refresh_queue_service.fail(
+        db=db, repository_id=repos[0].id, error="Error"
+    )
+
+    job = db.get(RefreshJob, repos[0].id)
+    assert retried is True
+    assert job.last_error == "Error"
+    assert refresh_queue_service.claim(db=db, limit=1) == []
+
+
+def test_fail_when_out_of_attempts(db, repos, mocker):
+    mocker.patch("app.config.settings.refresh_max_attempts", 1)
+    refresh_queue_service.enqueue(db=db, repository_ids=[repos[0].id])
+    refresh_queue_service.claim(db=db, limit=1)
+
+    retried = refresh_queue_service.fail(
+        db=db, repository_id=repos[0].id, error="Error"
+    )
+
+    assert retried is False
+    assert db.query(RefreshJob).count() == 0
+
+
+def test_jobs_of_deleted_repositories_are_removed(db, repos):
+    refresh_queue_service.enqueue(db=db, repository_ids=[repos[0].id])
+
+    db.delete(repos[0])
+    db.commit()
+
+    assert db.query(RefreshJob).count() == 0
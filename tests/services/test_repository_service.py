@@ -1,6 +1,15 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from unittest import mock
+import httpx
 import pytest
 from fastapi import HTTPException
+from sqlalchemy import func, select
 
+from app.config import settings
+from app import database
+from app.database import get_engine
 from app.enums import Provider
 from app.models.repository import Repository
 from app.services import repository_service
@@ -80,6 +89,40 @@ async def test_add_twice(db, data):
     assert rows_after - rows_before == 1
 
 
+@pytest.mark.anyio
+async def test_get_many(db):
+    for data in EXISTING_REPOS_DATA:
+        await repository_service.add(db=db, **data)
+    keys = [
+        (data["name"], data["owner"], data["provider"])
+        for data in EXISTING_REPOS_DATA + NONEXISTENT_REPOS_DATA
+    ]
+
+    repos = repository_service.get_many(db=db, keys=keys)
+
+    assert set(repos.keys()) == set(keys[:len(EXISTING_REPOS_DATA)])
+
+
+@pytest.mark.anyio
+async def test_add_many(db):
+    keys = [
+        (data["name"], data["owner"], data["provider"])
+        for data in EXISTING_REPOS_DATA + NONEXISTENT_REPOS_DATA
+    ]
+    rows_before = db.query(Repository).count()
+
+    repos = await repository_service.add_many(db=db, keys=keys + keys)
+
+    assert set(repos.keys()) == set(keys)
+    for data in EXISTING_REPOS_DATA:
+        key = (data["name"], data["owner"], data["provider"])
+        assert data.items() <= repos[key].__dict__.items()
+    for data in NONEXISTENT_REPOS_DATA:
+        key = (data["name"], data["owner"], data["provider"])
+        assert repos[key] is None
+    assert db.query(Repository).count() - rows_before == len(EXISTING_REPOS_DATA)
+
+
 @pytest.mark.parametrize(
     "data, has_release",
     [
@@ -104,9 +147,10 @@ async def test_add_twice(db, data):
 async def test_update(db, data, has_release):
     repo = await repository_service.add(db=db, **data)
 
-    await repository_service.update(db=db, repo=repo)
+    exists = await repository_service.update(db=db, repo=repo)
 
     repo = repository_service.get(db=db, **data)
+    assert exists
     assert repo.last_commit_at is not None
     if has_release:
         assert repo.last_release_at is not None
@@ -114,6 +158,149 @@ async def test_update(db, data, has_release):
         assert repo.last_release_at is None
 
 
+@pytest.mark.parametrize("data", EXISTING_REPOS_DATA)
+@pytest.mark.anyio
+async def test_add_seeds_last_pushed_at(db, data):
+    repo = await repository_service.add(db=db, **data)
+
+    assert repo.last_pushed_at is not None
+
+
+@pytest.mark.parametrize("data", EXISTING_REPOS_DATA)
+@pytest.mark.anyio
+async def test_update_skips_commits_when_nothing_was_pushed(db, data, mocker):
+    repo = await repository_service.add(db=db, **data)
+    await repository_service.update(db=db, repo=repo)
+    last_commit_at = repo.last_commit_at
+    get = mocker.spy(repository_service.provider_service, "get")
+
+    assert await repository_service.update(db=db, repo=repo)
+
+    endpoints = [call.kwargs["endpoint"] for call in get.call_args_list]
+    assert len(endpoints) == 2
+    assert not any("commits" in endpoint for endpoint in endpoints)
+    assert repo.last_commit_at == last_commit_at
+
+
+@pytest.mark.anyio
+async def test_update_fetches_gitlab_commits_soon_after_activity(db, mocker):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[1])
+    await repository_service.update(db=db, repo=repo)
+    # A push within an hour after the activity wouldn't change it.
+    repo.refreshed_at = repo.last_pushed_at + timedelta(minutes=30)
+    db.commit()
+    get = mocker.spy(repository_service.provider_service, "get")
+
+    assert await repository_service.update(db=db, repo=repo)
+
+    endpoints = [call.kwargs["endpoint"] for call in get.call_args_list]
+    assert any("commits" in endpoint for endpoint in endpoints)
+
+
+@pytest.mark.anyio
+async def test_update_fetches_commits_after_push(db):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+    await repository_service.update(db=db, repo=repo)
+    repo.last_pushed_at = datetime(2000, 1, 1)
+    repo.last_commit_at = None
+    db.commit()
+
+    assert await repository_service.update(db=db, repo=repo)
+
+    assert repo.last_commit_at is not None
+
+
+@pytest.mark.anyio
+async def test_update_when_data_is_not_found(db, mocker):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+    data = EXISTING_REPOS_DATA[0]
+    get = repository_service.provider_service.get
+
+    async def get_without_releases(*, endpoint, **kwargs):
+        if "releases" in endpoint:
+            return None
+        return await get(endpoint=endpoint, **kwargs)
+
+    mocker.patch.object(
+        repository_service.provider_service, "get", get_without_releases
+    )
+
+    assert not await repository_service.update(db=db, repo=repo)
+    assert repository_service.get(db=db, **data) is None
+
+
+@pytest.mark.anyio
+async def test_iter_update(db):
+    repos = [
+        await repository_service.add(db=db, **data)
+        for data in EXISTING_REPOS_DATA
+    ]
+    gone = Repository(**NONEXISTENT_REPOS_DATA[0])
+    db.add(gone)
+    db.commit()
+    db.refresh(gone)
+    expected = {repo.id: True for repo in repos}
+    expected[gone.id] = False
+
+    results = [
+        result
+        async for result in repository_service.iter_update(
+            db=db, repos=repos + [gone]
+        )
+    ]
+
+    assert {r.repository_id: r.exists for r in results} == expected
+    assert all(r.error is None for r in results)
+    assert all(repo.last_commit_at is not None for repo in repos)
+
+
+@pytest.mark.anyio
+async def test_iter_update_when_api_is_unreachable(db, mocker):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+
+    def handler(request):
+        raise httpx.ConnectError("Connection refused.")
+
+    mocker.patch.object(
+        repository_service.provider_service,
+        "AsyncClient",
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))
+    )
+
+    results = [
+        result
+        async for result in repository_service.iter_update(
+            db=db, repos=[repo]
+        )
+    ]
+
+    assert [r.error.status_code for r in results] == [503]
+
+
+@pytest.mark.anyio
+async def test_update_doesnt_keep_partial_data(db, mocker):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[1])
+    get = repository_service.provider_service.get
+
+    async def get_without_releases(*, endpoint, **kwargs):
+        if "releases" in endpoint:
+            raise HTTPException(status_code=503, detail="Unavailable.")
+        return await get(endpoint=endpoint, **kwargs)
+
+    mocker.patch.object(
+        repository_service.provider_service, "get", get_without_releases
+    )
+
+    with pytest.raises(HTTPException):
+        await repository_service.update(db=db, repo=repo)
+    # Another refresh sharing the session commits it.
+    db.commit()
+    db.expire_all()
+
+    assert repo.last_commit_at is None
+    assert repo.refreshed_at is None
+
+
 @pytest.mark.parametrize("data", NONEXISTENT_REPOS_DATA)
 @pytest.mark.anyio
 async def test_update_when_repo_no_longer_exists(db, data):
@@ -123,16 +310,162 @@ async def test_update_when_repo_no_longer_exists(db, data):
     db.commit()
     db.refresh(repo)
 
-    await repository_service.update(db=db, repo=repo)
+    exists = await repository_service.update(db=db, repo=repo)
 
+    assert not exists
     assert repository_service.get(db=db, **data) is None
 
 
+@pytest.mark.anyio
+async def test_update_reuses_refresh_of_another_process(db):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+    key = repository_service._get_lock_key(repo.id)
+
+    with get_engine().connect() as connection:
+        transaction = connection.begin()
+        connection.execute(select(func.pg_advisory_xact_lock(key)))
+
+        async def finish_refresh():
+            await asyncio.sleep(0.3)
+            transaction.rollback()
+
+        with mock.patch.object(
+            repository_service.provider_service, "get"
+        ) as get:
+            exists, _ = await asyncio.gather(
+                repository_service.update(db=db, repo=repo),
+                finish_refresh()
+            )
+
+    assert exists
+    get.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_update_when_refresh_lock_is_not_released(db):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+    key = repository_service._get_lock_key(repo.id)
+
+    with get_engine().connect() as connection, connection.begin():
+        connection.execute(select(func.pg_advisory_xact_lock(key)))
+        with mock.patch.object(settings, "refresh_lock_timeout", 0.3):
+            exists = await repository_service.update(db=db, repo=repo)
+
+    assert exists
+    assert repo.last_commit_at is not None
+
+
+@pytest.mark.anyio
+async def test_iter_update_when_pool_is_smaller_than_concurrency(db, mocker):
+    repos = [
+        await repository_service.add(db=db, **data)
+        for data in EXISTING_REPOS_DATA
+    ]
+    mocker.patch("app.config.settings.db_pool_size", 1)
+    mocker.patch("app.config.settings.db_max_overflow", 0)
+    mocker.patch("app.config.settings.db_pool_timeout", 1)
+    engine = database._create_engine(database.SQLALCHEMY_DATABASE_URL)
+    mocker.patch.object(database, "_engine", engine)
+    mocker.patch.object(repository_service, "_lock_connection", None)
+    get = repository_service.provider_service.get
+
+    async def slow_get(**kwargs):
+        # Keeps all refreshes (and their locks) in progress at once.
+        await asyncio.sleep(0.05)
+        return await get(**kwargs)
+
+    mocker.patch.object(repository_service.provider_service, "get", slow_get)
+
+    try:
+        results = [
+            result
+            async for result in repository_service.iter_update(
+                db=db, repos=repos, concurrency=len(repos)
+            )
+        ]
+    finally:
+        repository_service._close_lock_connection()
+        engine.dispose()
+
+    assert all(result.exists for result in results)
+    assert all(result.error is None for result in results)
+
+
+@pytest.mark.anyio
+async def test_update_releases_refresh_lock(db):
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+    key = repository_service._get_lock_key(repo.id)
+
+    await repository_service.update(db=db, repo=repo)
+
+    with get_engine().connect() as connection, connection.begin():
+        assert connection.execute(
+            select(func.pg_try_advisory_xact_lock(key))
+        ).scalar()
+
+
+@pytest.mark.anyio
+async def test_update_schedules_next_poll(db, mocker):
+    mocker.patch("app.config.settings.poll_interval_min", 600)
+    mocker.patch("app.config.settings.poll_interval_backoff", 2)
+    repo = await repository_service.add(db=db, **EXISTING_REPOS_DATA[0])
+
+    await repository_service.update(db=db, repo=repo)
+    assert repo.poll_interval == 600
+    assert repo.next_poll_at is not None
+
+    # Nothing changed, so the repository is polled less often.
+    await repository_service.update(db=db, repo=repo)
+    assert repo.poll_interval == 1200
+
+
+@pytest.mark.parametrize(
+    "poll_interval, changed, idle, expected",
+    [
+        [None, False, None, 600],
+        [1200, True, None, 600],
+        [800, True, None, 600],
+        [1200, False, None, 2400],
+        [5000, False, None, 8000],
+        [4000, False, timedelta(seconds=3000), 3000],
+        [4000, False, timedelta(seconds=10), 600],
+    ]
+)
+def test_schedule_next_poll(mocker, poll_interval, changed, idle, expected):
+    mocker.patch("app.config.settings.poll_interval_min", 600)
+    mocker.patch("app.config.settings.poll_interval_max", 8000)
+    mocker.patch("app.config.settings.poll_interval_backoff", 2)
+    repo = Repository(
+        **EXISTING_REPOS_DATA[0],
+        poll_interval=poll_interval,
+        last_commit_at=(
+            datetime.now(timezone.utc) - idle if idle is not None else None
+        )
+    )
+
+    repository_service._schedule_next_poll(repo=repo, changed=changed)
+
+    assert repo.poll_interval == pytest.approx(expected, abs=1)
+    assert repo.next_poll_at is not None
+
+
+def test_reload_when_repo_was_removed(db):
+    repo = Repository(**NONEXISTENT_REPOS_DATA[0])
+    db.add(repo)
+    db.commit()
+    db.query(Repository).filter(Repository.id == repo.id).delete(
+        synchronize_session=False
+    )
+
+    assert not repository_service._reload(db=db, repo=repo)
+    assert repo not in db
+
+
 @pytest.mark.parametrize("data", EXISTING_REPOS_DATA)
 @pytest.mark.anyio
-async def test_exists_and_assert_exists_when_repo_exists(db, data):
-    await repository_service._assert_exists(db=db, **data)
-    assert await repository_service._exists(db=db, **data)
+async def test_get_metadata_and_assert_exists_when_repo_exists(db, data):
+    metadata = await repository_service._assert_exists(db=db, **data)
+    assert await repository_service._get_metadata(db=db, **data) == metadata
 
 
 @pytest.mark.parametrize("data", NONEXISTENT_REPOS_DATA)
@@ -142,4 +475,4 @@ async def test_assert_exists_when_repo_does_not_exist(db, data):
         await repository_service._assert_exists(db=db, **data)
 
     assert excinfo.value.status_code == 404
-    assert not await repository_service._exists(db=db, **data)
+    assert await repository_service._get_metadata(db=db, **data) is None
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from sqlalchemy import func
+
+from app.enums import Provider
+from app.models.collection import Collection
+from app.models.repository import Repository
+from app.services import schedule_service
+
+
+def _add_collection(db, *, name, read_count, read, repos):
+    collection = Collection(
+        name=name,
+        protected=False,
+        read_count=read_count,
+        last_read_at=func.now() if read else None
+    )
+    collection.repositories = [
+        Repository(
+            name=repo_name,
+            owner="owner",
+            provider=Provider.GITHUB,
+            refreshed_at=(
+                func.now() - timedelta(hours=age) if age is not None else None
+            ),
+            next_poll_at=(
+                func.now() + timedelta(hours=1) if age == 0 else None
+            )
+        )
+        for repo_name, age in repos
+    ]
+    db.add(collection)
+    db.commit()
+    return {repo.name: repo.id for repo in collection.repositories}
+
+
+def test_get_due(db, mocker):
+    mocker.patch("app.config.settings.scheduler_per_collection_limit", 2)
+    big = _add_collection(
+        db,
+        name="big",
+        read_count=100,
+        read=True,
+        repos=[("a1", None), ("a2", 2), ("a3", 1), ("a4", 0)]
+    )
+    small = _add_collection(
+        db, name="small", read_count=1, read=True, repos=[("b1", 3)]
+    )
+    _add_collection(
+        db, name="unread", read_count=0, read=False, repos=[("c1", None)]
+    )
+
+    repos = schedule_service.get_due(db=db, limit=10)
+
+    # Stalest repositories of both collections go first, then the rest of
+    # the big one (up to the limit), skipping the one which isn't due.
+    assert [repo.id for repo in repos] == [big["a1"], small["b1"], big["a2"]]
+    assert [
+        repo.id for repo in schedule_service.get_due(db=db, limit=1)
+    ] == [big["a1"]]
+
+
+def test_get_due_refreshes_shared_repository_once(db):
+    repo = Repository(name="shared", owner="owner", provider=Provider.GITHUB)
+    for name in ["collection1", "collection2"]:
+        db.add(Collection(
+            name=name,
+            protected=False,
+            last_read_at=func.now(),
+            repositories=[repo]
+        ))
+    db.commit()
+
+    assert [r.id for r in schedule_service.get_due(db=db, limit=10)] == [
+        repo.id
+    ]
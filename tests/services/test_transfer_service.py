@@ -0,0 +1,128 @@
+from datetime import datetime
+from fastapi import HTTPException
+import pytest
+
+from app.enums import Provider, TransferFormat
+from app.models.repository import Repository
+from app.models.tracked_repository import TrackedRepository
+from app.schemas.collection_schemas import CollectionCreate
+from app.services import collection_service, transfer_service
+
+
+REPOS_DATA = [
+    {
+        "name": "Hello-World",
+        "owner": "octocat",
+        "provider": Provider.GITHUB,
+        "last_commit_at": datetime(2012, 3, 6, 23, 6, 50),
+        "last_release_at": None
+    },
+    {
+        "name": "gitlab",
+        "owner": "gitlab-org",
+        "provider": Provider.GITLAB,
+        "last_commit_at": datetime(2022, 9, 20, 7, 6, 12),
+        "last_release_at": datetime(2022, 9, 19, 9, 6, 12)
+    }
+]
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+@pytest.fixture(scope="function")
+def collection_with_repos(db, collection):
+    for data in REPOS_DATA:
+        repo = Repository(**data)
+        db.add(repo)
+        db.flush()
+        db.add(TrackedRepository(
+            repository_id=repo.id, collection_id=collection.id
+        ))
+    db.commit()
+    return collection
+
+
+@pytest.mark.parametrize("format", TransferFormat)
+def test_export_repositories(db, collection_with_repos, format):
+    lines = list(transfer_service.export_repositories(
+        db=db, collection_id=collection_with_repos.id, format=format
+    ))
+
+    expected_len = len(REPOS_DATA) + (TransferFormat.CSV == format)
+    assert len(lines) == expected_len
+    assert all(line.endswith("\n") for line in lines)
+
+
+@pytest.mark.parametrize("format", TransferFormat)
+@pytest.mark.anyio
+async def test_import_repositories(db, collection_with_repos, format):
+    lines = [
+        line.rstrip("\n")
+        for line in transfer_service.export_repositories(
+            db=db, collection_id=collection_with_repos.id, format=format
+        )
+    ]
+    collection = collection_service.create(
+        db=db, collection_in=CollectionCreate(name="collection2")
+    )
+    rows_before = db.query(Repository).count()
+
+    imported = await transfer_service.import_repositories(
+        db=db, collection_id=collection.id, lines=_aiter(lines), format=format
+    )
+
+    db.refresh(collection)
+    assert imported == len(REPOS_DATA)
+    assert db.query(Repository).count() == rows_before
+    assert (
+        {repo.id for repo in collection.repositories}
+        == {repo.id for repo in collection_with_repos.repositories}
+    )
+
+
+@pytest.mark.anyio
+async def test_import_repositories_in_chunks(db, collection, mocker):
+    mocker.patch("app.config.settings.transfer_chunk_size", 2)
+    lines = [
+        f'{{"name": "repo{i}", "owner": "owner", "provider": "github"}}'
+        for i in range(5)
+    ]
+
+    imported = await transfer_service.import_repositories(
+        db=db,
+        collection_id=collection.id,
+        lines=_aiter(lines),
+        format=TransferFormat.NDJSON
+    )
+
+    db.refresh(collection)
+    assert imported == 5
+    assert len(collection.repositories) == 5
+    assert all(repo.last_commit_at is None for repo in collection.repositories)
+
+
+@pytest.mark.anyio
+async def test_import_repositories_when_record_is_invalid(db, collection):
+    lines = ['{"name": "repo", "owner": "owner", "provider": "bitbucket"}']
+
+    with pytest.raises(HTTPException) as excinfo:
+        await transfer_service.import_repositories(
+            db=db,
+            collection_id=collection.id,
+            lines=_aiter(lines),
+            format=TransferFormat.NDJSON
+        )
+
+    assert excinfo.value.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_iter_lines():
+    chunks = [b"ab\nc", "ą".encode("utf-8")[:1], "ą".encode("utf-8")[1:], b"\n\nd"]
+
+    lines = [line async for line in transfer_service.iter_lines(_aiter(chunks))]
+
+    assert lines == ["ab", "cą", "", "d"]
@@ -0,0 +1,105 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+from functools import partial
+
+from app.enums import Provider
+from app.schemas.collection_schemas import CollectionCreate
+from app.services import collection_service, provider_service, warmup_service
+
+
+@pytest.fixture
+def repos(db, collection_not_empty, mocker):
+    # Rate limits reported to the previous tests shouldn't matter.
+    mocker.patch.dict(provider_service._rate_limits, clear=True)
+    other = collection_service.create(
+        db=db, collection_in=CollectionCreate(name="collection2")
+    )
+    gitlab_repo = next(
+        repo
+        for repo in collection_not_empty.repositories
+        if Provider.GITLAB == repo.provider
+    )
+    other.repositories = [gitlab_repo]
+    db.commit()
+    return collection_not_empty.repositories
+
+
+def test_get_candidates(db, repos):
+    candidates = warmup_service.get_candidates(db=db, limit=10)
+
+    assert [repo.provider for repo in candidates] == [
+        Provider.GITLAB, Provider.GITHUB
+    ]
+    assert warmup_service.get_candidates(db=db, limit=1) == candidates[:1]
+
+
+@pytest.mark.anyio
+async def test_get_candidates_skips_repositories_not_due(db, repos):
+    await warmup_service.warm_up(db=db)
+
+    assert warmup_service.get_candidates(db=db, limit=10) == []
+
+
+@pytest.mark.anyio
+async def test_warm_up(db, repos):
+    counts = await warmup_service.warm_up(db=db, limit=10, concurrency=1)
+
+    assert counts == {"refreshed": 2, "removed": 0, "failed": 0, "skipped": 0}
+    assert all(repo.refreshed_at is not None for repo in repos)
+
+
+@pytest.mark.anyio
+async def test_warm_up_skips_provider_without_quota(db, repos, mocker):
+    mocker.patch.dict(
+        provider_service._rate_limits, {Provider.GITHUB: (10, 5000)}
+    )
+    update = mocker.patch("app.services.repository_service.update")
+
+    counts = await warmup_service.warm_up(db=db, limit=10, concurrency=1)
+
+    assert counts == {"refreshed": 1, "removed": 0, "failed": 0, "skipped": 1}
+    [call] = update.call_args_list
+    assert Provider.GITLAB == call.kwargs["repo"].provider
+
+
+@pytest.mark.anyio
+async def test_warm_up_when_refresh_fails(db, repos, mocker):
+    mocker.patch(
+        "app.services.repository_service.update",
+        side_effect=HTTPException(status_code=503, detail="Unavailable.")
+    )
+
+    counts = await warmup_service.warm_up(db=db, limit=10)
+
+    assert counts == {"refreshed": 0, "removed": 0, "failed": 2, "skipped": 0}
+
+
+@pytest.mark.anyio
+async def test_warm_up_when_api_is_unreachable(db, repos, mocker):
+    def handler(request):
+        raise httpx.ConnectError("Connection refused.")
+
+    mocker.patch.object(
+        provider_service,
+        "AsyncClient",
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))
+    )
+
+    counts = await warmup_service.warm_up(db=db, limit=10, concurrency=1)
+
+    assert counts == {"refreshed": 0, "removed": 0, "failed": 2, "skipped": 0}
+
+
+@pytest.mark.anyio
+async def test_warm_up_when_refresh_raises_unexpected_error(db, repos, mocker):
+    async def update(*, db, repo):
+        if repo.provider == Provider.GITHUB:
+            raise RuntimeError("Unexpected.")
+        return True
+
+    mocker.patch("app.services.repository_service.update", side_effect=update)
+
+    counts = await warmup_service.warm_up(db=db, limit=10, concurrency=1)
+
+    assert counts == {"refreshed": 1, "removed": 0, "failed": 1, "skipped": 0}
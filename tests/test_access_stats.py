@@ -0,0 +1,63 @@
+import uuid
+from collections import Counter
+import pytest
+
+from app import access_stats
+from app.services import collection_service
+
+
+@pytest.fixture(autouse=True)
+def reads(mocker):
+    mocker.patch.object(access_stats, "_collection_reads", Counter())
+    mocker.patch.object(access_stats, "_repository_reads", Counter())
+
+
+@pytest.mark.anyio
+async def test_flush(db, collection_not_empty):
+    repo_ids = [repo.id for repo in collection_not_empty.repositories]
+    access_stats.record_read(
+        collection_ids=[collection_not_empty.id], repository_ids=repo_ids
+    )
+    access_stats.record_read(
+        collection_ids=[collection_not_empty.id], repository_ids=repo_ids[:1]
+    )
+
+    access_stats.flush(db=db)
+
+    db.refresh(collection_not_empty)
+    assert collection_not_empty.read_count == 2
+    assert collection_not_empty.last_read_at is not None
+    repos = {repo.id: repo for repo in collection_not_empty.repositories}
+    for repo in repos.values():
+        db.refresh(repo)
+    assert repos[repo_ids[0]].read_count == 2
+    assert repos[repo_ids[1]].read_count == 1
+    assert not access_stats._collection_reads
+    assert not access_stats._repository_reads
+
+
+def test_flush_when_it_fails(db, mocker):
+    access_stats.record_read(
+        collection_ids=[uuid.uuid4()], repository_ids=[uuid.uuid4()]
+    )
+    mocker.patch.object(db, "commit", side_effect=RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        access_stats.flush(db=db)
+
+    assert sum(access_stats._collection_reads.values()) == 1
+    assert sum(access_stats._repository_reads.values()) == 1
+
+
+@pytest.mark.anyio
+async def test_get_and_update_records_read(db, collection_not_empty, mocker):
+    mocker.patch("app.services.repository_service.update")
+
+    await collection_service.get_and_update(
+        db=db, collection_id=collection_not_empty.id
+    )
+
+    assert access_stats._collection_reads == {collection_not_empty.id: 1}
+    assert access_stats._repository_reads == {
+        repo.id: 1 for repo in collection_not_empty.repositories
+    }
@@ -0,0 +1,66 @@
+import pytest
+
+from app.admission import AdmissionController, TokenBucket
+
+
+@pytest.fixture
+def limits(mocker):
+    mocker.patch("app.config.settings.admission_client_rate", 1)
+    mocker.patch("app.config.settings.admission_client_burst", 2)
+    mocker.patch("app.config.settings.admission_global_rate", 1)
+    mocker.patch("app.config.settings.admission_global_burst", 3)
+
+
+def test_token_bucket(mocker):
+    monotonic = mocker.patch("app.admission.monotonic", return_value=0.0)
+    bucket = TokenBucket(rate=2, burst=2)
+
+    bucket.take()
+    bucket.take()
+
+    assert bucket.get_wait_time() == 0.5
+    monotonic.return_value = 0.25
+    assert bucket.get_wait_time() == 0.25
+    monotonic.return_value = 10.0
+    assert bucket.get_wait_time() == 0
+    assert bucket.tokens == 2
+
+
+def test_admit_when_limits_are_disabled():
+    controller = AdmissionController()
+
+    assert all(controller.admit("client") == (0, None) for _ in range(100))
+
+
+def test_admit_when_client_limit_is_exceeded(limits):
+    controller = AdmissionController()
+
+    assert controller.admit("client1") == (0, None)
+    assert controller.admit("client1") == (0, None)
+    wait_time, limit = controller.admit("client1")
+
+    assert limit == "client"
+    assert 0 < wait_time <= 1
+    assert controller.admit("client2") == (0, None)
+
+
+def test_admit_when_global_limit_is_exceeded(limits):
+    controller = AdmissionController()
+    for client in ["client1", "client2", "client3"]:
+        assert controller.admit(client) == (0, None)
+
+    wait_time, limit = controller.admit("client4")
+
+    assert limit == "global"
+    assert 0 < wait_time <= 1
+
+
+def test_rejected_request_does_not_take_tokens(limits):
+    controller = AdmissionController()
+    for client in ["client1", "client2", "client3"]:
+        controller.admit(client)
+
+    controller.admit("client4")
+    controller.reset()
+
+    assert controller.admit("client4") == (0, None)
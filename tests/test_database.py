@@ -0,0 +1,123 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy_utils import create_database, database_exists
+from starlette.requests import Request
+
+from app import database
+from app.database import (
+    Base,
+    ReadSessionLocal,
+    RoutingSession,
+    SQLALCHEMY_DATABASE_URL,
+    SessionLocal,
+    is_recently_written,
+    mark_written
+)
+from app.dependencies import get_read_db
+from app.models.collection import Collection
+
+
+# A second Postgres instance can be used as the replica. By default,
+# a separate database is used, which (not being replicated) doesn't see
+# writes to the primary one.
+REPLICA_URL = os.environ.get(
+    "TEST_DATABASE_REPLICA_URL", SQLALCHEMY_DATABASE_URL + "_replica"
+)
+
+
+@pytest.fixture(scope="module")
+def replica_database():
+    if not database_exists(REPLICA_URL):
+        create_database(REPLICA_URL)
+    engine = create_engine(REPLICA_URL)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def replica(replica_database, mocker):
+    mocker.patch("app.config.settings.database_replica_urls", [REPLICA_URL])
+    mocker.patch.object(database, "_replica_engines", None)
+    mocker.patch.object(database, "_recent_writes", {})
+    yield
+    for engine in database._replica_engines or []:
+        engine.dispose()
+
+
+@pytest.fixture
+def primary_collection():
+    with SessionLocal() as db:
+        collection = Collection(name="replica-test", protected=False)
+        db.add(collection)
+        db.commit()
+        collection_id = collection.id
+    yield collection_id
+    with SessionLocal() as db:
+        db.query(Collection).filter(Collection.id == collection_id).delete()
+        db.commit()
+
+
+def test_routing_session_reads_from_replica(replica, primary_collection):
+    with ReadSessionLocal() as db:
+        assert db.get(Collection, primary_collection) is None
+
+
+def test_routing_session_reads_from_primary_after_write(
+    replica, primary_collection
+):
+    with ReadSessionLocal() as db:
+        db.add(Collection(name="replica-test-2", protected=False))
+        db.flush()
+
+        assert db.wrote
+        assert db.get(Collection, primary_collection) is not None
+        db.rollback()
+
+
+def test_routing_session_without_replicas(mocker, primary_collection):
+    mocker.patch("app.config.settings.database_replica_urls", [])
+    mocker.patch.object(database, "_replica_engines", None)
+
+    with ReadSessionLocal() as db:
+        assert db.replica is None
+        assert db.get(Collection, primary_collection) is not None
+
+
+def test_get_read_db_after_write(replica, primary_collection):
+    request = Request({
+        "type": "http",
+        "path_params": {"collection_id": str(primary_collection)},
+        "query_string": b"",
+        "headers": [],
+    })
+    db = next(get_read_db(request))
+    assert isinstance(db, RoutingSession)
+    db.close()
+
+    mark_written(primary_collection)
+
+    db = next(get_read_db(request))
+    assert not isinstance(db, RoutingSession)
+    assert db.get(Collection, primary_collection) is not None
+    db.close()
+
+
+def test_mark_written(replica, mocker):
+    mark_written("key")
+    assert is_recently_written("key")
+
+    mocker.patch("app.config.settings.replica_read_your_writes_window", 0)
+    mark_written("key")
+    assert not is_recently_written("key")
+
+
+def test_mark_written_without_replicas(mocker):
+    mocker.patch("app.config.settings.database_replica_urls", [])
+    mocker.patch.object(database, "_recent_writes", {})
+
+    mark_written("key")
+
+    assert not is_recently_written("key")
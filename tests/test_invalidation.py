@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+
+from app import invalidation
+from app.database import SessionLocal
+from app.local_cache import LocalCache
+
+
+@pytest.mark.anyio
+async def test_published_invalidation_is_received(mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 60)
+    cache = LocalCache("test")
+    connected = asyncio.Event()
+    listener = asyncio.create_task(invalidation.listen(connected=connected))
+    try:
+        await asyncio.wait_for(connected.wait(), timeout=5)
+        cache.set("key1", 1)
+        cache.set("key2", 2)
+
+        # Eviction in another process is emulated by entry stored after
+        # the invalidation was published.
+        with SessionLocal() as db:
+            invalidation.publish(db=db, cache=cache, keys=["key1"])
+            cache.set("key1", 1)
+            assert cache.get("key1") == 1
+            db.commit()
+
+        for _ in range(50):
+            if cache.get("key1") is None:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        listener.cancel()
+
+    assert cache.get("key1") is None
+    assert cache.get("key2") == 2
+
+
+def test_publish_evicts_local_entries(db, mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 60)
+    cache = LocalCache("test")
+    cache.set("key", "value")
+
+    invalidation.publish(db=db, cache=cache, keys=["key"])
+
+    assert cache.get("key") is None
+
+
+def test_publish_when_local_caches_are_disabled(db, mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 0)
+    execute = mocker.spy(db, "execute")
+
+    invalidation.publish(db=db, cache=LocalCache("test"), keys=["key"])
+
+    execute.assert_not_called()
+
+
+def test_handle_ignores_unknown_cache():
+    invalidation._handle('{"cache": "unknown", "keys": ["key"]}')
@@ -0,0 +1,67 @@
+import time
+
+from app import local_cache
+from app.local_cache import LocalCache
+
+
+def test_get_and_set(mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 60)
+    cache = LocalCache("test")
+
+    cache.set("key", "value")
+
+    assert cache.get("key") == "value"
+    assert cache.get("other") is None
+
+
+def test_get_when_disabled(mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 0)
+    cache = LocalCache("test")
+
+    cache.set("key", "value")
+
+    assert cache.get("key") is None
+
+
+def test_get_when_expired(mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 0.05)
+    cache = LocalCache("test")
+    cache.set("key", "value")
+
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entry_is_evicted(mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 60)
+    mocker.patch("app.config.settings.local_cache_max_size", 2)
+    cache = LocalCache("test")
+    cache.set("key1", 1)
+    cache.set("key2", 2)
+    cache.get("key1")
+
+    cache.set("key3", 3)
+
+    assert cache.get("key1") == 1
+    assert cache.get("key2") is None
+    assert cache.get("key3") == 3
+
+
+def test_invalidate_and_clear_all(mocker):
+    mocker.patch("app.config.settings.local_cache_ttl", 60)
+    cache = LocalCache("test")
+    cache.set("key1", 1)
+    cache.set("key2", 2)
+    cache.set("key3", 3)
+
+    cache.invalidate(["key1", "key2"])
+
+    assert cache.get("key1") is None
+    assert cache.get("key2") is None
+    assert cache.get("key3") == 3
+
+    local_cache.clear_all()
+
+    assert cache.get("key3") is None
+    assert local_cache.get_cache("test") is cache
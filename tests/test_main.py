@@ -0,0 +1,130 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+
+from app import metrics
+from app.main import app, start_warm_up, startup, stop_warm_up
+
+
+@pytest.mark.anyio
+async def test_metrics(client, collection):
+    await client.get(f"/collections/{collection.id}")
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/collections/{collection_id}",status="200"}'
+    ) in response.text
+    assert 'db_queries_total{operation="SELECT"}' in response.text
+    assert (
+        'http_request_db_queries_count{method="GET",'
+        'route="/collections/{collection_id}"}'
+    ) in response.text
+    assert "db_pool_checked_out" in response.text
+
+
+@pytest.mark.anyio
+async def test_server_timing(client, collection_not_empty):
+    response = await client.get(f"/collections/{collection_not_empty.id}")
+    phases = {
+        metric.split(";")[0]
+        for metric in response.headers["server-timing"].split(", ")
+    }
+
+    assert response.status_code == 200
+    assert {
+        "db", "cache", "upstream-github", "upstream-gitlab", "endpoint",
+        "serialize", "total"
+    } <= phases
+
+
+@pytest.mark.anyio
+async def test_server_timing_of_password_hashing(client):
+    response = await client.post(
+        "/collections",
+        json={"name": "collection1", "password": "123"}
+    )
+
+    assert "hash;dur=" in response.headers["server-timing"]
+
+
+@pytest.mark.anyio
+async def test_request_queries_are_logged(client, collection, caplog, mocker):
+    mocker.patch("app.config.settings.db_queries_warning", 0)
+
+    await client.get(f"/collections/{collection.id}")
+
+    record = next(r for r in caplog.records if r.name == "app.queries")
+    assert record.levelname == "WARNING"
+    assert "GET /collections/{collection_id} executed" in record.getMessage()
+
+
+def test_import_doesnt_connect_to_database():
+    env = {
+        **os.environ,
+        "POSTGRES_SERVER": "db.invalid",
+        "POSTGRES_PASSWORD": "password",
+    }
+
+    process = subprocess.run(
+        [sys.executable, "-c", "import app.main"],
+        env=env,
+        capture_output=True,
+        timeout=60
+    )
+
+    assert process.returncode == 0, process.stderr.decode()
+
+
+def test_startup(mocker):
+    mocker.patch("app.config.settings.init_db_on_startup", True)
+    init_db = mocker.patch("app.main.init_db")
+
+    startup()
+
+    init_db.assert_called_once()
+    [(_, _, cold_start)] = metrics.COLD_START_DURATION.samples()
+    assert cold_start > 0
+
+
+def test_startup_without_database_initialization(mocker):
+    mocker.patch("app.config.settings.init_db_on_startup", False)
+    init_db = mocker.patch("app.main.init_db")
+
+    startup()
+
+    init_db.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_start_warm_up(mocker):
+    mocker.patch("app.config.settings.warmup_on_startup", True)
+    warm_up = mocker.patch("app.services.warmup_service.warm_up")
+
+    await start_warm_up()
+    await app.state.warm_up
+
+    warm_up.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_stop_warm_up(mocker):
+    mocker.patch("app.config.settings.warmup_on_startup", True)
+
+    async def warm_up(*, db):
+        await asyncio.sleep(60)
+
+    mocker.patch("app.services.warmup_service.warm_up", warm_up)
+    await start_warm_up()
+    task = app.state.warm_up
+    await asyncio.sleep(0)
+
+    await stop_warm_up()
+
+    assert task.cancelled()
+    assert app.state.warm_up is None
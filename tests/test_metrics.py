@@ -0,0 +1,55 @@
+from app import metrics
+
+
+def test_counter():
+    counter = metrics.Counter(
+        "test_counter_total", "Test.", ("status",), registry=[]
+    )
+    counter.inc(status="200")
+    counter.inc(2, status="200")
+    counter.inc(status="404")
+
+    assert counter.samples() == [
+        ("", {"status": "200"}, 3), ("", {"status": "404"}, 1)
+    ]
+
+
+def test_gauge_with_function():
+    gauge = metrics.Gauge(
+        "test_gauge", "Test.", registry=[], function=lambda: 7
+    )
+
+    assert gauge.samples() == [("", {}, 7)]
+
+
+def test_histogram():
+    histogram = metrics.Histogram(
+        "test_histogram", "Test.", registry=[], buckets=(1, 2)
+    )
+    histogram.observe(0.5)
+    histogram.observe(2)
+    histogram.observe(3)
+
+    assert histogram.samples() == [
+        ("_bucket", {"le": "1.0"}, 1),
+        ("_bucket", {"le": "2.0"}, 2),
+        ("_bucket", {"le": "+Inf"}, 3),
+        ("_sum", {}, 5.5),
+        ("_count", {}, 3),
+    ]
+
+
+def test_render():
+    registry = []
+    counter = metrics.Counter(
+        "test_render_total", "Test.", ("path",), registry=registry
+    )
+    counter.inc(path='a"b')
+
+    rendered = metrics.render(registry)
+
+    assert rendered == (
+        "# HELP test_render_total Test.\n"
+        "# TYPE test_render_total counter\n"
+        'test_render_total{path="a\\"b"} 1.0\n'
+    )
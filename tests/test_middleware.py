@@ -0,0 +1,56 @@
+from httpx import AsyncClient
+import pytest
+
+from app.main import app
+from app.middleware import ProfilingMiddleware
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.anyio
+async def profiling_client(mocker):
+    mocker.patch("app.config.settings.admin_token", "secret")
+    async with AsyncClient(
+        app=ProfilingMiddleware(app),
+        base_url="http://test",
+        headers={"X-Admin-Token": "secret"}
+    ) as c:
+        yield c
+
+
+@pytest.mark.parametrize(
+    "headers, params", [[{"X-Profile": "1"}, None], [None, {"profile": "1"}]]
+)
+@pytest.mark.anyio
+async def test_profiling(profiling_client, headers, params):
+    response = await profiling_client.get(
+        "/status", headers=headers, params=params
+    )
+    profile_id = response.headers["x-profile-id"]
+
+    response = await profiling_client.get(
+        f"/instrumentation/profiles/{profile_id}"
+    )
+    json = response.json()
+
+    assert response.status_code == 200
+    assert json["path"] == "/status"
+    assert json["status"] == 200
+    assert json["wall_time"] > 0
+    assert len(json["functions"]) > 0
+    assert "app" in json["breakdown"].keys()
+
+
+@pytest.mark.anyio
+async def test_profiling_when_not_requested(profiling_client):
+    response = await profiling_client.get("/status")
+
+    assert "x-profile-id" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_profiling_when_unauthorized(profiling_client):
+    response = await profiling_client.get(
+        "/status", headers={"X-Profile": "1", "X-Admin-Token": "wrong"}
+    )
+
+    assert "x-profile-id" not in response.headers
@@ -0,0 +1,47 @@
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+from app import database
+from app.database import Base, SQLALCHEMY_DATABASE_URL
+
+
+MIGRATIONS_URL = SQLALCHEMY_DATABASE_URL + "_migrations"
+
+
+@pytest.fixture
+def engine(mocker):
+    if database_exists(MIGRATIONS_URL):
+        drop_database(MIGRATIONS_URL)
+    create_database(MIGRATIONS_URL)
+    engine = database._create_engine(MIGRATIONS_URL)
+    mocker.patch.object(database, "_engine", engine)
+    yield engine
+    engine.dispose()
+    drop_database(MIGRATIONS_URL)
+
+
+def test_migrations_match_models(engine):
+    database.run_migrations()
+
+    with engine.connect() as connection:
+        diff = compare_metadata(
+            MigrationContext.configure(
+                connection, opts={"compare_type": True}
+            ),
+            Base.metadata
+        )
+    assert diff == []
+
+
+def test_migrations_downgrade(engine):
+    database.run_migrations()
+
+    with engine.connect() as connection:
+        config = database.get_migrations_config(connection)
+        command.downgrade(config, "base")
+        assert inspect(connection).get_table_names() == ["alembic_version"]
+        command.upgrade(config, "head")
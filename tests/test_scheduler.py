@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from app import scheduler
+from app.models.repository import Repository
+from app.services import schedule_service
+
+
+@pytest.mark.anyio
+async def test_run_once(db, collection_not_empty, mocker):
+    get_due = mocker.patch(
+        "app.services.schedule_service.get_due",
+        return_value=collection_not_empty.repositories
+    )
+
+    refreshed = await scheduler.run_once(db=db)
+
+    assert refreshed == len(collection_not_empty.repositories)
+    get_due.assert_called_once()
+    assert all(
+        repo.refreshed_at is not None
+        for repo in collection_not_empty.repositories
+    )
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("error", [
+    HTTPException(status_code=503, detail="Unavailable."),
+    RuntimeError("Unexpected."),
+])
+async def test_run_once_when_refresh_fails(
+    db, collection_not_empty, mocker, error
+):
+    mocker.patch(
+        "app.services.schedule_service.get_due",
+        return_value=collection_not_empty.repositories
+    )
+    mocker.patch(
+        "app.services.repository_service.update", side_effect=error
+    )
+
+    refreshed = await scheduler.run_once(db=db)
+
+    assert refreshed == 0
+    ids = [repo.id for repo in collection_not_empty.repositories]
+    assert db.query(Repository).filter(
+        Repository.id.in_(ids), schedule_service.is_due()
+    ).count() == 0
+
+
+@pytest.mark.anyio
+async def test_run_waits_when_every_refresh_fails(
+    db, collection_not_empty, mocker
+):
+    repos = collection_not_empty.repositories
+    mocker.patch("app.config.settings.scheduler_batch_size", len(repos))
+    mocker.patch("app.config.settings.scheduler_interval", 60)
+    mocker.patch("app.scheduler.SessionLocal", return_value=db)
+    get_due = mocker.patch(
+        "app.services.schedule_service.get_due", return_value=repos
+    )
+    mocker.patch(
+        "app.services.repository_service.update",
+        side_effect=HTTPException(status_code=503, detail="Unavailable.")
+    )
+    stop = asyncio.Event()
+
+    task = asyncio.create_task(scheduler.run(stop=stop))
+    await asyncio.sleep(0.2)
+    stop.set()
+    await asyncio.wait_for(task, 1)
+
+    get_due.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_run_when_batch_fails(db, mocker):
+    mocker.patch("app.config.settings.scheduler_interval", 60)
+    mocker.patch("app.scheduler.SessionLocal", return_value=db)
+    run_once = mocker.patch(
+        "app.scheduler.run_once", side_effect=RuntimeError("Unexpected.")
+    )
+    stop = asyncio.Event()
+
+    task = asyncio.create_task(scheduler.run(stop=stop))
+    await asyncio.sleep(0.2)
+    stop.set()
+    await asyncio.wait_for(task, 1)
+
+    run_once.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_run_once_when_nothing_is_due(db, mocker):
+    mocker.patch("app.services.schedule_service.get_due", return_value=[])
+
+    assert await scheduler.run_once(db=db) == 0
@@ -0,0 +1,133 @@
+from sqlalchemy import text
+
+from app import slow_queries
+from app.database import get_engine
+from app.models.cached_response import CachedResponse
+from app.services import cache_service, repository_service
+
+
+def test_slow_queries_are_recorded(db, mocker):
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    url = "https://api.github.com/repos/octocat/Hello-World"
+
+    cache_service.get(db=db, url=url)
+
+    query = slow_queries.get_queries()[0]
+    assert query["statement"].startswith("SELECT")
+    assert query["parameters"] == {"url_1": "str"}
+    assert query["origin"].startswith("app.services.cache_service.get:")
+    assert query["duration"] >= 0
+    assert query["plan"] is None
+
+
+def test_slow_queries_are_not_recorded_below_threshold(db, mocker):
+    mocker.patch("app.config.settings.slow_query_threshold", 60)
+    queries = slow_queries.get_queries()
+
+    db.execute(text("SELECT 1"))
+
+    assert slow_queries.get_queries() == queries
+
+
+def test_slow_queries_are_explained(db, mocker):
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    mocker.patch("app.config.settings.slow_query_explain", True)
+    url = "https://api.github.com/repos/octocat/Hello-World"
+
+    cache_service.get(db=db, url=url)
+
+    plan = slow_queries.get_queries()[0]["plan"]
+    assert "Execution Time" in plan
+
+
+def test_explain_doesnt_keep_side_effects(db, mocker):
+    db.execute(text("SELECT set_config('app.explained', '0', true)"))
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    mocker.patch("app.config.settings.slow_query_explain", True)
+
+    db.execute(text(
+        "SELECT set_config('app.explained', "
+        "(current_setting('app.explained')::int + 1)::text, true)"
+    ))
+
+    assert db.execute(
+        text("SELECT current_setting('app.explained')")
+    ).scalar() == "1"
+
+
+def test_explain_doesnt_execute_statements_outside_transaction(mocker):
+    engine = get_engine().execution_options(isolation_level="AUTOCOMMIT")
+    with engine.connect() as connection:
+        connection.execute(
+            text("SELECT set_config('app.explained', '0', false)")
+        )
+        mocker.patch("app.config.settings.slow_query_threshold", 0)
+        mocker.patch("app.config.settings.slow_query_explain", True)
+
+        connection.execute(text(
+            "SELECT set_config('app.explained', "
+            "(current_setting('app.explained')::int + 1)::text, false)"
+        ))
+
+        assert connection.execute(
+            text("SELECT current_setting('app.explained')")
+        ).scalar() == "1"
+    plan = slow_queries.get_queries()[1]["plan"]
+    assert "Execution Time" not in plan
+
+
+def test_explain_analyze_can_be_disabled(db, mocker):
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    mocker.patch("app.config.settings.slow_query_explain", True)
+
+    db.execute(text("SELECT 1").execution_options(explain_analyze=False))
+
+    plan = slow_queries.get_queries()[0]["plan"]
+    assert plan is not None
+    assert "Execution Time" not in plan
+
+
+def test_explained_refresh_lock_is_released(db, mocker):
+    mocker.patch("app.config.settings.slow_query_explain", True)
+    key = 1234
+
+    try:
+        # Only taking the lock is slow.
+        mocker.patch("app.config.settings.slow_query_threshold", 0)
+        assert repository_service._try_lock(key=key)
+        mocker.patch("app.config.settings.slow_query_threshold", None)
+        repository_service._unlock(key=key)
+
+        assert db.execute(
+            text(f"SELECT pg_try_advisory_lock({key})")
+        ).scalar()
+        db.execute(text(f"SELECT pg_advisory_unlock({key})"))
+    finally:
+        repository_service._close_lock_connection()
+
+
+def test_failed_explain_doesnt_abort_transaction(db, mocker):
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    mocker.patch("app.config.settings.slow_query_explain", True)
+
+    # EXPLAIN ANALYZE creates the table again, so it fails.
+    db.execute(text("SELECT 1 AS value INTO TEMP TABLE explained"))
+    db.add(CachedResponse(url="url", json=None, etag=None))
+    db.flush()
+
+    query = next(
+        q for q in slow_queries.get_queries() if "explained" in q["statement"]
+    )
+    assert query["plan"] is None
+
+
+def test_only_select_queries_are_explained(db, mocker):
+    mocker.patch("app.config.settings.slow_query_threshold", 0)
+    mocker.patch("app.config.settings.slow_query_explain", True)
+
+    db.add(CachedResponse(url="url", json=None, etag=None))
+    db.flush()
+
+    query = slow_queries.get_queries()[0]
+    assert query["statement"].startswith("INSERT")
+    assert query["plan"] is None
@@ -0,0 +1,31 @@
+from app import timing
+
+
+def test_record_outside_of_request():
+    timing.record("db", 1.0)
+
+    assert timing.get() == {}
+
+
+def test_timed():
+    token = timing.start()
+    with timing.timed("db"):
+        pass
+    with timing.timed("db"):
+        pass
+    timing.record("cache", 0.5)
+    timings = timing.get()
+    timing.stop(token)
+
+    assert set(timings.keys()) == {"db", "cache"}
+    assert timings["db"] >= 0
+    assert timings["cache"] == 0.5
+    assert timing.get() == {}
+
+
+def test_format_header():
+    header = timing.format_header({"db": 0.0123, "upstream-github": 0.2}, 0.3)
+
+    assert header == (
+        "db;dur=12.3, upstream-github;dur=200.0, total;dur=300.0"
+    )
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from app import worker
+from app.enums import Provider
+from app.models.refresh_job import RefreshJob
+from app.services import refresh_queue_service, repository_service
+
+
+@pytest.mark.anyio
+async def test_run_once(db):
+    repos = [
+        await repository_service.add(
+            db=db, name="Hello-World", owner="octocat", provider=Provider.GITHUB
+        ),
+        await repository_service.add(
+            db=db, name="gitlab", owner="gitlab-org", provider=Provider.GITLAB
+        ),
+    ]
+    refresh_queue_service.enqueue(
+        db=db, repository_ids=[repo.id for repo in repos]
+    )
+
+    processed = await worker.run_once(db=db)
+
+    assert processed == 2
+    assert db.query(RefreshJob).count() == 0
+    assert all(repo.last_commit_at is not None for repo in repos)
+
+
+@pytest.mark.anyio
+async def test_run_once_when_update_fails(db, mocker):
+    repo = await repository_service.add(
+        db=db, name="Hello-World", owner="octocat", provider=Provider.GITHUB
+    )
+    refresh_queue_service.enqueue(db=db, repository_ids=[repo.id])
+    mocker.patch(
+        "app.services.repository_service.update",
+        side_effect=HTTPException(status_code=503, detail="Unavailable.")
+    )
+
+    processed = await worker.run_once(db=db)
+
+    job = db.get(RefreshJob, repo.id)
+    assert processed == 1
+    assert job.attempts == 1
+    assert job.last_error == "Unavailable."
+
+
+@pytest.mark.anyio
+async def test_run_once_when_update_raises_unexpected_error(db, mocker):
+    repos = [
+        await repository_service.add(
+            db=db, name="Hello-World", owner="octocat", provider=Provider.GITHUB
+        ),
+        await repository_service.add(
+            db=db, name="gitlab", owner="gitlab-org", provider=Provider.GITLAB
+        ),
+    ]
+    refresh_queue_service.enqueue(
+        db=db, repository_ids=[repo.id for repo in repos]
+    )
+
+    async def update(*, db, repo):
+        if repo.provider == Provider.GITLAB:
+            raise RuntimeError("Unexpected.")
+        return True
+
+    mocker.patch("app.services.repository_service.update", side_effect=update)
+
+    processed = await worker.run_once(db=db)
+
+    job = db.get(RefreshJob, repos[1].id)
+    assert processed == 2
+    assert db.get(RefreshJob, repos[0].id) is None
+    assert job.attempts == 1
+    assert job.last_error == "Unexpected error while updating."
+
+
+@pytest.mark.anyio
+async def test_run_once_when_queue_is_empty(db):
+    assert await worker.run_once(db=db) == 0
+
+
+@pytest.mark.anyio
+async def test_run_when_stopped():
+    stop = asyncio.Event()
+    stop.set()
+
+    await asyncio.wait_for(worker.run(stop=stop), timeout=5)
+
+
+@pytest.mark.anyio
+async def test_run_when_batch_fails(db, mocker):
+    mocker.patch("app.config.settings.worker_poll_interval", 60)
+    mocker.patch("app.worker.SessionLocal", return_value=db)
+    run_once = mocker.patch(
+        "app.worker.run_once", side_effect=RuntimeError("Unexpected.")
+    )
+    stop = asyncio.Event()
+
+    task = asyncio.create_task(worker.run(stop=stop))
+    await asyncio.sleep(0.2)
+    stop.set()
+    await asyncio.wait_for(task, 1)
+
+    run_once.assert_called_once()